@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+# scikit-learn is imported where a fitted sklearn object is saved or rebuilt, so
+# serving an artifact with the compiled engine never loads it
+from src.forest_compiler import CompiledForest, compile_forest
+from src.preprocess import ArrayScaler
+
+FORMAT = "ids-forest-artifact"
+FORMAT_VERSION = 1
+MANIFEST_SUFFIX = ".ids.json"
+HASH_BLOCK_BYTES = 1 << 20
+
+_FORESTS = ("RandomForestClassifier", "ExtraTreesClassifier")
+_COMPILED_ARRAYS = ("feature", "threshold", "children", "missing_go_to_left", "leaf_proba", "roots")
+
+
+class ArtifactError(ValueError):
+    """The manifest is not a supported artifact, or an array does not match its checksum."""
+
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars/arrays that turn up in sklearn params and bundle metadata
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_checksum(manifest: Dict[str, Any]) -> str:
+    # Covers every field except the checksum itself and the (relocatable) arrays_dir
+    body = {key: value for key, value in manifest.items() if key not in ("checksum", "arrays_dir")}
+    body = json.loads(json.dumps(body, default=_json_default))  # hash what is on disk, not the numpy types
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=_json_default)
+    os.replace(tmp, path)
+
+
+def save_artifact(bundle: Dict[str, Any], manifest_path: str | Path, include_compiled: bool = True) -> Path:
+    """Write ``bundle`` as uncompressed .npy arrays plus a JSON manifest.
+
+    ``manifest_path`` must end in ``.ids.json``; the arrays go into the sibling
+    directory with the same stem. Every array file is listed in the manifest with
+    its dtype, shape, size and SHA-256, and the manifest carries a checksum over all of
+    that. With ``include_compiled`` the flat ``CompiledForest`` arrays are stored
+    as well, so ``IDS_ENGINE=compiled`` workers map them without compiling.
+    """
+    manifest_path = Path(manifest_path)
+    if not manifest_path.name.endswith(MANIFEST_SUFFIX):
+        raise ArtifactError(f"Artifact manifests must end in '{MANIFEST_SUFFIX}'.")
+    arrays_dir = manifest_path.with_name(manifest_path.name[: -len(MANIFEST_SUFFIX)] + ".ids")
+    arrays_dir.mkdir(parents=True, exist_ok=True)
+
+    model, scaler = bundle["model"], bundle["scaler"]
+    if type(model).__name__ not in _FORESTS or getattr(model, "n_outputs_", 1) != 1:
+        raise ArtifactError(f"Only single-output {' / '.join(_FORESTS)} models can be saved as artifacts.")
+
+    arrays = _forest_arrays(model)
+    for name in ("mean_", "var_", "scale_"):
+        if getattr(scaler, name, None) is not None:
+            arrays[f"scaler_{name.rstrip('_')}"] = np.asarray(getattr(scaler, name), dtype=np.float64)
+    if include_compiled:
+        compiled = model if isinstance(model, CompiledForest) else compile_forest(model)
+        for name in _COMPILED_ARRAYS:
+            arrays[f"compiled_{name}"] = getattr(compiled, name)
+
+    cascade = None
+    if bundle.get("cascade") is not None:
+        # The first-stage screen is stored like the forest (or as its coefficients), under cascade_*
+        cascade, cascade_arrays = _screen_spec(bundle["cascade"])
+        arrays.update(cascade_arrays)
+
+    files = {}
+    for name, array in arrays.items():
+        path = arrays_dir / f"{name}.npy"
+        np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+        files[name] = {"file": path.name, "dtype": str(array.dtype), "shape": list(array.shape), "bytes": path.stat().st_size, "sha256": _sha256(path)}
+
+    samples_seen = getattr(scaler, "n_samples_seen_", None)
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "features": list(bundle["features"]),
+        "metadata": {key: value for key, value in bundle.items() if key not in ("model", "scaler", "features", "preprocessing", "cascade")},
+        "preprocessing": bundle.get("preprocessing"),
+        "model": _forest_spec(model),
+        "scaler": {
+            "with_mean": scaler.with_mean,
+            "with_std": scaler.with_std,
+            "copy": scaler.copy,
+            "n_samples_seen": samples_seen.tolist() if isinstance(samples_seen, np.ndarray) else samples_seen,
+            "feature_names_in": getattr(scaler, "feature_names_in_", np.array([])).tolist() or None,
+        },
+        "files": files,
+    }
+    if cascade is not None:
+        manifest["cascade"] = cascade
+    manifest["checksum"] = _manifest_checksum(manifest)
+    manifest["arrays_dir"] = arrays_dir.name  # relative to the manifest's directory
+    _write_json_atomic(manifest_path, manifest)
+    return manifest_path
+
+
+def promote_artifact(source: str | Path, target: str | Path) -> None:
+    # The target manifest points at the source's arrays: promoting copies a few KB, not the forest.
+    # The arrays are re-hashed once here, so serving can load the promoted manifest without doing it
+    source, target = Path(source), Path(target)
+    read_manifest(source, verify=True)
+    with open(source, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    arrays_dir = (source.parent / manifest["arrays_dir"]).resolve()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    manifest["arrays_dir"] = os.path.relpath(arrays_dir, target.parent.resolve())
+    _write_json_atomic(target, manifest)
+
+
+def read_manifest(manifest_path: str | Path, verify: bool = False) -> Tuple[Dict[str, Any], Path]:
+    # Always checks the manifest checksum and each array file's size; ``verify`` also re-hashes every file
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"{manifest_path} is not a {FORMAT} v{FORMAT_VERSION} manifest.")
+    if manifest.get("checksum") != _manifest_checksum(manifest):
+        raise ArtifactError(f"{manifest_path}: manifest checksum mismatch.")
+    arrays_dir = manifest_path.parent / manifest["arrays_dir"]
+    for name, entry in manifest["files"].items():
+        path = arrays_dir / entry["file"]
+        if not path.exists():
+            raise ArtifactError(f"{path}: listed in the manifest but missing.")
+        if "bytes" in entry and path.stat().st_size != entry["bytes"]:  # manifests before sizes were recorded skip this
+            raise ArtifactError(f"{path}: size does not match the manifest.")
+        if verify and _sha256(path) != entry["sha256"]:
+            raise ArtifactError(f"{path}: SHA-256 does not match the manifest.")
+    return manifest, arrays_dir
+
+
+def _open_arrays(manifest: Dict[str, Any], arrays_dir: Path) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, entry in manifest["files"].items():
+        array = np.load(arrays_dir / entry["file"], mmap_mode="r", allow_pickle=False)
+        if list(array.shape) != entry["shape"]:
+            raise ArtifactError(f"{entry['file']}: shape {array.shape} does not match the manifest.")
+        arrays[name] = array
+    return arrays
+
+
+def _forest_arrays(model: Any, prefix: str = "") -> Dict[str, np.ndarray]:
+    states = [estimator.tree_.__getstate__() for estimator in model.estimators_]
+    return {
+        f"{prefix}tree_nodes": np.concatenate([state["nodes"] for state in states]),
+        f"{prefix}tree_values": np.concatenate([state["values"] for state in states]),
+        f"{prefix}tree_offsets": np.cumsum([0] + [state["node_count"] for state in states]).astype(np.int64),
+        f"{prefix}tree_max_depth": np.asarray([state["max_depth"] for state in states], dtype=np.int64),
+        f"{prefix}tree_random_state": np.asarray([estimator.random_state for estimator in model.estimators_], dtype=np.int64),
+    }
+
+
+def _classes_spec(model: Any) -> Dict[str, Any]:
+    classes = np.asarray(model.classes_)
+    return {"classes": classes.tolist(), "classes_dtype": "object" if classes.dtype == object else classes.dtype.str}
+
+
+def _spec_classes(spec: Dict[str, Any]) -> np.ndarray:
+    return np.asarray(spec["classes"], dtype=object if spec["classes_dtype"] == "object" else np.dtype(spec["classes_dtype"]))
+
+
+def _forest_spec(model: Any) -> Dict[str, Any]:
+    return {
+        "class": type(model).__name__,
+        "params": model.get_params(),
+        **_classes_spec(model),
+        "n_features_in": int(model.n_features_in_),
+        "feature_names_in": getattr(model, "feature_names_in_", np.array([])).tolist() or None,
+        "max_features_": int(model.estimators_[0].max_features_),
+        "n_samples": getattr(model, "_n_samples", None),
+        "n_samples_bootstrap": getattr(model, "_n_samples_bootstrap", None),
+        "n_trees": len(model.estimators_),
+    }
+
+
+def _screen_spec(cascade: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    screen = cascade["model"]
+    if type(screen).__name__ in _FORESTS:
+        spec, arrays = _forest_spec(screen), _forest_arrays(screen, "cascade_")
+    elif type(screen).__name__ == "LogisticRegression":
+        spec = {"class": "LogisticRegression", "params": screen.get_params(), **_classes_spec(screen), "n_features_in": int(screen.n_features_in_)}
+        arrays = {"cascade_coef": np.asarray(screen.coef_), "cascade_intercept": np.asarray(screen.intercept_)}
+    else:
+        raise ArtifactError(f"Cascade screens must be a forest or LogisticRegression, not {type(screen).__name__}.")
+    entry = {key: value for key, value in cascade.items() if key != "model"}
+    return {**entry, "model": spec}, arrays
+
+
+def _build_screen(spec: Dict[str, Any], arrays: Dict[str, np.ndarray], engine: str = "sklearn") -> Any:
+    if spec["class"] in _FORESTS:
+        if engine == "compiled":  # straight from the node tables, as ModelVersion would compile it anyway
+            return CompiledForest.from_node_arrays(
+                arrays["cascade_tree_nodes"], arrays["cascade_tree_values"], arrays["cascade_tree_offsets"],
+                _spec_classes(spec), spec["n_features_in"],
+            )
+        return _build_forest(spec, arrays, "cascade_")
+    from sklearn.linear_model import LogisticRegression
+
+    screen = LogisticRegression(**spec["params"])
+    screen.coef_ = np.array(arrays["cascade_coef"])
+    screen.intercept_ = np.array(arrays["cascade_intercept"])
+    screen.classes_ = _spec_classes(spec)
+    screen.n_features_in_ = spec["n_features_in"]
+    return screen
+
+
+def _build_forest(spec: Dict[str, Any], arrays: Dict[str, np.ndarray], prefix: str = "") -> Any:
+    from sklearn import ensemble
+    from sklearn.base import clone
+    from sklearn.tree._tree import Tree
+
+    if spec["class"] not in _FORESTS:
+        raise ArtifactError(f"Unsupported model class '{spec['class']}'.")
+    model = getattr(ensemble, spec["class"])(**spec["params"])
+    classes = _spec_classes(spec)
+    n_classes = len(classes)
+    offsets = arrays[f"{prefix}tree_offsets"]
+
+    model.estimator_ = clone(model.estimator)
+    estimators = []
+    for t in range(spec["n_trees"]):
+        estimator = clone(model.estimator).set_params(**{name: getattr(model, name) for name in model.estimator_params})
+        estimator.set_params(random_state=int(arrays[f"{prefix}tree_random_state"][t]))
+        start, end = int(offsets[t]), int(offsets[t + 1])
+        # Tree copies its node table into its own buffer, so the sklearn engine cannot share pages
+        tree = Tree(spec["n_features_in"], np.asarray([n_classes], dtype=np.intp), 1)
+        tree.__setstate__({
+            "max_depth": int(arrays[f"{prefix}tree_max_depth"][t]),
+            "node_count": end - start,
+            "nodes": np.ascontiguousarray(arrays[f"{prefix}tree_nodes"][start:end]),
+            "values": np.ascontiguousarray(arrays[f"{prefix}tree_values"][start:end]),
+        })
+        estimator.tree_ = tree
+        estimator.n_features_in_ = spec["n_features_in"]
+        estimator.n_outputs_ = 1
+        estimator.classes_ = classes
+        estimator.n_classes_ = np.int64(n_classes)
+        estimator.max_features_ = spec["max_features_"]
+        estimators.append(estimator)
+
+    model.estimators_ = estimators
+    model.classes_ = classes
+    model.n_classes_ = n_classes
+    model.n_features_in_ = spec["n_features_in"]
+    model.n_outputs_ = 1
+    if spec.get("feature_names_in"):
+        model.feature_names_in_ = np.asarray(spec["feature_names_in"], dtype=object)
+    if spec.get("n_samples") is not None:
+        model._n_samples = spec["n_samples"]
+    if spec.get("n_samples_bootstrap") is not None:
+        model._n_samples_bootstrap = spec["n_samples_bootstrap"]
+    return model
+
+
+def _build_scaler(manifest: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> Any:
+    from sklearn.preprocessing import StandardScaler
+
+    spec = manifest["scaler"]
+    scaler = StandardScaler(copy=spec["copy"], with_mean=spec["with_mean"], with_std=spec["with_std"])
+    scaler.mean_ = np.array(arrays["scaler_mean"]) if "scaler_mean" in arrays else None
+    scaler.var_ = np.array(arrays["scaler_var"]) if "scaler_var" in arrays else None
+    scaler.scale_ = np.array(arrays["scaler_scale"]) if "scaler_scale" in arrays else None
+    samples_seen = spec["n_samples_seen"]
+    scaler.n_samples_seen_ = np.asarray(samples_seen) if isinstance(samples_seen, list) else samples_seen
+    scaler.n_features_in_ = len(manifest["features"])
+    if spec.get("feature_names_in"):
+        scaler.feature_names_in_ = np.asarray(spec["feature_names_in"], dtype=object)
+    return scaler
+
+
+def load_artifact(manifest_path: str | Path, engine: str = "sklearn", verify: bool = False) -> Dict[str, Any]:
+    """Read an artifact back into the joblib bundle layout (``model``, ``scaler``, ``features``, ...).
+
+    ``engine="sklearn"`` rebuilds the fitted forest, with the same predictions as the
+    original. ``engine="compiled"`` returns a ``CompiledForest`` whose arrays are
+    read-only memory maps, so every process serving the artifact shares one copy
+    in the page cache, and an ``ArrayScaler``, so nothing imports scikit-learn unless
+    the bundle has a linear cascade screen. The manifest checksum, file sizes and
+    array shapes are always checked; ``verify`` also re-hashes every array file,
+    which ``promote_artifact`` already did for promoted manifests.
+    """
+    manifest, arrays_dir = read_manifest(manifest_path, verify=verify)
+    arrays = _open_arrays(manifest, arrays_dir)
+    spec = manifest["model"]
+
+    if engine == "compiled":
+        if "compiled_feature" not in arrays:
+            raise ArtifactError(f"{manifest_path} was saved without compiled arrays.")
+        model = CompiledForest(
+            **{name: arrays[f"compiled_{name}"] for name in _COMPILED_ARRAYS},
+            classes=_spec_classes(spec),
+            n_features=spec["n_features_in"],
+        )
+        scaler = ArrayScaler(
+            np.array(arrays["scaler_mean"]) if "scaler_mean" in arrays else None,
+            np.array(arrays["scaler_scale"]) if "scaler_scale" in arrays else None,
+            with_mean=manifest["scaler"]["with_mean"],
+            with_std=manifest["scaler"]["with_std"],
+        )
+    else:
+        model = _build_forest(spec, arrays)
+        scaler = _build_scaler(manifest, arrays)
+
+    bundle = {**manifest["metadata"], "model": model, "scaler": scaler, "features": manifest["features"]}
+    if manifest.get("preprocessing") is not None:
+        bundle["preprocessing"] = manifest["preprocessing"]
+    if manifest.get("cascade") is not None:
+        # A forest screen is compiled for the compiled engine; otherwise it is rebuilt as a regular sklearn model
+        cascade = manifest["cascade"]
+        bundle["cascade"] = {**cascade, "model": _build_screen(cascade["model"], arrays, engine)}
+    return bundle
+
+
+def is_artifact(path: str | Path) -> bool:
+    return str(path).endswith(MANIFEST_SUFFIX)
@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import sys
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+def _bucket_edges(max_value: int) -> List[int]:
+    # Power-of-two upper bounds: 1, 2, 4, ... up to (and including) max_value
+    edges = [1]
+    while edges[-1] < max_value:
+        edges.append(min(edges[-1] * 2, max_value))
+    return edges
+
+
+class Histogram:
+    def __init__(self, max_value: int) -> None:
+        self.edges = _bucket_edges(max_value)
+        self.counts = [0] * (len(self.edges) + 1)  # last bucket catches values above max_value
+
+    def observe(self, value: int) -> None:
+        for i, edge in enumerate(self.edges):
+            if value <= edge:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        buckets = {f"le_{edge}": count for edge, count in zip(self.edges, self.counts)}
+        buckets[f"gt_{self.edges[-1]}"] = self.counts[-1]
+        return buckets
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-flow requests into one model call.
+
+    Requests wait at most ``max_wait_ms`` after the first flow of a batch arrives,
+    or until ``max_batch_size`` flows are queued, whichever comes first. The batch is
+    scored by ``score_fn`` in a worker thread so the event loop keeps accepting flows;
+    pass ``executor`` to use a dedicated (bounded) pool instead of the loop's default one.
+    Flows submitted with a ``context`` (e.g. the model version that parsed them) are
+    scored as ``score_fn(X, context)`` together with flows of the same context only.
+    Anything ``score_fn`` returns after labels and confidences is passed to every
+    flow of the batch. A batch that fails fails only its own requests; should the
+    worker task itself die, its pending requests fail and a new worker is started.
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[..., Tuple[Any, ...]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        executor: Executor | None = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._batch: List[Tuple[np.ndarray, asyncio.Future, float, Any]] = []  # taken off the queue, not yet answered
+
+        self.batch_sizes = Histogram(max_batch_size)
+        self.queue_depths = Histogram(max_batch_size * 4)
+        self.total_batches = 0
+        self.total_flows = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.worker_restarts = 0
+
+    async def start(self) -> None:
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        self._worker.add_done_callback(self._worker_done)
+
+    def _worker_done(self, task: asyncio.Task) -> None:
+        # _run never returns; it ends only when stop() cancels it or something outside a group raised
+        if task.cancelled() or task is not self._worker:
+            return
+        exc = task.exception()
+        print(f"micro-batcher: worker died ({type(exc).__name__}: {exc}), restarting", file=sys.stderr)
+        self._fail(self._batch, RuntimeError("micro-batcher worker failed"))
+        self._batch = []
+        self.worker_restarts += 1
+        self._start_worker()
+
+    @staticmethod
+    def _fail(items: List[Tuple[np.ndarray, asyncio.Future, float, Any]], exc: BaseException) -> None:
+        for _, future, _, _ in items:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Fail anything still waiting so no request hangs on shutdown
+        while self._queue is not None and not self._queue.empty():
+            _, future, _, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("micro-batcher stopped"))
+
+    async def submit(self, row: np.ndarray, context: Any = None) -> Tuple[Any, ...]:
+        if self._queue is None:
+            raise RuntimeError("micro-batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter(), context))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future, float, Any]]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before paying for a timed wait
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._batch = await self._collect()
+            self.queue_depths.observe(len(batch) + self._queue.qsize())
+
+            # Skip flows whose caller already went away (client disconnects cancel the future)
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self.total_batches += 1
+            self.total_flows += len(batch)
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued, _ in batch:
+                self.total_wait_seconds += started - enqueued
+
+            # One model call per context; without contexts that is the whole batch
+            groups: Dict[int, List[Tuple[np.ndarray, asyncio.Future, float, Any]]] = {}
+            for item in batch:
+                groups.setdefault(id(item[3]), []).append(item)
+            for group in groups.values():
+                try:
+                    await self._score_group(group)
+                except Exception as exc:  # model error, rows of the wrong width, short results: fail this group only
+                    self._fail(group, exc)
+
+    async def _score_group(self, group: List[Tuple[np.ndarray, asyncio.Future, float, Any]]) -> None:
+        X = np.vstack([row for row, _, _, _ in group])
+        context = group[0][3]
+        call = functools.partial(self.score_fn, X) if context is None else functools.partial(self.score_fn, X, context)
+        labels, confidences, *shared = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        for i, (_, future, _, _) in enumerate(group):
+            if not future.done():
+                future.set_result((labels[i], float(confidences[i]), *shared))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "total_batches": self.total_batches,
+            "total_flows": self.total_flows,
+            "mean_batch_size": self.total_flows / self.total_batches if self.total_batches else 0.0,
+            "mean_queue_wait_ms": 1000.0 * self.total_wait_seconds / self.total_flows if self.total_flows else 0.0,
+            "worker_restarts": self.worker_restarts,
+            "batch_size_histogram": self.batch_sizes.as_dict(),
+            "queue_depth_histogram": self.queue_depths.as_dict(),
+        }
@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+# Project root on the path so `python src/bench.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.features import clean_features, load_dataset, load_dataset_streaming, scale_features, scale_features_fused, split_X_y
+from src.metrics import ServingMetrics
+from src.preprocess import DEFAULT_CLIP
+from src.synthetic import write_csv
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time the preprocessing, training and inference hot paths and write the results as JSON."
+    )
+    parser.add_argument("--data", default=None, help="CICIDS CSV to use instead of generated synthetic flows.")
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic rows to generate when no --data is given.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per preprocessing benchmark (median is reported).")
+    parser.add_argument("--estimators", default="10,50,100", help="Comma-separated n_estimators to time forest fits at.")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="n_jobs for the forest fits.")
+    parser.add_argument("--batch-sizes", default="64,4096", help="Comma-separated predict_proba batch sizes.")
+    parser.add_argument("--calls", type=int, default=300, help="Single-row predict_proba and /predict calls.")
+    parser.add_argument("--output", default=None, help="JSON path (default: bench_results/<timestamp>-<commit>.json).")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs --compare before failing (0.25 = 25%%).")
+    return parser.parse_args()
+
+
+def timed(fn: Callable[[], Any], repeats: int, setup: Callable[[], Any] | None = None) -> Dict[str, Any]:
+    # Median of `repeats` runs; setup (e.g. copying the input) runs outside the timer
+    times = []
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        started = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        times.append(time.perf_counter() - started)
+    return {"seconds": float(np.median(times)), "min_seconds": float(min(times)), "repeats": repeats}
+
+
+def latency(fn: Callable[[], Any], calls: int) -> Dict[str, Any]:
+    # Per-call latencies; "seconds" is the median so regressions compare like the other entries
+    fn()  # first call pays one-off costs (thread pools, lazy imports)
+    times = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    times_ms = np.asarray(times) * 1000.0
+    return {
+        "seconds": float(np.median(times)),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p99_ms": float(np.percentile(times_ms, 99)),
+        "calls": calls,
+        "calls_per_s": calls / float(np.sum(times)),
+    }
+
+
+def with_rows(result: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    return {**result, "rows": rows, "rows_per_s": rows / result["seconds"] if result["seconds"] > 0 else None}
+
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def bench_preprocessing(path: str, repeats: int, results: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.Series]:
+    raw = load_dataset(path)
+    n_rows = len(raw)
+    results["load_dataset"] = with_rows(timed(lambda: load_dataset(path), repeats), n_rows)
+    results["load_dataset_streaming"] = with_rows(timed(lambda: load_dataset_streaming(path), repeats), n_rows)
+    results["clean_features"] = with_rows(timed(clean_features, repeats, setup=raw.copy), n_rows)
+
+    X, y, _ = split_X_y(clean_features(raw))
+    del raw
+    results["scale_features"] = with_rows(timed(scale_features, repeats, setup=lambda: X), len(X))
+    results["scale_features_fused"] = with_rows(timed(lambda X_: scale_features_fused(X_, DEFAULT_CLIP), repeats, setup=lambda: X), len(X))
+    return X, y
+
+
+def bench_training(X: pd.DataFrame, y: pd.Series, estimators: List[int], n_jobs: int, seed: int, results: Dict[str, Any]) -> Dict[str, Any]:
+    X_scaled, scaler, preprocessing = scale_features_fused(X, DEFAULT_CLIP)
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, stratify=y, random_state=seed)
+    models = {}
+    for n_estimators in estimators:
+        model = RandomForestClassifier(n_estimators=n_estimators, class_weight="balanced", n_jobs=n_jobs, random_state=seed)
+        started = time.perf_counter()
+        model.fit(X_train, y_train)
+        seconds = time.perf_counter() - started
+        results[f"fit_rf_{n_estimators}"] = {**with_rows({"seconds": seconds, "repeats": 1}, len(X_train)), "n_jobs": n_jobs}
+        models[n_estimators] = model
+    return {"models": models, "X_test": X_test, "scaler": scaler, "preprocessing": preprocessing}
+
+
+def bench_inference(model: RandomForestClassifier, X_test: np.ndarray, batch_sizes: List[int], calls: int, repeats: int, results: Dict[str, Any]) -> None:
+    n_jobs, model.n_jobs = model.n_jobs, 1  # serving latency is measured single-threaded
+    try:
+        row = X_test[:1]
+        results["predict_proba_single"] = latency(lambda: model.predict_proba(row), calls)
+        for batch_size in batch_sizes:
+            batch = X_test[np.arange(batch_size) % len(X_test)]
+            results[f"predict_proba_batch_{batch_size}"] = with_rows(timed(lambda: model.predict_proba(batch), max(repeats, 5)), batch_size)
+    finally:
+        model.n_jobs = n_jobs
+
+
+def bench_metrics(calls: int, results: Dict[str, Any]) -> None:
+    # What serve.py records for one /predict call: the clock reads, five stage timers, one prediction, the route and status
+    metrics = ServingMetrics()
+    label = np.array(["BENIGN"], dtype=object)
+    requests = calls * 100
+
+    def run() -> None:
+        for _ in range(requests):
+            started = time.perf_counter()
+            metrics.observe_stage("parse", time.perf_counter() - started)
+            metrics.observe_stage("assemble", time.perf_counter() - started)
+            scored = time.perf_counter()
+            metrics.observe_score(time.perf_counter() - scored, time.perf_counter() - scored, time.perf_counter() - scored)
+            metrics.count_predictions(label)
+            metrics.observe_request("/predict", 200, time.perf_counter() - started)
+
+    result = timed(run, 5)
+    results["metrics_per_request"] = {**result, "seconds": result["seconds"] / requests, "min_seconds": result["min_seconds"] / requests, "requests": requests}
+
+
+def bench_api(bundle: Dict[str, Any], X_raw: pd.DataFrame, calls: int, workdir: Path, results: Dict[str, Any]) -> None:
+    # The API as served, on this run's model
+    bundle_path = workdir / "bench.pk1"
+    joblib.dump(bundle, bundle_path)
+    os.environ.update({"IDS_RELOAD_POLL_S": "0", "IDS_MICROBATCH": "0", "IDS_MODEL_N_JOBS": "1"})
+    from fastapi.testclient import TestClient
+    from src.serve import create_app
+
+    app = create_app(str(bundle_path))
+
+    finite = X_raw[np.isfinite(X_raw.to_numpy(dtype=np.float64)).all(axis=1)].astype(float)  # inf is not valid JSON
+    values = finite.iloc[0].tolist()
+    flows = finite.iloc[:64]
+    batch = {"columns": {name: flows[name].tolist() for name in flows.columns}}
+    with TestClient(app) as client:
+        def predict() -> None:
+            response = client.post("/predict", json={"values": values})
+            response.raise_for_status()
+
+        def predict_batch() -> None:
+            response = client.post("/predict/batch", json=batch)
+            response.raise_for_status()
+
+        results["api_predict"] = latency(predict, calls)
+        results["api_predict_batch_64"] = with_rows(latency(predict_batch, max(calls // 10, 10)), 64)
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    estimators = [int(n) for n in args.estimators.split(",")]
+    batch_sizes = [int(n) for n in args.batch_sizes.split(",")]
+    with tempfile.TemporaryDirectory(prefix="ids-bench-") as tmp:
+        workdir = Path(tmp)
+        path = args.data
+        if path is None:
+            started = time.perf_counter()
+            path = str(write_csv(workdir / "synthetic.csv", args.rows, seed=args.seed))
+            print(f"generated {args.rows:,} synthetic flows in {time.perf_counter() - started:.1f}s")
+
+        X, y = bench_preprocessing(path, args.repeats, results)
+        trained = bench_training(X, y, estimators, args.n_jobs, args.seed, results)
+        model = trained["models"][max(estimators)]
+        bench_inference(model, trained["X_test"], batch_sizes, args.calls, args.repeats, results)
+
+        bundle = {
+            "model_id": f"bench-rf{max(estimators)}",
+            "model": model,
+            "scaler": trained["scaler"],
+            "features": list(X.columns),
+            "preprocessing": trained["preprocessing"].to_bundle(),
+        }
+        bench_metrics(args.calls, results)
+        bench_api(bundle, X, args.calls, workdir, results)
+
+    return {
+        "meta": {
+            **git_commit(),
+            "timestamp_utc": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "data": args.data or f"synthetic:{args.rows}:{args.seed}",
+            "rows": len(X),
+            "estimators": estimators,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "platform": platform.platform(),
+            "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    # Names of benchmarks whose headline time grew by more than `tolerance`
+    if current["meta"]["data"] != baseline["meta"]["data"]:
+        print(f"warning: comparing different data ({baseline['meta']['data']} vs {current['meta']['data']})")
+    regressions = []
+    print(f"{'benchmark':<28} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = " REGRESSION" if ratio > 1.0 + tolerance else ""
+        print(f"{name:<28} {before['seconds']:>11.5f} {result['seconds']:>11.5f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def format_results(report: Dict[str, Any]) -> str:
+    lines = [f"{'benchmark':<28} {'seconds':>10} {'rows/s':>12} {'p99 ms':>8}"]
+    for name, result in report["results"].items():
+        rows_per_s = result.get("rows_per_s")
+        p99 = result.get("p99_ms")
+        lines.append(
+            f"{name:<28} {result['seconds']:>10.5f} {'-' if rows_per_s is None else f'{rows_per_s:,.0f}':>12} "
+            f"{'-' if p99 is None else f'{p99:.2f}':>8}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmarks(args)
+    print(format_results(report))
+
+    output = Path(args.output or f"bench_results/{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✔ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"✘ {len(regressions)} benchmark(s) slower than {args.compare} by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,116 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Project root on the path so `python src/cache_bench.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.model_manager import ModelManager, ModelVersion
+from src.prediction_cache import PredictionCache
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay a flow CSV through the prediction cache in arrival order and report hit rates."
+    )
+    parser.add_argument("data", help="CICIDS CSV, e.g. data/Friday-WorkingHours-Afternoon-DDos.pcap_ISCX.csv.")
+    parser.add_argument("--model", default="src/models/rf.pk1", help="Bundle or .ids.json artifact.")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default="sklearn")
+    parser.add_argument("--rows", type=int, default=None, help="Replay only the first N flows.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Flows per scoring call (1 = single /predict calls).")
+    parser.add_argument("--quantize-bits", default="0,20,12", help="Comma-separated IDS_CACHE_QUANTIZE_BITS values (0 = exact).")
+    parser.add_argument("--max-entries", default="10000,100000", help="Comma-separated IDS_CACHE_MAX_ENTRIES values.")
+    parser.add_argument("--ttl-s", type=float, default=0.0, help="IDS_CACHE_TTL_S for every run (0 = no expiry).")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON.")
+    return parser.parse_args()
+
+
+def load_flows(path: str, version: ModelVersion, rows: int | None) -> np.ndarray:
+    # Raw feature values in file order, as a client would send them (inf/NaN included)
+    frame = pd.read_csv(path, nrows=rows, skipinitialspace=True)
+    frame.columns = frame.columns.str.strip()
+    missing = [name for name in version.features if name not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} lacks {len(missing)} model feature(s), e.g. {missing[:3]}.")
+    return frame[version.features].to_numpy(dtype=np.float64)
+
+
+def replay(version: ModelVersion, X: np.ndarray, batch_size: int, cache: PredictionCache | None) -> Dict[str, Any]:
+    labels: List[np.ndarray] = []
+    started = time.perf_counter()
+    for start in range(0, len(X), batch_size):
+        block = X[start:start + batch_size]
+        if cache is None:
+            block_labels, _ = version.score(block)
+        else:
+            block_labels, _ = cache.score(version, block, version.model_id)
+        labels.append(np.asarray(block_labels).astype(str))
+    seconds = time.perf_counter() - started
+    return {"labels": np.concatenate(labels), "seconds": seconds, "flows_per_s": len(X) / seconds}
+
+
+def main() -> None:
+    """Hit rate, label agreement and throughput of the prediction cache on one capture.
+
+    The file is replayed in arrival order in ``--batch-size`` blocks, once without
+    a cache (the reference labels and throughput) and once per combination of
+    ``--quantize-bits`` and ``--max-entries``. Agreement is the share of flows
+    whose cached label equals the uncached one; it is below 1 only when
+    quantization maps different flows to one entry.
+    """
+    args = parse_args()
+    version = ModelManager(args.model, engine=args.engine, poll_interval=0, n_jobs=1).load()
+    X = load_flows(args.data, version, args.rows)
+    print(f"cache_bench: {len(X):,} flows from {args.data}, {version.model_id} ({version.engine}), batch {args.batch_size}")
+
+    reference = replay(version, X, args.batch_size, None)
+    print(f"  no cache: {reference['flows_per_s']:,.0f} flows/s")
+    runs = []
+    for bits in (int(value) for value in args.quantize_bits.split(",")):
+        for max_entries in (int(value) for value in args.max_entries.split(",")):
+            cache = PredictionCache(max_entries=max_entries, ttl_s=args.ttl_s, quantize_bits=bits)
+            result = replay(version, X, args.batch_size, cache)
+            stats = cache.stats()
+            run = {
+                "quantize_bits": bits,
+                "max_entries": max_entries,
+                "hit_rate": stats["hit_rate"],
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "evictions": stats["evictions"],
+                "entries": stats["entries"],
+                "approx_bytes": stats["approx_bytes"],
+                "label_agreement": float((result["labels"] == reference["labels"]).mean()),
+                "flows_per_s": result["flows_per_s"],
+                "speedup": reference["seconds"] / result["seconds"],
+            }
+            runs.append(run)
+            print(
+                f"  bits={bits:<3} entries={max_entries:<8} hit rate {run['hit_rate']:.1%}  evictions {run['evictions']:,}  "
+                f"agreement {run['label_agreement']:.4%}  {run['flows_per_s']:,.0f} flows/s ({run['speedup']:.2f}x)"
+            )
+
+    if args.output:
+        report = {
+            "data": args.data,
+            "flows": int(len(X)),
+            "model_id": version.model_id,
+            "engine": version.engine,
+            "batch_size": args.batch_size,
+            "ttl_s": args.ttl_s,
+            "no_cache_flows_per_s": reference["flows_per_s"],
+            "runs": runs,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
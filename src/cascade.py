@@ -0,0 +1,191 @@
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Label of normal traffic; recall is guarded for every other class
+BENIGN_LABEL = "BENIGN"
+# Rows used to time the forest alone against the cascade on the test split
+TIMING_ROWS = 50_000
+
+
+def build_screen(screen_cfg: Dict[str, Any], random_state: int) -> Any:
+    # First stage: a few shallow trees, or a linear model on the already-scaled features
+    kind = screen_cfg.get("type", "forest")
+    params = dict(screen_cfg.get("params", {}))
+    if kind == "forest":
+        from sklearn.ensemble import RandomForestClassifier  # training only; serving gets the fitted screen
+
+        params = {"n_estimators": 5, "max_depth": 6, "n_jobs": 1, **params}
+        params.setdefault("random_state", random_state)
+        return RandomForestClassifier(**params)
+    if kind == "linear":
+        from sklearn.linear_model import LogisticRegression
+
+        params = {"max_iter": 300, **params}
+        params.setdefault("random_state", random_state)
+        return LogisticRegression(**params)
+    raise ValueError(f"Unknown cascade screen type '{kind}' (expected 'forest' or 'linear').")
+
+
+class Cascade:
+    """A cheap screen in front of the full forest.
+
+    Flows the screen assigns to one of ``exit_classes`` with confidence at or above
+    ``threshold`` take the screen's answer; every other flow is escalated to the
+    forest. Counts of screened and escalated flows are kept for ``stats()``.
+    """
+
+    def __init__(self, screen: Any, threshold: float, exit_classes: List[str]) -> None:
+        self.screen = screen
+        self.threshold = float(threshold)
+        self.exit_classes = [str(label) for label in exit_classes]
+        self.classes_ = np.asarray(screen.classes_)
+        self._exits = np.isin(self.classes_.astype(str), self.exit_classes)
+        self._lock = threading.Lock()
+        self.flows = 0
+        self.escalated = 0
+
+    @classmethod
+    def from_bundle(cls, entry: Dict[str, Any], screen: Any | None = None) -> "Cascade":
+        # ``screen`` replaces the bundled model (e.g. with its compiled form)
+        return cls(screen if screen is not None else entry["model"], entry["threshold"], entry["exit_classes"])
+
+    def screen_flows(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # The screen's label and confidence per flow, and which flows it cannot settle
+        proba = self.screen.predict_proba(X)
+        best = proba.argmax(axis=1)
+        confidences = proba[np.arange(len(best)), best]
+        escalate = ~(self._exits[best] & (confidences >= self.threshold))
+        return self.classes_[best], confidences, escalate
+
+    def predict(self, forest: Any, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        labels, confidences, escalate = self.screen_flows(X)
+        labels = labels.astype(object)
+        confidences = confidences.astype(np.float64)
+        if escalate.any():
+            proba = forest.predict_proba(X[escalate])
+            best = proba.argmax(axis=1)
+            labels[escalate] = forest.classes_[best]
+            confidences[escalate] = proba[np.arange(len(best)), best]
+        with self._lock:
+            self.flows += len(X)
+            self.escalated += int(escalate.sum())
+        return labels, confidences, escalate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            flows, escalated = self.flows, self.escalated
+        return {
+            "threshold": self.threshold,
+            "exit_classes": self.exit_classes,
+            "flows": flows,
+            "escalated": escalated,
+            "escalation_rate": escalated / flows if flows else None,
+        }
+
+
+def attack_recalls(y_true: np.ndarray, y_pred: np.ndarray, benign_label: str = BENIGN_LABEL) -> Dict[str, float]:
+    recalls = {}
+    for label in np.unique(y_true):
+        if label != benign_label:
+            mask = y_true == label
+            recalls[str(label)] = float((y_pred[mask] == label).mean())
+    return recalls
+
+
+def calibrate_threshold(
+    screen: Any,
+    forest: Any,
+    X_val: np.ndarray,
+    y_val: Any,
+    exit_classes: List[str],
+    max_recall_loss: float,
+    benign_label: str = BENIGN_LABEL,
+) -> Dict[str, Any]:
+    """Lowest screen threshold that keeps every attack class's recall within ``max_recall_loss`` of the forest's.
+
+    Lowering the threshold screens the exit-class flows in order of falling screen
+    confidence, so every threshold corresponds to a prefix of that order. The
+    change in each attack class's recall is a cumulative sum along it; the
+    longest prefix that stays within budget (and ends between two distinct
+    confidences) sets the threshold. ``inf`` means the screen never exits.
+    """
+    y = np.asarray(y_val).astype(str)
+    cascade = Cascade(screen, np.inf, exit_classes)
+    screen_labels, confidences, _ = cascade.screen_flows(X_val)
+    screen_labels = screen_labels.astype(str)
+    forest_labels = np.asarray(forest.predict(X_val)).astype(str)
+
+    eligible = np.flatnonzero(np.isin(screen_labels, cascade.exit_classes))
+    rows = eligible[np.argsort(-confidences[eligible], kind="stable")]
+    conf_sorted = confidences[rows]
+    # Correct answers gained (+1) or lost (-1) by screening each row instead of escalating it
+    delta = (screen_labels[rows] == y[rows]).astype(np.int64) - (forest_labels[rows] == y[rows]).astype(np.int64)
+
+    within = np.ones(len(rows) + 1, dtype=bool)
+    worst = np.zeros(len(rows) + 1)
+    for label in np.unique(y):
+        if label == benign_label:
+            continue
+        change = np.concatenate([[0], np.cumsum(np.where(y[rows] == label, delta, 0))]) / (y == label).sum()
+        within &= change >= -max_recall_loss
+        worst = np.minimum(worst, change)
+    boundary = np.ones(len(rows) + 1, dtype=bool)
+    boundary[1:-1] = conf_sorted[:-1] > conf_sorted[1:]  # a threshold cannot split tied confidences
+    n_screened = int(np.flatnonzero(within & boundary).max())
+
+    threshold = float(conf_sorted[n_screened - 1]) if n_screened else float("inf")
+    return {
+        "threshold": threshold,
+        "exit_classes": cascade.exit_classes,
+        "max_recall_loss": max_recall_loss,
+        "validation_rows": int(len(y)),
+        "validation_escalation_rate": 1.0 - n_screened / len(y) if len(y) else None,
+        "validation_worst_recall_change": float(worst[n_screened]),
+    }
+
+
+def evaluate_cascade(cascade: Cascade, forest: Any, X_test: np.ndarray, y_test: Any, benign_label: str = BENIGN_LABEL) -> Dict[str, Any]:
+    """Escalation rate, attack-class recall and throughput of the cascade against the forest alone.
+
+    Both are timed single-threaded (``n_jobs=1``, as served) on up to
+    ``TIMING_ROWS`` test flows, scored as one batch.
+    """
+    y = np.asarray(y_test).astype(str)
+    forest_labels = np.asarray(forest.predict(X_test)).astype(str)
+    cascade_labels, _, escalate = cascade.predict(forest, X_test)
+    cascade_labels = cascade_labels.astype(str)
+    forest_recall = attack_recalls(y, forest_labels, benign_label)
+    cascade_recall = attack_recalls(y, cascade_labels, benign_label)
+    recall_loss = {label: forest_recall[label] - cascade_recall[label] for label in forest_recall}
+
+    X_timing = X_test[:TIMING_ROWS]
+    n_jobs = getattr(forest, "n_jobs", None)
+    if n_jobs is not None:
+        forest.n_jobs = 1
+    try:
+        started = time.perf_counter()
+        forest.predict_proba(X_timing)
+        forest_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        cascade.predict(forest, X_timing)
+        cascade_seconds = time.perf_counter() - started
+    finally:
+        if n_jobs is not None:
+            forest.n_jobs = n_jobs
+
+    return {
+        "test_rows": int(len(y)),
+        "escalation_rate": float(escalate.mean()) if len(y) else None,
+        "accuracy": float((cascade_labels == y).mean()),
+        "forest_accuracy": float((forest_labels == y).mean()),
+        "attack_recall": cascade_recall,
+        "forest_attack_recall": forest_recall,
+        "recall_loss": recall_loss,
+        "max_recall_loss": max(recall_loss.values(), default=0.0),
+        "forest_flows_per_s": len(X_timing) / forest_seconds,
+        "cascade_flows_per_s": len(X_timing) / cascade_seconds,
+        "speedup": forest_seconds / cascade_seconds,
+    }
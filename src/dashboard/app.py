@@ -1,14 +1,22 @@
 # dashboard/app.py
 import streamlit as st
 import pandas as pd
-import requests
 import time
 import altair as alt
+import io
 from collections import deque
 import numpy as np
 import os
+import sys
 from pathlib import Path
 
+# Project root on the path so the dashboard shares the training pipeline's loaders
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from src.dataset_cache import DEFAULT_CACHE_DIR, DatasetCache
+from src.detection_store import DetectionStore
+from src.features import load_dataset
+from src.replay import FlowReplay, ReplayClient, replay_matrix
+
 st.set_page_config(
     page_title="AI Cybersecurity Intrusion Detector",
     layout="wide",
@@ -275,205 +283,226 @@ def render_list_item(icon, title, meta, value, color="#2196F3"):
 st.sidebar.markdown("## Navigation")
 page = st.sidebar.radio("", ["📡 Live Monitor", "📜 Attack History"], label_visibility="collapsed")
 
-# Shared paths
-log_path_csv = Path(__file__).parent.parent.parent / "dashboard" / "logs.csv"
+# Shared detection log (buffered SQLite segments with running per-class and per-minute aggregates)
+store_path = Path(__file__).parent.parent.parent / "dashboard" / "detections.db"
+
+@st.cache_resource(show_spinner=False)
+def open_detection_store():
+    # One connection per server process, shared by the Live Monitor (writer) and Attack History (reader) sessions
+    return DetectionStore(store_path)
 
 # ====================== PAGE 1: LIVE MONITOR ======================
+@st.cache_resource(show_spinner=False)
+def load_replay_frame(dataset_path):
+    # Loaded once per path and shared by every rerun and session; cleaned columns come memory-mapped from the dataset cache
+    return load_dataset(dataset_path, cache=DatasetCache(DEFAULT_CACHE_DIR))
+
+@st.cache_resource(show_spinner=False)
+def load_replay_matrix(dataset_path, features):
+    # Contiguous float32 rows in the server's feature order, built once per (dataset, schema)
+    return replay_matrix(load_replay_frame(dataset_path), list(features))
+
+def is_alert(predictions, confidences):
+    # High-confidence attack flows
+    return (predictions != "BENIGN") & (confidences > 0.9)
+
+def render_live_analytics():
+    history = st.session_state.history
+    total = st.session_state.total_flows
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-title">⚡ AI Threat Analytics</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="card-subtitle">Real-time detection summary • {st.session_state.flows_per_s:,.0f} flows/s</div>', unsafe_allow_html=True)
+
+    # Stats row
+    stats_col1, stats_col2, stats_col3 = st.columns(3)
+    with stats_col1:
+        render_stat_card("Total Detections", f"{total:,}", "🔍")
+    with stats_col2:
+        render_stat_card("Attacks", f"{st.session_state.total_attacks:,}", "🚨")
+    with stats_col3:
+        avg_conf = st.session_state.confidence_sum / total if total else 0.0
+        render_stat_card("Avg Confidence", f"{avg_conf:.1%}", "📊")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # Threat List
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-title">🎯 Recent Detections</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card-subtitle">Latest threat predictions</div>', unsafe_allow_html=True)
+    if len(history) > 0:
+        for item in reversed(list(history)[-5:]):
+            attack = item['prediction'] != "BENIGN"
+            render_list_item(
+                icon="🚨" if attack else "✅",
+                title=item['prediction'],
+                meta=f"Detected at {item['time']}",
+                value=f"{item['confidence']:.1%}",
+                color="#ff4b4b" if attack else "#4CAF50"
+            )
+    else:
+        st.info("No detections yet. Start the feed to begin monitoring.")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def render_live_monitor():
+    history = st.session_state.history
+    # Control Card
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-title">🌡️ Real-time Monitor</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card-subtitle">Active monitoring status</div>', unsafe_allow_html=True)
+    if len(history) > 0:
+        latest = history[-1]
+        attack = latest['prediction'] != "BENIGN"
+        status_color = "#ff4b4b" if attack else "#4CAF50"
+        status_icon = "🚨" if attack else "✅"
+        st.markdown(f"""
+        <div style="text-align: center; padding: 24px;">
+            <div style="font-size: 48px; margin-bottom: 16px;">{status_icon}</div>
+            <div style="font-size: 32px; font-weight: 700; color: {status_color}; margin-bottom: 8px;">
+                {latest['prediction']}
+            </div>
+            <div style="font-size: 18px; color: var(--text-secondary);">
+                Confidence: {latest['confidence']:.1%}
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown("""
+        <div style="text-align: center; padding: 24px; color: var(--text-secondary);">
+            Waiting for data...
+        </div>
+        """, unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # Charts Card: flows per class in each refresh interval
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="card-title">📊 Attack Frequency</div>', unsafe_allow_html=True)
+    if len(st.session_state.frequency) > 0:
+        freq_df = pd.DataFrame(st.session_state.frequency)
+        chart = (
+            alt.Chart(freq_df)
+            .mark_line(point=True, strokeWidth=3)
+            .encode(
+                x=alt.X("time:O", title="Time"),
+                y=alt.Y("count:Q", title="Count"),
+                color=alt.Color("prediction:N", scale=alt.Scale(
+                    domain=["DDoS", "BENIGN"],
+                    range=["#ff4b4b", "#4CAF50"]
+                ))
+            )
+            .properties(height=250)
+        )
+        st.altair_chart(chart, use_container_width=True)
+    else:
+        st.info("Chart will appear once data is streaming.")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def record_tick(update, alert_placeholder):
+    # Fold one refresh interval of scored flows into the session counters, chart and log
+    predictions, confidences = update["predictions"], update["confidences"]
+    st.session_state.flows_per_s = update["flows_per_s"]
+    if len(predictions) == 0:
+        return
+    timestamp = time.strftime("%H:%M:%S")
+    alerts = is_alert(predictions, confidences)
+    st.session_state.total_flows += len(predictions)
+    st.session_state.total_attacks += int(alerts.sum())
+    st.session_state.confidence_sum += float(confidences.sum())
+
+    tail = slice(-st.session_state.history.maxlen, None)
+    st.session_state.history.extend(
+        {"time": timestamp, "prediction": p, "confidence": float(c)} for p, c in zip(predictions[tail], confidences[tail])
+    )
+    classes, counts = np.unique(predictions, return_counts=True)
+    st.session_state.frequency.extend({"time": timestamp, "prediction": c, "count": int(n)} for c, n in zip(classes, counts))
+
+    # Alert handling
+    if alerts.any():
+        alert_placeholder.markdown(
+            f"""
+            <div class="alert-badge">
+                🚨 {int(alerts.sum()):,} high-confidence attack flows in the last {update['seconds']:.1f}s
+                (max confidence: {confidences[alerts].max():.1%})
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+    else:
+        alert_placeholder.empty()
+
+    # Buffered; the store writes a segment once per second or every 50k flows
+    open_detection_store().append(predictions, confidences)
+
 if page == "📡 Live Monitor":
     # Initialize session state
     if 'total_attacks' not in st.session_state:
         st.session_state.total_attacks = 0
-    if 'history' not in st.session_state:
-        st.session_state.history = deque(maxlen=100)
-    
-    # Render header
-    render_header(active_alerts=st.session_state.total_attacks)
-    
+        st.session_state.total_flows = 0
+        st.session_state.confidence_sum = 0.0
+        st.session_state.flows_per_s = 0.0
+        st.session_state.history = deque(maxlen=100)  # latest scored flows
+        st.session_state.frequency = deque(maxlen=600)  # per-class counts per refresh interval
+        st.session_state.streaming = False
+
     # Sidebar controls
     st.sidebar.markdown("### ⚙️ Settings")
-    api_url = st.sidebar.text_input("FastAPI URL:", "http://127.0.0.1:8000/predict")
+    api_url = st.sidebar.text_input("FastAPI URL:", "http://127.0.0.1:8000")
     dataset_path = st.sidebar.text_input("Dataset path:", "data/Friday-WorkingHours-Afternoon-DDos.pcap_ISCX.csv")
-    rate = st.sidebar.slider("Rows per second", 1, 20, 5)
-    simulate = st.sidebar.button("▶️ Start Live Feed", type="primary")
-    
+    rate = st.sidebar.slider("Flows per second (0 = as fast as the server answers)", 0, 20000, 2000, step=100)
+    refresh_s = st.sidebar.slider("UI refresh interval (seconds)", 0.5, 5.0, 1.0, step=0.5)
+    connections = st.sidebar.slider("Connections", 1, 16, 4)
+    start_col, stop_col = st.sidebar.columns(2)
+    if start_col.button("▶️ Start Live Feed", type="primary"):
+        st.session_state.streaming = True
+    if stop_col.button("⏹ Stop"):
+        st.session_state.streaming = False
+        open_detection_store().flush()  # the last interval's flows, so Attack History shows them right away
+
+    # Render header
+    header_placeholder = st.empty()
+    with header_placeholder.container():
+        render_header(active_alerts=st.session_state.total_attacks)
+
     # Main content area
-    if simulate:
-        st.sidebar.success("✅ Streaming active... Refresh to stop.")
-        
-        # Load dataset
+    if st.session_state.streaming:
+        st.sidebar.success("✅ Streaming active...")
+
+        # Load dataset (once per path, then served from the resource cache on every rerun)
         with st.spinner("📂 Loading dataset..."):
-            df_all = pd.read_csv(dataset_path, low_memory=False)
-            df_all.columns = df_all.columns.str.strip()
-            numeric_cols = df_all.select_dtypes(include=[np.number]).columns.tolist()
-        
-        # Two column layout
+            frame = load_replay_frame(dataset_path)
+            replay_key = (api_url, dataset_path, connections)
+            if st.session_state.get("replay_key") != replay_key:
+                if "replay" in st.session_state:
+                    st.session_state.replay.client.close()
+                client = ReplayClient(api_url, pool_size=connections)
+                client.connect(frame.select_dtypes(include=[np.number]).columns.tolist())
+                X, labels = load_replay_matrix(dataset_path, tuple(client.features))
+                st.session_state.replay = FlowReplay(X, client, rate=rate, labels=labels)
+                st.session_state.replay_key = replay_key
+            replay = st.session_state.replay
+            replay.rate = rate
+        st.sidebar.caption(f"Scoring via {replay.client.route} • {len(replay.X):,} flows")
+
+        # Two column layout, redrawn in place after every refresh interval
         left_col, right_col = st.columns([1.2, 1])
-        
-        # Left column: Analytics and Threat List
         with left_col:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            st.markdown('<div class="card-title">⚡ AI Threat Analytics</div>', unsafe_allow_html=True)
-            st.markdown('<div class="card-subtitle">Real-time detection summary</div>', unsafe_allow_html=True)
-            
-            # Stats row
-            stats_col1, stats_col2, stats_col3 = st.columns(3)
-            with stats_col1:
-                render_stat_card("Total Detections", len(st.session_state.history), "🔍")
-            with stats_col2:
-                render_stat_card("Attacks", st.session_state.total_attacks, "🚨")
-            with stats_col3:
-                if len(st.session_state.history) > 0:
-                    avg_conf = np.mean([h['confidence'] for h in st.session_state.history])
-                    render_stat_card("Avg Confidence", f"{avg_conf:.1%}", "📊")
-                else:
-                    render_stat_card("Avg Confidence", "0%", "📊")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Threat List
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            st.markdown('<div class="card-title">🎯 Recent Detections</div>', unsafe_allow_html=True)
-            st.markdown('<div class="card-subtitle">Latest threat predictions</div>', unsafe_allow_html=True)
-            
-            # Show recent threats
-            if len(st.session_state.history) > 0:
-                recent = list(st.session_state.history)[-5:]
-                for item in reversed(recent):
-                    threat_type = item['prediction']
-                    conf = item['confidence']
-                    time_str = item['time']
-                    
-                    # Color coding
-                    if threat_type == "DDoS":
-                        color = "#ff4b4b"
-                        icon = "🚨"
-                    else:
-                        color = "#4CAF50"
-                        icon = "✅"
-                    
-                    render_list_item(
-                        icon=icon,
-                        title=threat_type,
-                        meta=f"Detected at {time_str}",
-                        value=f"{conf:.1%}",
-                        color=color
-                    )
-            else:
-                st.info("No detections yet. Start the feed to begin monitoring.")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Right column: Controls and Charts
+            left_placeholder = st.empty()
         with right_col:
-            # Alert placeholder
             alert_placeholder = st.empty()
-            
-            # Control Card
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            st.markdown('<div class="card-title">🌡️ Real-time Monitor</div>', unsafe_allow_html=True)
-            st.markdown('<div class="card-subtitle">Active monitoring status</div>', unsafe_allow_html=True)
-            
-            # Current status
-            if len(st.session_state.history) > 0:
-                latest = st.session_state.history[-1]
-                current_pred = latest['prediction']
-                current_conf = latest['confidence']
-                
-                status_color = "#ff4b4b" if current_pred == "DDoS" else "#4CAF50"
-                status_icon = "🚨" if current_pred == "DDoS" else "✅"
-                
-                st.markdown(f"""
-                <div style="text-align: center; padding: 24px;">
-                    <div style="font-size: 48px; margin-bottom: 16px;">{status_icon}</div>
-                    <div style="font-size: 32px; font-weight: 700; color: {status_color}; margin-bottom: 8px;">
-                        {current_pred}
-                    </div>
-                    <div style="font-size: 18px; color: var(--text-secondary);">
-                        Confidence: {current_conf:.1%}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                <div style="text-align: center; padding: 24px; color: var(--text-secondary);">
-                    Waiting for data...
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Charts Card
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            st.markdown('<div class="card-title">📊 Attack Frequency</div>', unsafe_allow_html=True)
-            
-            if len(st.session_state.history) > 0:
-                df = pd.DataFrame(st.session_state.history)
-                freq_df = df.groupby(["time", "prediction"]).size().reset_index(name="count")
-                
-                chart = (
-                    alt.Chart(freq_df)
-                    .mark_line(point=True, strokeWidth=3)
-                    .encode(
-                        x=alt.X("time:O", title="Time"),
-                        y=alt.Y("count:Q", title="Count"),
-                        color=alt.Color("prediction:N", scale=alt.Scale(
-                            domain=["DDoS", "BENIGN"],
-                            range=["#ff4b4b", "#4CAF50"]
-                        ))
-                    )
-                    .properties(height=250)
-                )
-                st.altair_chart(chart, use_container_width=True)
-            else:
-                st.info("Chart will appear once data is streaming.")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Streaming loop
-        for _, row in df_all.iterrows():
-            feature_dict = {col: float(row[col]) if not pd.isna(row[col]) else 0.0 for col in numeric_cols}
-            sample_flow = {"features": feature_dict}
-            
+            right_placeholder = st.empty()
+
+        # Streaming loop: score for refresh_s, then redraw (a widget change stops it and reruns the script)
+        while st.session_state.streaming:
             try:
-                r = requests.post(api_url, json=sample_flow, timeout=3)
-                data = r.json()
-                timestamp = time.strftime("%H:%M:%S")
-                prediction = data["prediction"]
-                confidence = data["confidence"]
-                
-                st.session_state.history.append({
-                    "time": timestamp,
-                    "prediction": prediction,
-                    "confidence": confidence
-                })
-                
-                # Alert handling
-                if prediction == "DDoS" and confidence > 0.9:
-                    st.session_state.total_attacks += 1
-                    alert_placeholder.markdown(
-                        f"""
-                        <div class="alert-badge">
-                            🚨 High-Confidence DDoS Detected! (Confidence: {confidence:.1%})
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    st.balloons()
-                else:
-                    alert_placeholder.empty()
-                
-                # Log to CSV
-                log_entry = {"timestamp": timestamp, "prediction": prediction, "confidence": confidence}
-                log_df = pd.DataFrame([log_entry])
-                log_df.to_csv(log_path_csv, mode='a', header=not log_path_csv.exists(), index=False)
-                
-                time.sleep(1 / rate)
-                st.experimental_rerun()
-                
+                record_tick(replay.run_for(refresh_s), alert_placeholder)
             except Exception as e:
                 st.error(f"Error: {e}")
                 time.sleep(1)
-    
+            with header_placeholder.container():
+                render_header(active_alerts=st.session_state.total_attacks)
+            with left_placeholder.container():
+                render_live_analytics()
+            with right_placeholder.container():
+                render_live_monitor()
+
     else:
         # Initial state - show instructions
         st.markdown("""
@@ -497,9 +526,10 @@ elif page == "📜 Attack History":
     refresh_rate = st.sidebar.slider("Auto-refresh interval (seconds)", 3, 30, 5)
     auto_refresh = st.sidebar.checkbox("🔄 Enable auto-refresh", value=True)
     
+    store = open_detection_store()
     placeholder = st.empty()
     
-    if not log_path_csv.exists():
+    if store.last_offset() == 0:
         st.markdown("""
         <div class="card">
             <div class="card-title">📋 No History Yet</div>
@@ -509,31 +539,52 @@ elif page == "📜 Attack History":
         </div>
         """, unsafe_allow_html=True)
     else:
+        # Export walks the log one flushed segment at a time
+        if st.sidebar.button("📦 Prepare CSV export"):
+            with st.spinner("Exporting detections..."):
+                export = io.StringIO()
+                for i, segment in enumerate(store.iter_segments()):
+                    segment.drop(columns="id").to_csv(export, header=i == 0, index=False)
+            st.sidebar.download_button(
+                label="⬇️ Download Full Log CSV",
+                data=export.getvalue().encode('utf-8'),
+                file_name="attack_logs.csv",
+                mime="text/csv"
+            )
+
+        if 'history_tail' not in st.session_state:
+            st.session_state.history_tail = pd.DataFrame()
+            st.session_state.history_offset = 0
+
         while True:
-            df_logs = pd.read_csv(log_path_csv)
+            # Aggregates come from the incrementally maintained tables; only rows since the last offset are read
+            summary = store.summary()
+            new_rows = store.read_since(st.session_state.history_offset, limit=50)
+            if len(new_rows):
+                st.session_state.history_tail = pd.concat([st.session_state.history_tail, new_rows]).tail(50)
+                st.session_state.history_offset = int(new_rows["id"].iloc[-1])
             
             with placeholder.container():
                 # Stats
                 stats_col1, stats_col2, stats_col3 = st.columns(3)
                 with stats_col1:
-                    render_stat_card("Total Logs", len(df_logs), "📊")
+                    render_stat_card("Total Logs", f"{summary['flows']:,}", "📊")
                 with stats_col2:
-                    attack_count = len(df_logs[df_logs['prediction'] == 'DDoS'])
-                    render_stat_card("Attacks", attack_count, "🚨")
+                    render_stat_card("Attacks", f"{summary['attacks']:,}", "🚨")
                 with stats_col3:
-                    avg_conf = df_logs['confidence'].mean()
-                    render_stat_card("Avg Confidence", f"{avg_conf:.1%}", "📈")
+                    render_stat_card("Avg Confidence", f"{summary['mean_confidence']:.1%}", "📈")
                 
                 # Attack Distribution Chart
                 st.markdown('<div class="card">', unsafe_allow_html=True)
                 st.markdown('<div class="card-title">📊 Attack Type Distribution</div>', unsafe_allow_html=True)
                 
+                counts_df = pd.DataFrame({"prediction": list(summary["by_class"]), "count": list(summary["by_class"].values())})
                 count_chart = (
-                    alt.Chart(df_logs)
+                    alt.Chart(counts_df)
                     .mark_bar(cornerRadius=8)
                     .encode(
                         x=alt.X("prediction:N", title="Attack Type"),
-                        y=alt.Y("count()", title="Count"),
+                        y=alt.Y("count:Q", title="Count"),
                         color=alt.Color("prediction:N", scale=alt.Scale(
                             domain=["DDoS", "BENIGN"],
                             range=["#ff4b4b", "#4CAF50"]
@@ -544,22 +595,32 @@ elif page == "📜 Attack History":
                 st.altair_chart(count_chart, use_container_width=True)
                 st.markdown("</div>", unsafe_allow_html=True)
                 
+                # Per-minute rollups of the last hour
+                st.markdown('<div class="card">', unsafe_allow_html=True)
+                st.markdown('<div class="card-title">⏱️ Detections per Minute</div>', unsafe_allow_html=True)
+                minute_chart = (
+                    alt.Chart(store.minute_series(60))
+                    .mark_line(point=True, strokeWidth=3)
+                    .encode(
+                        x=alt.X("time:T", title="Minute"),
+                        y=alt.Y("count:Q", title="Count"),
+                        color=alt.Color("prediction:N", scale=alt.Scale(
+                            domain=["DDoS", "BENIGN"],
+                            range=["#ff4b4b", "#4CAF50"]
+                        ))
+                    )
+                    .properties(height=250)
+                )
+                st.altair_chart(minute_chart, use_container_width=True)
+                st.markdown("</div>", unsafe_allow_html=True)
+                
                 # Data table
                 st.markdown('<div class="card">', unsafe_allow_html=True)
                 st.markdown('<div class="card-title">📋 Detection Log</div>', unsafe_allow_html=True)
                 st.markdown('<div class="card-subtitle">Last 50 detections</div>', unsafe_allow_html=True)
-                st.dataframe(df_logs.tail(50), use_container_width=True, height=400)
+                st.dataframe(st.session_state.history_tail.drop(columns="id"), use_container_width=True, height=400)
                 st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Download button
-                st.download_button(
-                    label="⬇️ Download Full Log CSV",
-                    data=df_logs.to_csv(index=False).encode('utf-8'),
-                    file_name="attack_logs.csv",
-                    mime="text/csv"
-                )
             
             if not auto_refresh:
                 break
             time.sleep(refresh_rate)
-            st.experimental_rerun()
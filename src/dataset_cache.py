@@ -0,0 +1,185 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src import features
+from src.features import LABEL_COLUMN, clean_features, dataset_schema
+
+HASH_BLOCK_BYTES = 1 << 20
+INDEX_FILE = "index.json"
+DEFAULT_CACHE_DIR = "data/.cache"
+
+
+def preprocessing_version() -> str:
+    # Any edit to the cleaning code or its column lists invalidates every cached artifact
+    digest = hashlib.sha256()
+    for fn in (features.dataset_schema, features.clean_features):
+        digest.update(inspect.getsource(fn).encode("utf-8"))
+    digest.update(repr(sorted(features.TEXT_COLUMNS)).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """On-disk cache of cleaned CICIDS datasets, one float32 file per column.
+
+    Entries are keyed by the source file's SHA-256 and ``preprocessing_version()``,
+    so an edited CSV or an edited cleaning function never serves stale data. Columns
+    are memory-mapped on load and only paged in when touched. The least recently
+    used entries are evicted once the cache grows beyond ``max_bytes``.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int = 20 * 2**30, chunksize: int = 25_000) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.chunksize = chunksize
+
+    # --- index (hash memo + LRU bookkeeping) ---
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.root / INDEX_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"hashes": {}, "entries": {}}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        tmp = self.root / f"{INDEX_FILE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.root / INDEX_FILE)
+
+    def source_hash(self, path: str | Path) -> str:
+        # Re-hash only when size or mtime changed; hashing a 200 MB CSV costs ~1 s
+        stat = os.stat(path)
+        memo_key = str(Path(path).resolve())
+        index = self._read_index()
+        memo = index["hashes"].get(memo_key)
+        if memo and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+            return memo["sha256"]
+        sha = file_sha256(path)
+        index["hashes"][memo_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha}
+        self._write_index(index)
+        return sha
+
+    def key_for(self, path: str | Path) -> str:
+        return f"{self.source_hash(path)[:16]}-{preprocessing_version()}"
+
+    # --- public API ---
+    def load(self, path: str | Path) -> pd.DataFrame:
+        """Cleaned frame for ``path`` (same rows/columns as ``clean_features(load_dataset(path))``)."""
+        key = self.key_for(path)
+        entry_dir = self.root / key
+        if not (entry_dir / "meta.json").exists():
+            self._build(path, key)
+        self._touch(key)
+        self._evict(keep=key)
+        return self._open(entry_dir)
+
+    def info(self) -> List[Dict[str, Any]]:
+        index = self._read_index()
+        return [{"key": key, **entry} for key, entry in index["entries"].items()]
+
+    # --- internals ---
+    def _build(self, path: str | Path, key: str) -> None:
+        staging = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.root))
+        try:
+            handles: Dict[str, Any] = {}
+            columns: List[str] = []
+            classes: Dict[str, int] = {}
+            rows = 0
+            with open(staging / "labels.bin", "wb") as label_file:
+                for chunk in pd.read_csv(path, dtype=dataset_schema(path), chunksize=self.chunksize):
+                    chunk.columns = chunk.columns.str.strip()
+                    chunk = clean_features(chunk)
+                    if not columns:
+                        columns = chunk.drop(columns=[LABEL_COLUMN]).select_dtypes(include=[np.number]).columns.tolist()
+                        handles = {col: open(staging / f"col_{i}.bin", "wb") for i, col in enumerate(columns)}
+                    for col in columns:
+                        # Infinities are kept so clean_features stays idempotent on the cached frame
+                        handles[col].write(chunk[col].to_numpy(dtype="<f4").tobytes())
+                    chunk_codes, uniques = pd.factorize(chunk[LABEL_COLUMN])
+                    mapping = np.array([classes.setdefault(label, len(classes)) for label in uniques], dtype="<i4")
+                    label_file.write(mapping[chunk_codes].astype("<i4").tobytes())
+                    rows += len(chunk)
+            for handle in handles.values():
+                handle.close()
+
+            meta = {
+                "source_path": str(path),
+                "source_sha256": self.source_hash(path),
+                "preprocessing_version": preprocessing_version(),
+                "rows": rows,
+                "columns": columns,
+                "classes": sorted(classes, key=classes.get),
+                "created_at": time.time(),
+            }
+            with open(staging / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+
+            # Atomic publish: readers either see the full entry or none of it
+            entry_dir = self.root / key
+            if entry_dir.exists():
+                shutil.rmtree(staging)
+            else:
+                os.replace(staging, entry_dir)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        size = sum(p.stat().st_size for p in (self.root / key).iterdir())
+        index = self._read_index()
+        index["entries"][key] = {"source_path": str(path), "bytes": size, "last_used": time.time()}
+        self._write_index(index)
+
+    def _open(self, entry_dir: Path) -> pd.DataFrame:
+        with open(entry_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        rows = meta["rows"]
+        data: Dict[str, Any] = {}
+        for i, col in enumerate(meta["columns"]):
+            # Read-only memmaps: pages are only read from disk when a column is used
+            if rows:
+                data[col] = np.memmap(entry_dir / f"col_{i}.bin", dtype="<f4", mode="r", shape=(rows,))
+            else:
+                data[col] = np.empty(0, dtype=np.float32)
+        codes = np.fromfile(entry_dir / "labels.bin", dtype="<i4")
+        data[LABEL_COLUMN] = pd.Categorical.from_codes(codes, categories=meta["classes"])
+        df = pd.DataFrame(data, copy=False)
+        df.attrs["dataset_sha256"] = meta["source_sha256"]
+        return df
+
+    def _touch(self, key: str) -> None:
+        index = self._read_index()
+        if key in index["entries"]:
+            index["entries"][key]["last_used"] = time.time()
+            self._write_index(index)
+
+    def _evict(self, keep: str) -> None:
+        index = self._read_index()
+        entries = index["entries"]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.root / key, ignore_errors=True)
+            total -= entries.pop(key)["bytes"]
+        self._write_index(index)
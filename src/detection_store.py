@@ -0,0 +1,232 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+BENIGN_LABEL = "BENIGN"
+DEFAULT_STORE_PATH = "dashboard/detections.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,  -- append order; readers resume from the last id they saw
+    ts REAL NOT NULL,
+    class_id INTEGER NOT NULL,
+    confidence REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    flushed_at REAL NOT NULL
+);
+-- last_offset() reads MAX(last_id) from this index instead of scanning every segment
+CREATE INDEX IF NOT EXISTS segments_last_id ON segments (last_id);
+CREATE TABLE IF NOT EXISTS class_totals (
+    class_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS minute_rollups (
+    minute INTEGER NOT NULL,  -- ts // 60
+    class_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (minute, class_id)
+) WITHOUT ROWID;
+"""
+
+
+class DetectionStore:
+    """Append-only SQLite log of scored flows with incrementally maintained aggregates.
+
+    ``append()`` only buffers; the buffer is written as one segment (a single
+    transaction) once it holds ``flush_rows`` flows or its oldest flow is
+    ``flush_interval_s`` old. The same transaction adds the segment's per-class
+    counts and per-minute rollups to their tables, so ``totals()`` and
+    ``minute_series()`` never scan the log, and ``read_since(offset)`` returns
+    only rows appended after a reader's last offset. The database runs in WAL
+    mode: the dashboard's writer and any number of readers do not block each other.
+    The reading methods flush this instance's buffer first, so a reader sharing
+    the store with the writer sees every appended flow even after appends stop
+    (a buffer is otherwise only flushed by the next ``append()``).
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_STORE_PATH, flush_rows: int = 50_000, flush_interval_s: float = 1.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # a crash may lose the last segments, never corrupt the log
+        self._conn.executescript(SCHEMA)
+        self._class_ids: Dict[str, int] = {}
+        self._buffer: List[Dict[str, np.ndarray]] = []
+        self._buffered_rows = 0
+        self._buffer_started: float | None = None
+
+    # --- writing ---
+    def append(self, predictions: Sequence[str], confidences: Sequence[float], timestamps: Sequence[float] | float | None = None) -> None:
+        predictions = np.asarray(predictions).astype(str)
+        if len(predictions) == 0:
+            return
+        if timestamps is None:
+            timestamps = time.time()
+        block = {
+            "ts": np.broadcast_to(np.asarray(timestamps, dtype=np.float64), predictions.shape),
+            "prediction": predictions,
+            "confidence": np.asarray(confidences, dtype=np.float64),
+        }
+        with self._lock:
+            self._buffer.append(block)
+            self._buffered_rows += len(predictions)
+            if self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+            due = self._buffered_rows >= self.flush_rows or time.monotonic() - self._buffer_started >= self.flush_interval_s
+        if due:
+            self.flush()
+
+    def _class_id(self, name: str) -> int:
+        if name not in self._class_ids:
+            self._conn.execute("INSERT OR IGNORE INTO classes (name) VALUES (?)", (name,))
+            self._class_ids[name] = self._conn.execute("SELECT id FROM classes WHERE name = ?", (name,)).fetchone()[0]
+        return self._class_ids[name]
+
+    def flush(self) -> int:
+        """Write the buffer as one segment; returns the number of flows written."""
+        with self._lock:
+            blocks, self._buffer = self._buffer, []
+            self._buffered_rows, self._buffer_started = 0, None
+            if not blocks:
+                return 0
+            ts = np.concatenate([b["ts"] for b in blocks])
+            confidence = np.concatenate([b["confidence"] for b in blocks])
+            names, codes = np.unique(np.concatenate([b["prediction"] for b in blocks]), return_inverse=True)
+
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = np.array([self._class_id(name) for name in names], dtype=np.int64)
+                class_id = ids[codes]
+                first_id = (conn.execute("SELECT MAX(id) FROM detections").fetchone()[0] or 0) + 1
+                conn.executemany(
+                    "INSERT INTO detections (ts, class_id, confidence) VALUES (?, ?, ?)",
+                    zip(ts.tolist(), class_id.tolist(), confidence.tolist()),
+                )
+                conn.execute(
+                    "INSERT INTO segments (first_id, last_id, rows, flushed_at) VALUES (?, ?, ?, ?)",
+                    (first_id, first_id + len(ts) - 1, len(ts), time.time()),
+                )
+
+                # Aggregates of this segment, added onto the running ones
+                counts = np.bincount(codes, minlength=len(names))
+                sums = np.bincount(codes, weights=confidence, minlength=len(names))
+                conn.executemany(
+                    "INSERT INTO class_totals (class_id, count, confidence_sum) VALUES (?, ?, ?) "
+                    "ON CONFLICT (class_id) DO UPDATE SET count = count + excluded.count, confidence_sum = confidence_sum + excluded.confidence_sum",
+                    zip(ids.tolist(), counts.tolist(), sums.tolist()),
+                )
+                rollup = pd.DataFrame({"minute": (ts // 60).astype(np.int64), "class_id": class_id, "confidence": confidence})
+                rollup = rollup.groupby(["minute", "class_id"])["confidence"].agg(["count", "sum"]).reset_index()
+                conn.executemany(
+                    "INSERT INTO minute_rollups (minute, class_id, count, confidence_sum) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (minute, class_id) DO UPDATE SET count = count + excluded.count, confidence_sum = confidence_sum + excluded.confidence_sum",
+                    rollup.itertuples(index=False, name=None),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._class_ids.clear()  # ids assigned in the rolled-back transaction are gone
+                raise
+            return len(ts)
+
+    # --- reading (O(classes) or O(rows returned), independent of the log's length) ---
+    def _names(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, name FROM classes").fetchall())
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        # Per class: flows and the sum of their confidences
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.name, t.count, t.confidence_sum FROM class_totals t JOIN classes c ON c.id = t.class_id"
+            ).fetchall()
+        return {name: {"count": count, "confidence_sum": confidence_sum} for name, count, confidence_sum in rows}
+
+    def summary(self, benign_label: str = BENIGN_LABEL) -> Dict[str, Any]:
+        totals = self.totals()
+        flows = sum(t["count"] for t in totals.values())
+        return {
+            "flows": flows,
+            "attacks": sum(t["count"] for name, t in totals.items() if name != benign_label),
+            "mean_confidence": sum(t["confidence_sum"] for t in totals.values()) / flows if flows else None,
+            "by_class": {name: t["count"] for name, t in totals.items()},
+            "last_offset": self.last_offset(),
+        }
+
+    def last_offset(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT MAX(last_id) FROM segments").fetchone()[0] or 0
+
+    def minute_series(self, minutes: int = 60) -> pd.DataFrame:
+        # Per-minute counts of each class over the last ``minutes`` minutes that have data
+        self.flush()
+        with self._lock:
+            latest = self._conn.execute("SELECT MAX(minute) FROM minute_rollups").fetchone()[0]
+            rows = [] if latest is None else self._conn.execute(
+                "SELECT r.minute, c.name, r.count, r.confidence_sum FROM minute_rollups r JOIN classes c ON c.id = r.class_id "
+                "WHERE r.minute > ? ORDER BY r.minute",
+                (latest - minutes,),
+            ).fetchall()
+        frame = pd.DataFrame(rows, columns=["minute", "prediction", "count", "confidence_sum"])
+        frame["time"] = pd.to_datetime(frame["minute"] * 60, unit="s")
+        return frame
+
+    def _frame(self, rows: List[tuple]) -> pd.DataFrame:
+        names = self._names()
+        frame = pd.DataFrame(rows, columns=["id", "ts", "class_id", "confidence"])
+        return pd.DataFrame({
+            "id": frame["id"],
+            "timestamp": pd.to_datetime(frame["ts"], unit="s"),
+            "prediction": frame["class_id"].map(names),
+            "confidence": frame["confidence"],
+        })
+
+    def read_since(self, offset: int, limit: int | None = None) -> pd.DataFrame:
+        """Flows with id > ``offset``, oldest first (the newest ``limit`` of them when given); resume from the last id returned."""
+        self.flush()
+        with self._lock:
+            if limit is None:
+                rows = self._conn.execute("SELECT id, ts, class_id, confidence FROM detections WHERE id > ? ORDER BY id", (offset,)).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, ts, class_id, confidence FROM detections WHERE id > ? ORDER BY id DESC LIMIT ?", (offset, limit)
+                ).fetchall()[::-1]
+        return self._frame(rows)
+
+    def iter_segments(self, offset: int = 0) -> Iterator[pd.DataFrame]:
+        # Every flow after ``offset`` one flushed segment at a time (exports without loading the whole log)
+        self.flush()
+        with self._lock:
+            segments = self._conn.execute("SELECT first_id, last_id FROM segments WHERE last_id > ? ORDER BY id", (offset,)).fetchall()
+        for first_id, last_id in segments:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, ts, class_id, confidence FROM detections WHERE id BETWEEN ? AND ? ORDER BY id",
+                    (max(first_id, offset + 1), last_id),
+                ).fetchall()
+            yield self._frame(rows)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -2,14 +2,114 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 
+from src.preprocess import DEFAULT_CLIP, fused_fit_transform
+from src.profiling import maybe_stage
+
 LABEL_COLUMN = 'Label'
 
-def load_dataset(path):
+# Identifier / free-text columns found in some CICIDS exports; every other column is a numeric flow stat
+TEXT_COLUMNS = {'Flow ID', 'Source IP', 'Destination IP', 'Timestamp', 'SimillarHTTP'}
+
+# Bounded integer counts stored as int32 by the streaming loader; other flow stats become float32
+INT32_COLUMNS = {
+    'Destination Port', 'Source Port', 'Protocol',
+    'Total Fwd Packets', 'Total Backward Packets',
+    'Fwd PSH Flags', 'Bwd PSH Flags', 'Fwd URG Flags', 'Bwd URG Flags',
+    'FIN Flag Count', 'SYN Flag Count', 'RST Flag Count', 'PSH Flag Count',
+    'ACK Flag Count', 'URG Flag Count', 'CWE Flag Count', 'ECE Flag Count',
+    'Subflow Fwd Packets', 'Subflow Bwd Packets',
+    'Init_Win_bytes_forward', 'Init_Win_bytes_backward',
+    'act_data_pkt_fwd', 'min_seg_size_forward',
+}
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+def load_dataset(path, cache=None):
+    # Served from a DatasetCache (already cleaned, memory-mapped) when one is given
+    if cache is not None:
+        return cache.load(path)
+
     # Load CSV and Clean Headers
     df = pd.read_csv(path, low_memory=False)
     df.columns = df.columns.str.strip()
     return df
 
+def dataset_schema(path):
+    # Explicit read dtypes keyed by the raw (unstripped) header, so pandas never infers object columns
+    raw_columns = pd.read_csv(path, nrows=0).columns
+    dtypes = {}
+    for raw in raw_columns:
+        name = raw.strip()
+        dtypes[raw] = str if name == LABEL_COLUMN or name in TEXT_COLUMNS else np.float64
+    return dtypes
+
+def downcast_chunk(df):
+    # float64 -> float32, bounded counts -> int32 (clipped; scale_features clips to +-1e6 anyway), Label -> category
+    for col in df.columns:
+        if col == LABEL_COLUMN:
+            df[col] = df[col].astype('category')
+        elif col in INT32_COLUMNS and df[col].dtype == np.float64 and not df[col].isna().any():
+            df[col] = np.clip(df[col].to_numpy(), INT32_MIN, INT32_MAX).astype(np.int32)
+        elif df[col].dtype == np.float64:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+def iter_dataset_chunks(path, chunksize=25_000, profiler=None):
+    # Stream a CICIDS CSV as cleaned, typed blocks: only one raw float64 chunk is alive at a time
+    # With a StageProfiler, parse / clean / downcast time accumulates over all chunks
+    dtypes = dataset_schema(path)
+    reader = pd.read_csv(path, dtype=dtypes, chunksize=chunksize)
+    while True:
+        with maybe_stage(profiler, 'read_csv') as stage:
+            chunk = next(reader, None)
+            if chunk is not None:
+                stage['rows'], stage['columns'] = chunk.shape
+        if chunk is None:
+            break
+
+        with maybe_stage(profiler, 'clean_features') as stage:
+            chunk = clean_chunk(chunk)
+            stage['rows'], stage['columns'] = chunk.shape
+
+        with maybe_stage(profiler, 'downcast'):
+            chunk = downcast_chunk(chunk)
+        yield chunk
+
+def clean_chunk(chunk):
+    # Per-chunk cleaning shared by the streaming loader and score.py; the index (input row offsets) is kept
+    chunk.columns = chunk.columns.str.strip()
+    chunk = clean_features(chunk)
+
+    # Infinities become NaN here; scale_features later fills them with the column median
+    # (a new frame rather than chunk[numeric] = ..., which warns while the caller holds the raw chunk)
+    numeric = chunk.select_dtypes(include=[np.floating]).columns
+    return chunk.replace({col: [np.inf, -np.inf] for col in numeric}, np.nan)
+
+def load_dataset_streaming(path, chunksize=25_000, profiler=None):
+    # Same rows and columns as clean_features(load_dataset(path)), in float32/int32/category
+    blocks = list(iter_dataset_chunks(path, chunksize=chunksize, profiler=profiler))
+    if not blocks:
+        return clean_features(load_dataset(path))
+
+    # Stitch column by column and drop each column from the blocks as we go, so peak memory
+    # is the final frame plus one column instead of two full copies (pd.concat)
+    columns = {}
+    with maybe_stage(profiler, 'stitch') as stage:
+        stage['rows'], stage['columns'] = sum(len(block) for block in blocks), blocks[0].shape[1]
+        for col in list(blocks[0].columns):
+            pieces = [block[col] for block in blocks]
+            if col == LABEL_COLUMN:
+                columns[col] = pd.api.types.union_categoricals(pieces, ignore_order=True)
+            elif len({piece.dtype for piece in pieces}) > 1:
+                # int32 in one block but float32 in another (a chunk had gaps): widen to float32
+                columns[col] = np.concatenate([piece.to_numpy(dtype=np.float32) for piece in pieces])
+            else:
+                columns[col] = np.concatenate([piece.to_numpy() for piece in pieces])
+            del pieces
+            for block in blocks:
+                del block[col]
+
+    return pd.DataFrame(columns, copy=False) # copy=False keeps the stitched arrays unconsolidated
+
 def clean_features(df):
     # Drop columns not useful for ML
     drop_columns = [
@@ -27,8 +127,9 @@ def clean_features(df):
     # Drop rows with missing values
     df = df.dropna()
 
-    # Convert categorical labels to strings
-    df.loc[:, LABEL_COLUMN] = df[LABEL_COLUMN].astype(str).str.strip() # loc is used to select a single column by name and assign a new value to it
+    # Convert categorical labels to strings (unlabelled captures have no Label column)
+    if LABEL_COLUMN in df.columns:
+        df.loc[:, LABEL_COLUMN] = df[LABEL_COLUMN].astype(str).str.strip() # loc is used to select a single column by name and assign a new value to it
 
 
     return df
@@ -54,3 +155,29 @@ def scale_features(X):
     scaler = StandardScaler().fit(X)
     X_scaled = scaler.transform(X)
     return X_scaled, scaler
+
+def to_float32_buffer(X):
+    # Column-major float32 copy of the feature frame: each column is contiguous for the fused kernel
+    buffer = np.empty(X.shape, dtype=np.float32, order='F')
+    for j, col in enumerate(X.columns):
+        buffer[:, j] = X[col].to_numpy()
+    return buffer
+
+def scaler_from_stats(mean, var, n_samples):
+    # A fitted StandardScaler rebuilt from precomputed statistics, so the bundle format is unchanged
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(mean, dtype=np.float64)
+    scaler.var_ = np.asarray(var, dtype=np.float64)
+    scale = np.sqrt(scaler.var_)
+    scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+    scaler.scale_ = scale
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.n_samples_seen_ = int(n_samples)
+    return scaler
+
+def scale_features_fused(X, clip=DEFAULT_CLIP):
+    # Same steps as scale_features (inf -> NaN -> median -> clip -> standardise) in one pass over a
+    # single float32 buffer instead of a new DataFrame per step. Also returns the fitted
+    # Preprocessing so serving can repeat the inf/NaN handling.
+    X_scaled, preprocessing, mean, var = fused_fit_transform(to_float32_buffer(X), clip=clip)
+    return X_scaled, scaler_from_stats(mean, var, len(X_scaled)), preprocessing
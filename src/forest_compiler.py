@@ -0,0 +1,280 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+# Project root on the path so `python src/forest_compiler.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# sklearn stores leaves with children == -1; we keep the same convention
+TREE_LEAF = -1
+
+
+def float32_threshold(threshold: np.ndarray) -> np.ndarray:
+    # Largest float32 <= each float64 threshold: for float32 x, x <= t64 iff x <= t32
+    t32 = threshold.astype(np.float32)
+    too_high = t32.astype(np.float64) > threshold
+    t32[too_high] = np.nextafter(t32[too_high], np.float32(-np.inf))
+    return t32
+
+
+class CompiledForest:
+    """A fitted RandomForestClassifier flattened into packed NumPy arrays.
+
+    All trees share one node table. ``roots[t]`` is the global index of tree ``t``'s
+    root and ``children[2 * i]`` / ``children[2 * i + 1]`` are the global left/right
+    children of node ``i`` (``-1`` for leaves). ``leaf_proba`` holds each node's class
+    distribution, normalised the same way ``DecisionTreeClassifier.predict_proba`` does.
+    ``source_model_id`` is the id of the bundle it was compiled from, recorded when it
+    is exported, so a saved ``.npz`` is never served in place of a different model.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        missing_go_to_left: np.ndarray,
+        leaf_proba: np.ndarray,
+        roots: np.ndarray,
+        classes: np.ndarray,
+        n_features: int,
+        source_model_id: str | None = None,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_go_to_left = missing_go_to_left
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.is_leaf = children[0::2] == TREE_LEAF
+        self.source_model_id = source_model_id
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "CompiledForest":
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be compiled.")
+        trees = [
+            (tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.missing_go_to_left, tree.value)
+            for tree in (estimator.tree_ for estimator in model.estimators_)
+        ]
+        return cls._from_trees(trees, np.asarray(model.classes_), model.n_features_in_)
+
+    @classmethod
+    def from_node_arrays(cls, nodes: np.ndarray, values: np.ndarray, offsets: np.ndarray, classes: np.ndarray, n_features: int) -> "CompiledForest":
+        """Compile from the concatenated sklearn node tables an artifact stores (``tree_nodes``, ``tree_values``, ``tree_offsets``).
+
+        Same result as ``from_sklearn`` on the rebuilt forest, without importing scikit-learn.
+        """
+        trees = []
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            table = nodes[start:end]
+            trees.append((table["left_child"], table["right_child"], table["feature"], table["threshold"], table["missing_go_to_left"], values[start:end]))
+        return cls._from_trees(trees, np.asarray(classes), n_features)
+
+    @classmethod
+    def _from_trees(cls, trees: Sequence[tuple], classes: np.ndarray, n_features: int) -> "CompiledForest":
+        # trees: (children_left, children_right, feature, threshold, missing_go_to_left, value) per tree
+        n_classes = len(classes)
+        features, thresholds, children, missing, probas, roots = [], [], [], [], [], []
+        offset = 0
+        for left, right, feature, threshold, missing_go_to_left, value in trees:
+            roots.append(offset)
+
+            is_leaf = left == TREE_LEAF
+            # Leaves get feature 0 so the traversal can gather without masking
+            features.append(np.where(is_leaf, 0, feature).astype(np.int32))
+            thresholds.append(float32_threshold(np.asarray(threshold, dtype=np.float64)))
+            pair = np.stack([left, right], axis=1).astype(np.int64) + offset
+            pair[is_leaf] = TREE_LEAF
+            children.append(pair.astype(np.int32).ravel())
+            missing.append(np.asarray(missing_go_to_left, dtype=bool))
+
+            # Mirrors DecisionTreeClassifier.predict_proba: slice, row-normalise, guard zeros
+            value = value[:, 0, :n_classes].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(value / normalizer)
+
+            offset += len(left)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            missing_go_to_left=np.concatenate(missing),
+            leaf_proba=np.ascontiguousarray(np.concatenate(probas)),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=classes,
+            n_features=n_features,
+        )
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the global leaf index reached by every (sample, tree) pair."""
+        # sklearn evaluates trees on float32 input, so the float32 thresholds are exact
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}.")
+        n_samples, n_trees = X.shape[0], self.n_trees
+        flat_X = X.ravel()
+        has_missing = bool(np.isnan(flat_X).any())
+
+        # Tree-major order keeps neighbouring pairs inside the same tree's node block
+        nodes = np.repeat(self.roots, n_samples)
+        row_offsets = np.tile(np.arange(n_samples, dtype=np.int32) * np.int32(X.shape[1]), n_trees)
+
+        # Only (sample, tree) pairs still sitting on a split node are advanced each level
+        active = np.flatnonzero(~self.is_leaf[nodes]).astype(np.int32)
+        while active.size:
+            current = nodes[active]
+            values = flat_X[row_offsets[active] + self.feature[current]]
+            go_right = values > self.threshold[current]
+            if has_missing:
+                # NaN compares False above; route it the way the split was trained
+                go_right |= np.isnan(values) & ~self.missing_go_to_left[current]
+            following = self.children[2 * current + go_right]
+            nodes[active] = following
+            active = active[~self.is_leaf[following]]
+
+        return nodes.reshape(n_trees, n_samples).T
+
+    def predict_proba(self, X: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        X = np.asarray(X)
+        proba = np.empty((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            leaves = self.apply(X[start:start + chunk_size]).T  # (n_trees, n), one contiguous row per tree
+            # Trees added one after another, the same accumulation order as RandomForestClassifier
+            # with n_jobs=1; only one tree's (n, n_classes) block is gathered at a time
+            total = proba[start:start + chunk_size]
+            total[:] = 0.0
+            for tree_leaves in leaves:
+                total += self.leaf_proba[tree_leaves]
+            total /= self.n_trees
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path: str | Path) -> None:
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            children=self.children,
+            missing_go_to_left=self.missing_go_to_left,
+            leaf_proba=self.leaf_proba,
+            roots=self.roots,
+            classes=np.asarray(self.classes_).astype(str),  # object arrays would need pickle
+            n_features=np.asarray(self.n_features_in_),
+            source_model_id=np.asarray(self.source_model_id or ""),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CompiledForest":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                feature=data["feature"],
+                threshold=data["threshold"],
+                children=data["children"],
+                missing_go_to_left=data["missing_go_to_left"],
+                leaf_proba=data["leaf_proba"],
+                roots=data["roots"],
+                classes=data["classes"],
+                n_features=int(data["n_features"]),
+                # Files exported before the id was recorded have none and are refused by ModelVersion
+                source_model_id=(str(data["source_model_id"]) or None) if "source_model_id" in data.files else None,
+            )
+
+
+def compile_forest(model: Any) -> CompiledForest:
+    return CompiledForest.from_sklearn(model)
+
+
+def verify_against_sklearn(model: Any, compiled: CompiledForest, X: np.ndarray) -> Dict[str, Any]:
+    # Compare against single-threaded sklearn: threaded accumulation order is not fixed
+    n_jobs = model.n_jobs
+    model.n_jobs = 1
+    try:
+        expected = model.predict_proba(X)
+    finally:
+        model.n_jobs = n_jobs
+    actual = compiled.predict_proba(X)
+    return {
+        "rows": int(X.shape[0]),
+        "bit_identical": bool(np.array_equal(expected, actual)),
+        "max_abs_diff": float(np.abs(expected - actual).max()) if len(X) else 0.0,
+    }
+
+
+def benchmark(model: Any, compiled: CompiledForest, X: np.ndarray, batch_sizes: Sequence[int] = (1, 64, 4096), repeats: int = 20) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for batch_size in batch_sizes:
+        batch = np.resize(X, (batch_size, X.shape[1]))  # tiles the sample if it is smaller than the batch
+        timings = {}
+        for name, engine in (("sklearn", model), ("compiled", compiled)):
+            engine.predict_proba(batch)  # warm-up
+            samples = []
+            for _ in range(max(1, repeats if batch_size < 1024 else repeats // 4)):
+                start = time.perf_counter()
+                engine.predict_proba(batch)
+                samples.append(time.perf_counter() - start)
+            timings[f"{name}_median_ms"] = round(1000.0 * float(np.median(samples)), 3)
+        timings["speedup"] = round(timings["sklearn_median_ms"] / timings["compiled_median_ms"], 2)
+        results[str(batch_size)] = timings
+    return results
+
+
+def load_test_split(config_path: str) -> np.ndarray:
+    # The scaled held-out rows from train_supervised's own loader, so every dataset mode
+    # (single file, cache, streaming, out-of-core dataset.paths) verifies on the rows the model was evaluated on
+    from src.train_supervised import load_config, load_training_data
+
+    return np.asarray(load_training_data(load_config(config_path))["X_test"])
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compile a RandomForest bundle into flat NumPy arrays.")
+    parser.add_argument("--bundle", default="src/models/rf.pk1", help="Path to the joblib bundle.")
+    parser.add_argument("--out", default="src/models/rf.compiled.npz", help="Where to write the compiled arrays.")
+    parser.add_argument("--config", default=None, help="Training config; verifies predict_proba on its test split.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare latency for batch sizes 1, 64 and 4096.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import joblib
+
+    from src.model_manager import bundle_model_id
+
+    args = parse_args()
+    bundle = joblib.load(args.bundle)
+    compiled = compile_forest(bundle["model"])
+    compiled.source_model_id = bundle_model_id(bundle, args.bundle)  # checked against the bundle at serve time
+    compiled.save(args.out)
+    print(f"✔ Compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes of model {compiled.source_model_id} to {args.out}")
+
+    if args.config:
+        X_test = load_test_split(args.config)
+        print(f"Verification: {json.dumps(verify_against_sklearn(bundle['model'], compiled, X_test))}")
+        if args.benchmark:
+            print(f"Benchmark: {json.dumps(benchmark(bundle['model'], compiled, X_test), indent=2)}")
+    elif args.benchmark:
+        rng = np.random.default_rng(0)
+        X_sample = rng.standard_normal((4096, compiled.n_features_in_))
+        print(f"Benchmark: {json.dumps(benchmark(bundle['model'], compiled, X_sample), indent=2)}")
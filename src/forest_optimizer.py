@@ -0,0 +1,324 @@
+import copy
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.tree._tree import Tree
+
+from src.forest_compiler import TREE_LEAF, compile_forest
+
+# Trees scored together in one vectorised step of the greedy ordering (bounds its temporary memory)
+ORDER_CHUNK_TREES = 32
+# Rows per batch when measuring batch throughput
+LATENCY_BATCH_ROWS = 4096
+
+
+def validation_split(X: Any, y: Any, validation_size: float, random_state: int) -> Tuple[Any, Any, Any, Any]:
+    # Stratified when every class has two rows to spare; the rarest CICIDS classes may not
+    try:
+        return train_test_split(X, y, test_size=validation_size, random_state=random_state, stratify=y)
+    except ValueError:
+        return train_test_split(X, y, test_size=validation_size, random_state=random_state)
+
+
+def macro_f1_many(y: np.ndarray, preds: np.ndarray, n_classes: int) -> np.ndarray:
+    """Macro F1 of each row of ``preds`` against ``y`` (class codes), like sklearn's.
+
+    Classes absent from both ``y`` and a prediction are left out of its average;
+    per class F1 = 2·TP / (true + predicted), which is 0 when TP is 0.
+    """
+    preds = np.atleast_2d(preds)
+    n_sets = len(preds)
+    codes = (np.arange(n_sets)[:, None] * n_classes + y[None, :]) * n_classes + preds
+    cm = np.bincount(codes.ravel(), minlength=n_sets * n_classes * n_classes).reshape(n_sets, n_classes, n_classes)
+    tp = np.diagonal(cm, axis1=1, axis2=2)
+    support = cm.sum(axis=2) + cm.sum(axis=1)
+    present = support > 0
+    f1 = np.divide(2.0 * tp, support, out=np.zeros(tp.shape), where=present)
+    return f1.sum(axis=1) / np.maximum(present.sum(axis=1), 1)
+
+
+def tree_probas(estimators: Sequence[Any], X: np.ndarray) -> np.ndarray:
+    # (n_trees, n_rows, n_classes) float32: what each tree adds to the forest's average
+    return np.stack([estimator.predict_proba(X).astype(np.float32) for estimator in estimators])
+
+
+def order_trees(probas: np.ndarray, y: np.ndarray, n_select: int) -> List[int]:
+    """Greedy forward selection: repeatedly add the tree that most improves validation macro F1.
+
+    The first ``k`` indices are the top-k sub-forest for every ``k <= n_select``.
+    Ties go to the lower tree index, so the ordering is deterministic.
+    """
+    n_trees, _, n_classes = probas.shape
+    running = np.zeros(probas.shape[1:], dtype=np.float32)
+    remaining = list(range(n_trees))
+    order: List[int] = []
+    for _ in range(min(n_select, n_trees)):
+        scores = []
+        for start in range(0, len(remaining), ORDER_CHUNK_TREES):
+            chunk = remaining[start:start + ORDER_CHUNK_TREES]
+            preds = (running[None] + probas[chunk]).argmax(axis=2)
+            scores.append(macro_f1_many(y, preds, n_classes))
+        best = remaining[int(np.argmax(np.concatenate(scores)))]
+        order.append(best)
+        remaining.remove(best)
+        running += probas[best]
+    return order
+
+
+def distillation_set(teacher: RandomForestClassifier, X_fit: Any, cfg: Dict[str, Any], random_state: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rows, class codes and sample weights that carry the teacher's soft targets to a student.
+
+    The transfer set is the fit rows plus ``distill_augment`` times as many jittered
+    copies (Gaussian noise of ``distill_noise`` standard deviations; the features are
+    standardised). On the fit rows the teacher mostly repeats the training labels; near
+    its decision boundaries the copies get its uncertain answers. Each row is repeated
+    once per class the teacher gives it probability for, weighted by that probability,
+    so a student node's class distribution is the teacher's average over its rows.
+    Fit rows plus copies are capped at ``max_distill_rows``: larger fit sets are
+    subsampled before the copies are made, so the set never scales with the data.
+    """
+    X_fit = np.asarray(X_fit)
+    rng = np.random.default_rng(random_state)
+    augment = float(cfg.get("distill_augment", 1.0))
+    max_fit_rows = max(1, int(int(cfg.get("max_distill_rows", 200_000)) / (1.0 + augment)))
+    if len(X_fit) > max_fit_rows:
+        X_fit = X_fit[np.sort(rng.choice(len(X_fit), max_fit_rows, replace=False))]
+    X_fit = X_fit.astype(np.float32, copy=False)
+    n_extra = int(round(len(X_fit) * augment))
+    if n_extra:
+        copies = X_fit[rng.integers(0, len(X_fit), n_extra)]
+        copies += rng.normal(0.0, float(cfg.get("distill_noise", 0.1)), copies.shape).astype(np.float32)
+        X_fit = np.concatenate([X_fit, copies])
+    proba = teacher.predict_proba(X_fit)
+    rows, codes = np.nonzero(proba)
+    return X_fit[rows], codes, proba[rows, codes]
+
+
+def class_weighted(codes: np.ndarray, weights: np.ndarray, classes: np.ndarray, class_weight: Any) -> np.ndarray:
+    # class_weight applied to soft-target rows: "balanced" uses each class's probability mass,
+    # not its (repeated) row count, which is what sklearn would count
+    if class_weight in ("balanced", "balanced_subsample"):
+        mass = np.bincount(codes, weights=weights, minlength=len(classes))
+        return weights * (weights.sum() / (np.count_nonzero(mass) * mass[codes]))
+    if isinstance(class_weight, dict):
+        return weights * np.array([class_weight.get(c, 1.0) for c in classes])[codes]
+    return weights
+
+
+def truncate_tree(estimator: Any, max_depth: int) -> Any:
+    """Copy of a fitted decision tree cut at ``max_depth``; nodes at the cut become leaves.
+
+    sklearn stores the class distribution of every node, not just of leaves, so
+    the cut nodes predict exactly what a tree grown to ``max_depth`` on the same
+    splits would. Unreachable nodes are dropped, so the copy is also smaller.
+    """
+    state = estimator.tree_.__getstate__()
+    if state["max_depth"] <= max_depth:
+        return estimator
+    nodes, values = state["nodes"], state["values"]
+    left, right = nodes["left_child"], nodes["right_child"]
+
+    depth = np.full(len(nodes), -1, dtype=np.int64)
+    depth[0] = 0
+    frontier = np.array([0])
+    for level in range(max_depth):
+        frontier = frontier[left[frontier] != TREE_LEAF]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        if not len(frontier):
+            break
+        depth[frontier] = level + 1
+
+    keep = np.flatnonzero(depth >= 0)  # original (depth-first) order, root first
+    new_index = np.full(len(nodes), TREE_LEAF, dtype=np.int64)
+    new_index[keep] = np.arange(len(keep))
+    cut = (depth[keep] == max_depth) | (left[keep] == TREE_LEAF)
+
+    new_nodes = nodes[keep].copy()
+    new_nodes["left_child"] = np.where(cut, TREE_LEAF, new_index[left[keep]])
+    new_nodes["right_child"] = np.where(cut, TREE_LEAF, new_index[right[keep]])
+    new_nodes["feature"][cut] = -2  # sklearn's TREE_UNDEFINED
+    new_nodes["threshold"][cut] = -2.0
+
+    tree = Tree(estimator.tree_.n_features, np.asarray(estimator.tree_.n_classes, dtype=np.intp), estimator.tree_.n_outputs)
+    tree.__setstate__({
+        "max_depth": max_depth,
+        "node_count": len(keep),
+        "nodes": np.ascontiguousarray(new_nodes),
+        "values": np.ascontiguousarray(values[keep]),
+    })
+    truncated = copy.copy(estimator)
+    truncated.tree_ = tree
+    truncated.max_depth = max_depth
+    return truncated
+
+
+def sub_forest(model: RandomForestClassifier, estimators: List[Any], max_depth: int | None = None) -> RandomForestClassifier:
+    # Shallow copy sharing the fitted attributes; only the tree list differs
+    forest = copy.copy(model)
+    forest.estimators_ = list(estimators)
+    forest.n_estimators = len(estimators)
+    if max_depth is not None:
+        forest.max_depth = max_depth
+    return forest
+
+
+def model_nbytes(model: RandomForestClassifier) -> int:
+    # Size of the node and value tables, i.e. what a bundle or .ids.json artifact stores per tree
+    total = 0
+    for estimator in model.estimators_:
+        state = estimator.tree_.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return total
+
+
+def measure_latency(model: RandomForestClassifier, X: np.ndarray, calls: int, engine: str) -> Dict[str, float]:
+    """Model-only scoring cost as served: single-flow p50/p99 and per-flow cost in a batch.
+
+    Measured with ``n_jobs=1``, as under ``src.prefork``; the preprocessing and
+    scaler in front of the model cost the same for every candidate and are left out.
+    """
+    scorer = compile_forest(model) if engine == "compiled" else sub_forest(model, model.estimators_)
+    if engine != "compiled":
+        scorer.n_jobs = 1
+    rows = X[np.arange(calls) % len(X)]
+    scorer.predict_proba(rows[:1])  # one-off costs (thread pools, first-touch pages)
+    times = []
+    for i in range(calls):
+        started = time.perf_counter()
+        scorer.predict_proba(rows[i:i + 1])
+        times.append(time.perf_counter() - started)
+    batch = X[np.arange(LATENCY_BATCH_ROWS) % len(X)]
+    started = time.perf_counter()
+    scorer.predict_proba(batch)
+    batch_seconds = time.perf_counter() - started
+    times_ms = np.asarray(times) * 1000.0
+    return {
+        "latency_p50_ms": float(np.percentile(times_ms, 50)),
+        "latency_p99_ms": float(np.percentile(times_ms, 99)),
+        "batch_us_per_flow": batch_seconds / len(batch) * 1e6,
+    }
+
+
+def pareto_front(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Candidates no other candidate beats on both latency and validation macro F1, fastest first
+    front, best_f1 = [], -np.inf
+    for candidate in sorted(candidates, key=lambda c: (c["latency_p50_ms"], -c["val_macro_f1"])):
+        if candidate["val_macro_f1"] > best_f1:
+            front.append(candidate)
+            best_f1 = candidate["val_macro_f1"]
+    return front
+
+
+def select_candidate(candidates: List[Dict[str, Any]], cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Best validation macro F1 within the latency/size budgets.
+
+    Without budgets, the fastest candidate whose macro F1 is within
+    ``max_macro_f1_drop`` of the full forest. Falls back to the full forest when
+    no candidate qualifies.
+    """
+    full = next(c for c in candidates if c["name"] == "full")
+    latency_budget = cfg.get("latency_budget_ms")
+    size_budget = cfg.get("size_budget_mb")
+    if latency_budget is None and size_budget is None:
+        floor = full["val_macro_f1"] - float(cfg.get("max_macro_f1_drop", 0.005))
+        eligible = [c for c in candidates if c["val_macro_f1"] >= floor]
+        return min(eligible, key=lambda c: (c["latency_p50_ms"], -c["val_macro_f1"]))
+    eligible = [
+        c for c in candidates
+        if (latency_budget is None or c["latency_p50_ms"] <= latency_budget)
+        and (size_budget is None or c["size_mb"] <= size_budget)
+    ]
+    if not eligible:
+        return full
+    return max(eligible, key=lambda c: (c["val_macro_f1"], -c["latency_p50_ms"]))
+
+
+def optimize_forest(
+    model: RandomForestClassifier,
+    X_fit: Any,
+    y_fit: Any,
+    X_val: Any,
+    y_val: Any,
+    cfg: Dict[str, Any],
+    random_state: int,
+) -> Dict[str, Any]:
+    """Search smaller versions of a fitted forest and pick one for the latency/size budget.
+
+    Candidates are top-k sub-forests (trees in greedy validation order), the same
+    with every tree cut at each of ``max_depths``, and ``students``: small forests
+    trained on the teacher's soft targets (``distillation_set``). The validation
+    rows are halved: the tree order is chosen on one half, and every candidate is
+    scored and timed on the other, so the macro F1 the selection and
+    ``max_macro_f1_drop`` use is not inflated by the greedy search. Returns every
+    candidate, the Pareto front, the chosen entry and its model.
+    """
+    X_val = np.asarray(X_val, dtype=np.float32)
+    max_rows = int(cfg.get("max_validation_rows", 20_000))
+    if len(X_val) > max_rows:
+        rows = np.random.default_rng(random_state).choice(len(X_val), max_rows, replace=False)
+        X_val, y_val = X_val[np.sort(rows)], np.asarray(y_val)[np.sort(rows)]
+    y_codes = pd.Index(model.classes_).get_indexer(np.asarray(y_val))
+    known = y_codes >= 0  # a class seen only in the validation split cannot be predicted
+    X_val, y_codes = X_val[known], y_codes[known]
+    X_select, X_eval, y_select, y_eval = validation_split(X_val, y_codes, 0.5, random_state)
+    n_classes = len(model.classes_)
+    engine = cfg.get("engine", "sklearn")
+    calls = int(cfg.get("latency_calls", 100))
+
+    n_trees = len(model.estimators_)
+    tree_counts = sorted({min(int(k), n_trees) for k in cfg.get("tree_counts", [10, 25, 50, 100])} | {n_trees})
+    max_depths = [None] + sorted({int(d) for d in cfg.get("max_depths", []) if d is not None})
+
+    n_select = max([k for k in tree_counts if k < n_trees], default=0)
+    order = order_trees(tree_probas(model.estimators_, X_select), y_select, n_select) if n_select else []
+    order += [t for t in range(n_trees) if t not in order]
+
+    candidates, models = [], {}
+
+    def add(name: str, forest: RandomForestClassifier, **details: Any) -> None:
+        preds = forest.predict_proba(X_eval).argmax(axis=1)
+        depth = max(estimator.tree_.max_depth for estimator in forest.estimators_)
+        candidates.append({
+            "name": name,
+            **details,
+            "n_trees": len(forest.estimators_),
+            "max_depth": int(depth),
+            "n_nodes": int(sum(estimator.tree_.node_count for estimator in forest.estimators_)),
+            "size_mb": model_nbytes(forest) / 2**20,
+            "val_macro_f1": float(macro_f1_many(y_eval, preds, n_classes)[0]),
+            **measure_latency(forest, X_eval, calls, engine),
+        })
+        models[name] = forest
+
+    for depth in max_depths:
+        trees = model.estimators_ if depth is None else [truncate_tree(estimator, depth) for estimator in model.estimators_]
+        for k in tree_counts:
+            name = ("full" if k == n_trees else f"top{k}") + ("" if depth is None else f"-d{depth}")
+            add(name, sub_forest(model, [trees[t] for t in order[:k]], depth), kind="subforest", depth_cap=depth)
+
+    if cfg.get("students"):
+        X_transfer, codes, weights = distillation_set(model, X_fit, cfg, random_state)
+        for params in cfg["students"]:
+            params = {**model.get_params(), "random_state": random_state, **params}
+            weighted = class_weighted(codes, weights, model.classes_, params.pop("class_weight", None))
+            student = RandomForestClassifier(**params)
+            student.fit(X_transfer, model.classes_[codes], sample_weight=weighted)
+            name = f"student-{student.n_estimators}x{student.max_depth or 'full'}"
+            add(name, student, kind="student", depth_cap=student.max_depth)
+
+    chosen = select_candidate(candidates, cfg)
+    return {
+        "candidates": candidates,
+        "pareto_front": pareto_front(candidates),
+        "chosen": chosen,
+        "full": next(c for c in candidates if c["name"] == "full"),
+        "model": models[chosen["name"]],
+        "engine": engine,
+        "validation_rows": int(len(X_val)),
+        "selection_rows": int(len(X_select)),
+        "evaluation_rows": int(len(X_eval)),
+    }
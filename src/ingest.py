@@ -0,0 +1,97 @@
+from array import array
+from operator import itemgetter
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+class FeatureSchema:
+    """Fixed feature order compiled once from ``bundle['features']``.
+
+    Every input layout (feature dict, positional values, packed float64 bytes) is
+    written straight into a float64 buffer in bundle order. Features that are absent
+    or ``None`` are filled with ``default`` and reported back to the caller.
+    """
+
+    def __init__(self, feature_names: Sequence[str], default: float = 0.0) -> None:
+        self.names: Tuple[str, ...] = tuple(feature_names)
+        self.n_features = len(self.names)
+        self.default = float(default)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        # One C-level call pulls every feature out of a complete dict
+        self._getter = itemgetter(*self.names) if self.n_features > 1 else (lambda d: (d[self.names[0]],))
+
+    def empty(self, n_rows: int) -> np.ndarray:
+        return np.empty((n_rows, self.n_features), dtype=np.float64)
+
+    def fill_from_dict(self, features: Mapping[str, float | None], out: np.ndarray) -> List[str]:
+        """Write one flow into ``out`` (shape ``(n_features,)``); return defaulted feature names."""
+        if len(features) == self.n_features:
+            try:
+                # array('d') rejects None, which numpy would silently turn into NaN
+                out[:] = array("d", self._getter(features))
+                return []
+            except (KeyError, TypeError):
+                pass  # a key is missing/renamed or a value is null: take the slow path
+
+        out.fill(self.default)
+        defaulted = []
+        seen = 0
+        for name, value in features.items():
+            i = self.index.get(name)
+            if i is None:
+                continue  # unknown keys are ignored, like the original dict lookup did
+            seen += 1
+            if value is None:
+                defaulted.append(name)
+            else:
+                out[i] = value
+        if seen < self.n_features:
+            defaulted.extend(name for name in self.names if name not in features)
+        return defaulted
+
+    def from_dict(self, features: Mapping[str, float | None]) -> Tuple[np.ndarray, List[str]]:
+        row = self.empty(1)
+        defaulted = self.fill_from_dict(features, row[0])
+        return row, defaulted
+
+    def from_dicts(self, flows: Sequence[Mapping[str, float | None]]) -> Tuple[np.ndarray, Dict[str, int]]:
+        X = self.empty(len(flows))
+        defaulted_counts: Dict[str, int] = {}
+        for row, features in zip(X, flows):
+            for name in self.fill_from_dict(features, row):
+                defaulted_counts[name] = defaulted_counts.get(name, 0) + 1
+        return X, defaulted_counts
+
+    def from_positional(self, values: Sequence[float]) -> np.ndarray:
+        if len(values) != self.n_features:
+            raise ValueError(f"Expected {self.n_features} positional values, got {len(values)}.")
+        return np.asarray(values, dtype=np.float64).reshape(1, self.n_features)
+
+    def from_columns(self, columns: Mapping[str, Sequence[float]]) -> Tuple[np.ndarray, Dict[str, int]]:
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All columns must have the same number of values.")
+        n_rows = lengths.pop() if lengths else 0
+        X = self.empty(n_rows)
+        defaulted_counts: Dict[str, int] = {}
+        for j, name in enumerate(self.names):
+            values = columns.get(name)
+            if values is None:
+                X[:, j] = self.default
+                if n_rows:
+                    defaulted_counts[name] = n_rows
+            else:
+                X[:, j] = values
+        return X, defaulted_counts
+
+    def from_packed(self, body: bytes) -> np.ndarray:
+        """Read little-endian float64 rows in bundle order; no copy of the request body."""
+        row_bytes = 8 * self.n_features
+        if len(body) % row_bytes:
+            raise ValueError(f"Packed body must be a multiple of {row_bytes} bytes ({self.n_features} float64 per flow).")
+        return np.frombuffer(body, dtype="<f8").reshape(-1, self.n_features)
+
+    def describe(self) -> Dict[str, object]:
+        return {"n_features": self.n_features, "features": list(self.names), "default": self.default}
+
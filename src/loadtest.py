@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+# Project root on the path so `python src/loadtest.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.features import clean_features, load_dataset
+from src.synthetic import generate_flows
+
+# Upper bucket edges of the latency histogram, in ms (the last bucket is everything above)
+HISTOGRAM_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+# An open-loop step only counts as sustained if the server kept up with this share of the requests sent
+MIN_ACHIEVED_RATIO = 0.95
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay flows against /predict at a fixed open-loop rate or concurrency and report latency against an SLO."
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", default=None, help="Base URL of a running server, e.g. http://127.0.0.1:8000.")
+    target.add_argument("--in-process", action="store_true", help="Start serve.py's app on uvicorn in this process.")
+    parser.add_argument("--model", default="src/models/rf.pk1", help="Bundle or .ids.json artifact for --in-process.")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default="sklearn", help="Engine for --in-process.")
+
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--rate", default=None, help="Open loop: requests/s, or comma-separated rates to step through.")
+    load.add_argument("--concurrency", default=None, help="Closed loop: requests in flight, or comma-separated levels.")
+    parser.add_argument("--arrivals", choices=("uniform", "poisson"), default="poisson", help="Open-loop inter-arrival times.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per step.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each step.")
+    parser.add_argument("--connections", type=int, default=64, help="Keep-alive connections in the client pool.")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds (counts as an error).")
+
+    parser.add_argument("--data", default=None, help="CICIDS CSV to replay flows from (default: synthetic flows).")
+    parser.add_argument("--rows", type=int, default=10_000, help="Synthetic flows to generate when no --data is given.")
+    parser.add_argument("--seed", type=int, default=0)
+
+    parser.add_argument("--slo-p99-ms", type=float, default=100.0, help="p99 latency a step must stay under.")
+    parser.add_argument("--slo-error-rate", type=float, default=0.001, help="Error rate a step must stay under.")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this path.")
+    return parser.parse_args()
+
+
+def request_bodies(features: List[str], data: str | None, rows: int, seed: int) -> List[bytes]:
+    # One pre-encoded /predict body per flow, positional in the server's GET /schema order
+    df = clean_features(load_dataset(data)) if data else generate_flows(rows, seed=seed)
+    missing = [name for name in features if name not in df.columns]
+    if missing:
+        raise ValueError(f"The flows lack {len(missing)} of the model's features, e.g. {missing[:3]}.")
+    X = df[features].to_numpy(dtype=np.float64)
+    X = X[np.isfinite(X).all(axis=1)]  # inf/NaN are not valid JSON numbers
+    if len(X) == 0:
+        raise ValueError("No flow has only finite feature values.")
+    return [json.dumps({"values": row}).encode("utf-8") for row in X.tolist()]
+
+
+class StepStats:
+    """Latencies and errors of the requests scheduled inside one measured window.
+
+    ``latency`` runs from the time a request was due to be sent, so a stalled
+    server also delays (and penalises) the requests queued behind it; ``service``
+    runs from the time it was actually handed to the client.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.service: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.last_finish = 0.0
+
+    def record(self, due: float, sent: float, finished: float, error: str | None) -> None:
+        self.last_finish = max(self.last_finish, finished)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            return
+        self.latencies.append(finished - due)
+        self.service.append(finished - sent)
+
+    def summary(self, measure_from: float, duration: float) -> Dict[str, Any]:
+        ok = len(self.latencies)
+        failed = sum(self.errors.values())
+        elapsed = max(self.last_finish - measure_from, duration)  # late responses stretch the window
+        latencies_ms = np.asarray(self.latencies) * 1000.0
+        service_ms = np.asarray(self.service) * 1000.0
+        counts = np.bincount(np.searchsorted(HISTOGRAM_EDGES_MS, latencies_ms), minlength=len(HISTOGRAM_EDGES_MS) + 1)
+
+        def pct(values: np.ndarray, q: float) -> float | None:
+            return float(np.percentile(values, q)) if len(values) else None
+
+        return {
+            "requests": ok + failed,
+            "ok": ok,
+            "errors": failed,
+            "error_rate": failed / (ok + failed) if ok + failed else 0.0,
+            "errors_by_kind": dict(self.errors),
+            "sent_rps": (ok + failed) / duration,
+            "achieved_rps": ok / elapsed,
+            "p50_ms": pct(latencies_ms, 50),
+            "p90_ms": pct(latencies_ms, 90),
+            "p99_ms": pct(latencies_ms, 99),
+            "p999_ms": pct(latencies_ms, 99.9),
+            "max_ms": float(latencies_ms.max()) if ok else None,
+            "service_p50_ms": pct(service_ms, 50),
+            "service_p99_ms": pct(service_ms, 99),
+            "histogram": {"edges_ms": HISTOGRAM_EDGES_MS, "counts": counts.tolist()},
+        }
+
+
+async def send(client: httpx.AsyncClient, url: str, body: bytes, due: float, stats: StepStats | None) -> None:
+    sent = time.perf_counter()
+    try:
+        response = await client.post(url, content=body)
+        error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+    except httpx.HTTPError as exc:
+        error = type(exc).__name__
+    if stats is not None:  # None during warm-up
+        stats.record(due, sent, time.perf_counter(), error)
+
+
+async def open_loop(client: httpx.AsyncClient, url: str, bodies: List[bytes], rate: float, args: argparse.Namespace) -> Dict[str, Any]:
+    # Requests leave on a schedule whatever the server does; each is its own task
+    rng = np.random.default_rng(args.seed)
+    stats = StepStats()
+    in_flight: set = set()
+    due = time.perf_counter()
+    measure_from = due + args.warmup
+    stop_at = measure_from + args.duration
+    i = 0
+    while due < stop_at:
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(client, url, bodies[i % len(bodies)], due, stats if due >= measure_from else None))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        i += 1
+        due += rng.exponential(1.0 / rate) if args.arrivals == "poisson" else 1.0 / rate
+    if in_flight:
+        await asyncio.wait(in_flight)  # responses that arrive after the window still count
+    return {"mode": "open", "offered_rps": rate, **stats.summary(measure_from, args.duration)}
+
+
+async def closed_loop(client: httpx.AsyncClient, url: str, bodies: List[bytes], concurrency: int, args: argparse.Namespace) -> Dict[str, Any]:
+    # `concurrency` users, each sending its next request as soon as the last one returns
+    stats = StepStats()
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+    cursor = 0
+
+    async def user() -> None:
+        nonlocal cursor
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            body = bodies[cursor % len(bodies)]
+            cursor += 1
+            await send(client, url, body, started, stats if started >= measure_from else None)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return {"mode": "closed", "concurrency": concurrency, **stats.summary(measure_from, args.duration)}
+
+
+def meets_slo(step: Dict[str, Any], args: argparse.Namespace) -> bool:
+    if step["p99_ms"] is None or step["p99_ms"] > args.slo_p99_ms or step["error_rate"] > args.slo_error_rate:
+        return False
+    # Compared with what was actually sent: Poisson arrivals scatter around the nominal rate
+    return step["mode"] == "closed" or step["achieved_rps"] >= MIN_ACHIEVED_RATIO * step["sent_rps"]
+
+
+async def run_steps(base_url: str, bodies: List[bytes], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    levels = [float(r) for r in args.rate.split(",")] if args.rate else [int(c) for c in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    steps = []
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout, headers={"content-type": "application/json"}) as client:
+        for level in levels:
+            if args.rate:
+                step = await open_loop(client, base_url + "/predict", bodies, level, args)
+            else:
+                step = await closed_loop(client, base_url + "/predict", bodies, level, args)
+            step["meets_slo"] = meets_slo(step, args)
+            steps.append(step)
+            print(format_step(step))
+            if args.rate and not step["meets_slo"]:
+                break  # past saturation higher rates only queue further
+    return steps
+
+
+def start_in_process(model: str, engine: str) -> Tuple[str, Any]:
+    # create_app() reads the remaining IDS_* settings from the environment
+    os.environ.update({"IDS_ENGINE": engine, "IDS_RELOAD_POLL_S": "0"})
+    os.environ.setdefault("IDS_MODEL_N_JOBS", "1")  # as under src.prefork
+    import uvicorn
+    from src.serve import create_app
+
+    app = create_app(model)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)  # see prefork.bind_socket
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 60.0
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("The in-process server did not start.")
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+    return f"http://127.0.0.1:{sock.getsockname()[1]}", stop
+
+
+def format_step(step: Dict[str, Any]) -> str:
+    level = f"{step['offered_rps']:.0f} rps" if step["mode"] == "open" else f"c={step['concurrency']}"
+    ms = lambda value: "-" if value is None else f"{value:.1f}"
+    return (
+        f"{level:>10} {step['achieved_rps']:>9.1f} {ms(step['p50_ms']):>8} {ms(step['p99_ms']):>8} "
+        f"{ms(step['p999_ms']):>8} {step['error_rate']:>7.2%} {'ok' if step['meets_slo'] else 'MISS':>5}"
+    )
+
+
+def format_histogram(step: Dict[str, Any], width: int = 40) -> str:
+    counts = step["histogram"]["counts"]
+    edges = step["histogram"]["edges_ms"]
+    labels = [f"<= {edge} ms" for edge in edges] + [f"> {edges[-1]} ms"]
+    peak = max(counts) or 1
+    total = sum(counts) or 1
+    lines = []
+    for label, count in zip(labels, counts):
+        if count:
+            lines.append(f"{label:>11} {count:>8} {count / total:>6.1%} {'#' * max(1, round(width * count / peak))}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = parse_args()
+    base_url, stop = start_in_process(args.model, args.engine) if args.in_process else (args.url.rstrip("/"), None)
+    try:
+        schema = httpx.get(f"{base_url}/schema", timeout=10.0).json()
+        bodies = request_bodies(schema["features"], args.data, args.rows, args.seed)
+        print(f"Replaying {len(bodies):,} flows against {base_url}/predict (SLO: p99 <= {args.slo_p99_ms:g} ms, errors <= {args.slo_error_rate:.2%})")
+        print(f"{'load':>10} {'ok rps':>9} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>8} {'errors':>7} {'SLO':>5}")
+        steps = asyncio.run(run_steps(base_url, bodies, args))
+    finally:
+        if stop is not None:
+            stop()
+
+    sustained = [step for step in steps if step["meets_slo"]]
+    best = max(sustained, key=lambda step: step["achieved_rps"]) if sustained else None
+    shown = best or steps[-1]
+    print(f"\nLatency histogram ({'best step within SLO' if best else 'last step'}):")
+    print(format_histogram(shown))
+    if best:
+        print(f"✔ Max sustainable: {best['achieved_rps']:.1f} req/s within the SLO")
+    else:
+        print("✘ No step met the SLO")
+
+    if args.output:
+        settings = {key: getattr(args, key) for key in ("rate", "concurrency", "arrivals", "duration", "warmup", "connections", "timeout", "data", "rows")}
+        report = {
+            "target": "in-process" if args.in_process else base_url,
+            "model_id": schema.get("model_id"),
+            "settings": settings,
+            "slo": {"p99_ms": args.slo_p99_ms, "error_rate": args.slo_error_rate},
+            "max_sustainable_rps": best["achieved_rps"] if best else None,
+            "steps": steps,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
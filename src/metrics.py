@@ -0,0 +1,217 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Upper bounds (seconds) of every latency histogram; fixed, so per-thread shards merge by adding counts
+LATENCY_BUCKETS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Where a scoring request's time goes: body parsing, feature assembly, inf/NaN handling, scaler.transform, model call(s)
+STAGES = ("parse", "assemble", "preprocess", "scale", "model")
+# Route label of requests that matched no route (404s), so scanners cannot blow up the label set
+UNMATCHED_ROUTE = "unmatched"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (labels, value) pairs of one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+def _new_series() -> List[Any]:
+    # Count per bucket (not cumulative; the last bucket is +Inf), then the sum of observed values
+    return [0] * (len(LATENCY_BUCKETS_S) + 1) + [0.0]
+
+
+class _Shard:
+    # Everything one thread records; only that thread writes it
+    __slots__ = ("stages", "routes", "responses", "predictions", "flows")
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, List[Any]] = {stage: _new_series() for stage in STAGES}
+        self.routes: Dict[str, List[Any]] = {}
+        self.responses: Dict[Tuple[str, int], int] = {}
+        self.predictions: Dict[str, int] = {}
+        self.flows = 0
+
+
+class ServingMetrics:
+    """Request, stage and prediction metrics of serve.py, rendered as Prometheus text.
+
+    Every thread records into its own shard (the event loop, each inference
+    thread), so recording takes no lock and never waits for a scrape; only the
+    first record of a new thread briefly locks to register its shard. A scrape
+    adds the shards up, so it may miss a record being written at that moment and
+    pick it up on the next one. Latencies go into fixed buckets
+    (``LATENCY_BUCKETS_S``): each record is a bisect and two additions.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.in_flight = 0  # changed only on the event loop
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def _new_shard(self) -> _Shard:
+        shard = self._local.shard = _Shard()
+        with self._shards_lock:
+            self._shards.append(shard)
+        return shard
+
+    # --- recording (hot path: the shard lookup and bucket update are inlined) ---
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        try:
+            series = self._local.shard.stages[stage]
+        except AttributeError:
+            series = self._new_shard().stages[stage]
+        series[bisect_left(LATENCY_BUCKETS_S, seconds)] += 1
+        series[-1] += seconds
+
+    def observe_score(self, preprocess: float, scale: float, model: float) -> None:
+        # The three stages of ModelVersion.score in one call
+        try:
+            stages = self._local.shard.stages
+        except AttributeError:
+            stages = self._new_shard().stages
+        series = stages["preprocess"]
+        series[bisect_left(LATENCY_BUCKETS_S, preprocess)] += 1
+        series[-1] += preprocess
+        series = stages["scale"]
+        series[bisect_left(LATENCY_BUCKETS_S, scale)] += 1
+        series[-1] += scale
+        series = stages["model"]
+        series[bisect_left(LATENCY_BUCKETS_S, model)] += 1
+        series[-1] += model
+
+    def observe_request(self, route: str, status: int, seconds: float) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        series = shard.routes.get(route)
+        if series is None:
+            series = shard.routes[route] = _new_series()
+        series[bisect_left(LATENCY_BUCKETS_S, seconds)] += 1
+        series[-1] += seconds
+        key = (route, status)
+        shard.responses[key] = shard.responses.get(key, 0) + 1
+
+    def count_predictions(self, labels: Any) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        n = len(labels)
+        shard.flows += n
+        predictions = shard.predictions
+        if n == 1:  # /predict
+            label = labels[0]
+            predictions[label] = predictions.get(label, 0) + 1
+            return
+        for label in labels.tolist():  # few classes: a dict beats np.unique on string labels
+            predictions[label] = predictions.get(label, 0) + 1
+
+    # --- scraping ---
+    def _merged(self) -> Dict[str, Any]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        stages: Dict[str, List[Any]] = {}
+        routes: Dict[str, List[Any]] = {}
+        responses: Dict[Tuple[str, int], int] = {}
+        predictions: Dict[str, int] = {}
+        flows = 0
+        for shard in shards:
+            # list() copies each dict in one step, so a writer adding a key cannot break the iteration
+            for merged, series_by_key in ((stages, shard.stages), (routes, shard.routes)):
+                for key, series in list(series_by_key.items()):
+                    if series[-1] or any(series[:-1]):  # skip stages that never ran (e.g. parse on binary-only traffic)
+                        total = merged.get(key)
+                        merged[key] = list(series) if total is None else [a + b for a, b in zip(total, series)]
+            for key, count in list(shard.responses.items()):
+                responses[key] = responses.get(key, 0) + count
+            for label, count in list(shard.predictions.items()):
+                predictions[str(label)] = predictions.get(str(label), 0) + count
+            flows += shard.flows
+        return {"stages": stages, "routes": routes, "responses": responses, "predictions": predictions, "flows": flows}
+
+    def render(self, extra: Iterable[Tuple[str, str, str, Samples]] = ()) -> str:
+        """Prometheus text exposition; ``extra`` adds (name, type, help, samples) families, e.g. the active model."""
+        merged = self._merged()
+        lines: List[str] = []
+        lines += _histogram("ids_request_duration_seconds", "Time from request start to response, by route.", "route", merged["routes"])
+        lines += _family("ids_requests_total", "counter", "Responses by route and HTTP status.", [
+            ({"route": route, "status": str(status)}, count) for (route, status), count in sorted(merged["responses"].items())
+        ])
+        lines += _family("ids_requests_in_flight", "gauge", "Requests being handled.", [({}, self.in_flight)])
+        lines += _histogram("ids_stage_duration_seconds", "Time per scoring stage and call (" + ", ".join(STAGES) + ").", "stage", merged["stages"])
+        lines += _family("ids_flows_scored_total", "counter", "Flows scored (cache hits included).", [({}, merged["flows"])])
+        lines += _family("ids_predictions_total", "counter", "Scored flows by predicted class.", [
+            ({"class": label}, count) for label, count in sorted(merged["predictions"].items())
+        ])
+        for name, kind, help_text, samples in extra:
+            lines += _family(name, kind, help_text, samples)
+        lines += _family("ids_process_start_time_seconds", "gauge", "Unix time the metrics started.", [({}, self.started_at)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items()) + "}"
+    return f"{name} {value!r}" if isinstance(value, float) else f"{name} {value}"
+
+
+def _family(name: str, kind: str, help_text: str, samples: Samples) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + [_sample(name, labels, value) for labels, value in samples]
+
+
+def _histogram(name: str, help_text: str, label: str, series: Dict[str, List[Any]]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key in sorted(series):
+        counts, total = series[key][:-1], series[key][-1]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_S + (float("inf"),), counts):
+            cumulative += count
+            lines.append(_sample(f"{name}_bucket", {label: key, "le": "+Inf" if bound == float("inf") else repr(bound)}, cumulative))
+        lines.append(_sample(f"{name}_sum", {label: key}, float(total)))
+        lines.append(_sample(f"{name}_count", {label: key}, cumulative))
+    return lines
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into ``metrics`` by route template and status.
+
+    Plain ASGI rather than Starlette's BaseHTTPMiddleware, which would add a task
+    and a stream per request; this costs a closure and two clock reads.
+    """
+
+    def __init__(self, app: Any, metrics: ServingMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        started = time.perf_counter()
+        status = 500  # unless the app starts a response
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight -= 1
+            route = scope.get("route")  # set by FastAPI's router on the shared scope
+            if route is not None:
+                label = route.path
+            else:  # FastAPI's own fixed routes (/openapi.json, /docs) set none; 404s get one shared label
+                label = scope["path"] if status != 404 else UNMATCHED_ROUTE
+            metrics.observe_request(label, status, time.perf_counter() - started)
@@ -0,0 +1,323 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from src.artifact import is_artifact, load_artifact
+from src.cascade import Cascade
+from src.forest_compiler import CompiledForest, compile_forest
+from src.ingest import FeatureSchema
+from src.preprocess import Preprocessing
+
+# Dummy batch sizes scored before a new version takes traffic (pages in the trees, starts thread pools)
+WARM_BATCH_SIZES = (1, 64)
+
+
+class ModelVersion:
+    """One loaded bundle with everything needed to score it; never modified once published."""
+
+    def __init__(
+        self,
+        bundle: Dict[str, Any],
+        model_id: str,
+        source_path: str,
+        engine: str = "sklearn",
+        compiled_path: str | None = None,
+        n_jobs: int | None = None,
+        cascade: bool = True,
+    ) -> None:
+        self.model_id = model_id
+        self.source_path = source_path
+        self.engine = engine
+        self.features = list(bundle["features"])
+        self.schema = FeatureSchema(self.features)
+        self.scaler = bundle["scaler"]
+        self.preprocessing = Preprocessing.from_bundle(bundle["preprocessing"]) if "preprocessing" in bundle else None
+        model = bundle["model"]
+        if engine == "compiled" and not isinstance(model, CompiledForest):
+            model = load_compiled(compiled_path, model, model_id, self.features) if compiled_path else compile_forest(model)
+        if n_jobs is not None and hasattr(model, "n_jobs"):
+            model.n_jobs = n_jobs  # threads per predict_proba call; bundles are trained with -1 (all cores)
+        self.model = model
+        self.classes_ = model.classes_
+        # Optional first-stage screen (train_supervised.py cascade:); cascade=False always uses the full forest
+        self.cascade = None
+        if cascade and bundle.get("cascade") is not None:
+            screen = bundle["cascade"]["model"]
+            if engine == "compiled" and hasattr(screen, "estimators_"):
+                screen = compile_forest(screen)
+            elif n_jobs is not None and hasattr(screen, "n_jobs"):
+                screen.n_jobs = n_jobs
+            self.cascade = Cascade.from_bundle(bundle["cascade"], screen)
+        self.loaded_at = time.time()
+        self.warm_seconds = 0.0
+        self.metrics: Any | None = None  # stage timer (src.metrics.ServingMetrics); set once warm, so warm-up rows are not traffic
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    def score(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Same pipeline as training: inf/NaN handling, scaler, one predict_proba pass
+        started = time.perf_counter()
+        if self.preprocessing is not None:
+            X = self.preprocessing.apply(X)
+        else:
+            X = np.asarray(X, dtype=np.float64)  # one dtype whichever route decoded the request
+        preprocessed = time.perf_counter()
+        X = self.scaler.transform(X)
+        scaled = time.perf_counter()
+        if self.cascade is not None:
+            labels, confidences, _ = self.cascade.predict(self.model, X)  # only uncertain flows reach the forest
+        else:
+            proba = self.model.predict_proba(X)
+            best = proba.argmax(axis=1)  # same argmax model.predict uses internally
+            labels, confidences = self.classes_[best], proba[np.arange(len(best)), best]
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe_score(preprocessed - started, scaled - preprocessed, time.perf_counter() - scaled)
+        return labels, confidences
+
+    def warm(self) -> None:
+        started = time.perf_counter()
+        for n_rows in WARM_BATCH_SIZES:
+            self.score(np.zeros((n_rows, self.schema.n_features)))
+        if self.cascade is not None:
+            self.cascade.flows = self.cascade.escalated = 0  # warm-up rows are not traffic
+        self.warm_seconds = time.perf_counter() - started
+
+    # --- in-flight accounting, so a replaced version can be drained ---
+    def acquire(self) -> None:
+        with self._idle:
+            self._inflight += 1
+
+    def release(self) -> None:
+        with self._idle:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout=timeout)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "source_path": self.source_path,
+            "engine": self.engine,
+            "n_features": self.schema.n_features,
+            "classes": [str(c) for c in self.classes_],
+            "loaded_at": self.loaded_at,
+            "warm_seconds": round(self.warm_seconds, 4),
+            "inflight": self._inflight,
+            "cascade": self.cascade.stats() if self.cascade is not None else None,
+        }
+
+
+def load_compiled(path: str, model: Any, model_id: str, features: List[str]) -> CompiledForest:
+    # A pre-exported .npz is only used for the bundle it was compiled from
+    compiled = CompiledForest.load(path)
+    if compiled.source_model_id != model_id:
+        raise ValueError(
+            f"{path} was compiled from model {compiled.source_model_id or '(unrecorded)'}, not {model_id}; "
+            "re-export it with python -m src.forest_compiler."
+        )
+    expected = (len(features), [str(c) for c in model.classes_], len(model.estimators_), sum(e.tree_.node_count for e in model.estimators_))
+    actual = (compiled.n_features_in_, [str(c) for c in compiled.classes_], compiled.n_trees, compiled.n_nodes)
+    if actual != expected:
+        raise ValueError(f"{path} does not match model {model_id} (features, classes, trees, nodes): {actual} != {expected}.")
+    return compiled
+
+
+def bundle_model_id(bundle: Dict[str, Any], path: str | Path) -> str:
+    # Bundles record their registry id; older ones only have the training timestamp
+    if bundle.get("model_id"):
+        return str(bundle["model_id"])
+    if bundle.get("trained_at"):
+        return f"rf-{bundle['trained_at']}"
+    return f"{Path(path).name}@{int(os.stat(path).st_mtime)}"
+
+
+class ModelManager:
+    """Serves one ModelVersion at a time and swaps in new ones without downtime.
+
+    A reload unpickles, optionally compiles, and warms the new bundle in a
+    background thread while the current version keeps scoring. The reference
+    is then swapped under a lock, so each request sees exactly one version for
+    its whole lifetime (``with manager.lease() as version``). The replaced
+    version is kept until its in-flight requests finish (or ``drain_timeout``
+    passes) and is then dropped, which frees it once the last request lets go.
+    ``watch()`` polls the bundle file and reloads when it has changed and then
+    stayed unchanged for one poll, so a half-written file is never loaded.
+    """
+
+    def __init__(
+        self,
+        bundle_path: str | Path,
+        registry_path: str | Path | None = None,
+        engine: str = "sklearn",
+        poll_interval: float = 2.0,
+        drain_timeout: float = 30.0,
+        verify_artifacts: bool = False,
+        n_jobs: int | None = None,
+        cascade: bool = True,
+        metrics: Any | None = None,
+    ) -> None:
+        self.bundle_path = Path(bundle_path)
+        self.registry_path = Path(registry_path) if registry_path else self.bundle_path.parent / "model_registry.json"
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.verify_artifacts = verify_artifacts
+        self.n_jobs = n_jobs
+        self.cascade = cascade
+        self.metrics = metrics  # given to each version once it is warm
+
+        self._lock = threading.Lock()
+        self._current: ModelVersion | None = None
+        self._draining: List[ModelVersion] = []
+        self._reload_lock = threading.Lock()  # one load at a time
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._seen_stat: Tuple[int, int] | None = None
+        self._pending_stat: Tuple[int, int] | None = None
+        self.reloads = 0
+        self.last_error: str | None = None
+
+    # --- serving side ---
+    @property
+    def current(self) -> ModelVersion:
+        if self._current is None:
+            raise RuntimeError("No model loaded.")
+        return self._current
+
+    @contextmanager
+    def lease(self) -> Iterator[ModelVersion]:
+        with self._lock:
+            version = self.current
+            version.acquire()
+        try:
+            yield version
+        finally:
+            version.release()
+
+    # --- loading ---
+    def load(self, path: str | Path | None = None, compiled_path: str | None = None) -> ModelVersion:
+        """Load, warm and publish a bundle in the calling thread; returns the new version."""
+        path = Path(path) if path is not None else self.bundle_path
+        with self._reload_lock:
+            stat = self._stat(path)
+            bundle = self._read_bundle(path)
+            version = ModelVersion(bundle, bundle_model_id(bundle, path), str(path), engine=self.engine, compiled_path=compiled_path, n_jobs=self.n_jobs, cascade=self.cascade)
+            del bundle
+            version.warm()
+            version.metrics = self.metrics
+
+            with self._lock:
+                previous, self._current = self._current, version
+                if previous is not None:
+                    self._draining.append(previous)
+            if path == self.bundle_path:
+                self._seen_stat = stat
+            self.reloads += previous is not None
+            self.last_error = None
+
+        if previous is not None:
+            self._drain(previous)
+        return version
+
+    def _read_bundle(self, path: Path) -> Dict[str, Any]:
+        # .ids.json artifacts are memory-mapped (the compiled engine maps its arrays directly)
+        if is_artifact(path):
+            return load_artifact(path, engine=self.engine, verify=self.verify_artifacts)
+        import joblib  # pickled bundles only; unpickling them imports scikit-learn as well
+
+        return joblib.load(path)
+
+    def reload_async(self, path: str | Path | None = None) -> threading.Thread:
+        # Admin-triggered reload; the caller gets the thread (join it to wait)
+        thread = threading.Thread(target=self._safe_load, args=(path,), name="model-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def path_for(self, model_id: str) -> Path:
+        # A registered version's artifact, for switching to (or back to) a specific model
+        with open(self.registry_path, "r", encoding="utf-8") as f:
+            registry = json.load(f)
+        for entry in reversed(registry):
+            if entry.get("model_id") == model_id:
+                # Stay on the artifact format when that is what is being served
+                if is_artifact(self.bundle_path) and entry.get("artifact_path"):
+                    return Path(entry["artifact_path"])
+                return Path(entry["model_path"])
+        raise KeyError(f"Model '{model_id}' is not in {self.registry_path}.")
+
+    def _safe_load(self, path: str | Path | None) -> None:
+        try:
+            self.load(path)
+        except Exception as exc:  # keep serving the current version
+            self.last_error = f"{type(exc).__name__}: {exc}"
+
+    def _drain(self, version: ModelVersion) -> None:
+        version.wait_idle(self.drain_timeout)
+        with self._lock:
+            if version in self._draining:
+                self._draining.remove(version)
+
+    # --- watching ---
+    @staticmethod
+    def _stat(path: Path) -> Tuple[int, int] | None:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self) -> None:
+        if self._watcher is None and self.poll_interval > 0:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch_loop, name="model-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+    def _watch_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+
+    def poll(self) -> bool:
+        # One watcher step, also driven by src.prefork's parent; True when a new version was published
+        stat = self._stat(self.bundle_path)
+        if stat is None or stat == self._seen_stat:
+            self._pending_stat = None
+            return False
+        if stat != self._pending_stat:
+            self._pending_stat = stat  # changed: wait one more poll for the writer to finish
+            return False
+        self._pending_stat = None
+        self._safe_load(None)
+        if self.last_error is not None:
+            self._seen_stat = stat  # do not retry a broken file until it changes again
+            return False
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            current = self._current.describe() if self._current is not None else None
+            draining = [version.describe() for version in self._draining]
+        return {
+            "current": current,
+            "draining": draining,
+            "bundle_path": str(self.bundle_path),
+            "watching": self._watcher is not None,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
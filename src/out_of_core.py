@@ -0,0 +1,206 @@
+import glob
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from src.dataset_cache import file_sha256
+from src.features import LABEL_COLUMN, iter_dataset_chunks
+
+# Rows processed per step when scaling the memory-mapped matrices in place
+ROW_BLOCK = 65_536
+# Bytes of columns gathered at once when computing exact medians
+MEDIAN_GATHER_BYTES = 256 * 2**20
+
+
+def resolve_paths(dataset_cfg: Dict[str, Any]) -> List[str]:
+    # `paths` may mix plain files and globs; `path` keeps working for single-file configs
+    patterns = dataset_cfg.get("paths") or [dataset_cfg["path"]]
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    files: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No dataset files match '{pattern}'.")
+        files.extend(m for m in matches if m not in files)
+    return files
+
+
+def combined_sha256(paths: Sequence[str]) -> Tuple[str, Dict[str, str]]:
+    per_file = {path: file_sha256(path) for path in paths}
+    digest = hashlib.sha256(json.dumps(per_file, sort_keys=True).encode("utf-8")).hexdigest()
+    return digest, per_file
+
+
+def _iter_blocks(path: str, chunksize: int, cache: Any = None) -> Iterator[pd.DataFrame]:
+    # Cleaned blocks of one file: memmapped slices from the cache, or a streaming CSV parse
+    if cache is not None:
+        df = cache.load(path)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from iter_dataset_chunks(path, chunksize=chunksize)
+
+
+def _label_counts(path: str, chunksize: int, cache: Any = None) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for block in _iter_blocks(path, chunksize, cache):
+        for label, n in block[LABEL_COLUMN].astype(str).value_counts().items():
+            counts[label] = counts.get(label, 0) + int(n)
+    return counts
+
+
+def plan_sample(
+    file_counts: Dict[str, Dict[str, int]],
+    fraction: float = 1.0,
+    class_caps: Dict[str, int] | None = None,
+) -> Dict[str, Dict[str, int]]:
+    """Rows to keep per (file, class).
+
+    Every file keeps ``fraction`` of each class. A class cap is shared out across
+    files in proportion to how many rows of that class each file holds, so capping
+    BENIGN still keeps benign traffic from every day.
+    """
+    class_caps = class_caps or {}
+    totals: Dict[str, int] = {}
+    for counts in file_counts.values():
+        for label, n in counts.items():
+            totals[label] = totals.get(label, 0) + n
+
+    quotas: Dict[str, Dict[str, int]] = {}
+    for path, counts in file_counts.items():
+        quotas[path] = {}
+        for label, n in counts.items():
+            keep = n * fraction
+            if label in class_caps:
+                keep = min(keep, class_caps[label] * n / totals[label])
+            quotas[path][label] = int(round(keep))
+    return quotas
+
+
+def build_split_matrices(
+    paths: Sequence[str],
+    workdir: str | Path,
+    test_size: float = 0.2,
+    fraction: float = 1.0,
+    class_caps: Dict[str, int] | None = None,
+    chunksize: int = 25_000,
+    random_state: int = 42,
+    cache: Any = None,
+) -> Dict[str, Any]:
+    """Stream every file once (twice without a cache) into float32 train/test memmaps.
+
+    Pass 1 counts labels per file. Pass 2 keeps an exact, stratified random sample per
+    (file, class), assigns each kept row to train or test with the same stratification,
+    and writes it straight into ``X_train.npy`` / ``X_test.npy``. Memory holds one block
+    plus one selection mask per (file, class), whatever the number of files.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(random_state)
+
+    file_counts = {path: _label_counts(path, chunksize, cache) for path in paths}
+    quotas = plan_sample(file_counts, fraction=fraction, class_caps=class_caps)
+
+    # Per (file, class): which of its rows are kept (0 = drop, 1 = train, 2 = test)
+    assignments: Dict[str, Dict[str, np.ndarray]] = {}
+    n_train = n_test = 0
+    for path in paths:
+        assignments[path] = {}
+        for label, n in file_counts[path].items():
+            keep = quotas[path][label]
+            target = np.zeros(n, dtype=np.uint8)
+            chosen = rng.choice(n, size=keep, replace=False)
+            n_label_test = int(round(keep * test_size))
+            target[chosen[:n_label_test]] = 2
+            target[chosen[n_label_test:]] = 1
+            assignments[path][label] = target
+            n_test += n_label_test
+            n_train += keep - n_label_test
+
+    columns: List[str] | None = None
+    X_train = X_test = None
+    y_train_codes = np.empty(n_train, dtype=np.int16)
+    y_test_codes = np.empty(n_test, dtype=np.int16)
+    classes: Dict[str, int] = {}
+    train_pos = test_pos = 0
+
+    for path in paths:
+        seen = {label: 0 for label in file_counts[path]}
+        for block in _iter_blocks(path, chunksize, cache):
+            if columns is None:
+                columns = block.drop(columns=[LABEL_COLUMN]).select_dtypes(include=[np.number]).columns.tolist()
+                X_train = np.lib.format.open_memmap(workdir / "X_train.npy", mode="w+", dtype=np.float32, shape=(n_train, len(columns)))
+                X_test = np.lib.format.open_memmap(workdir / "X_test.npy", mode="w+", dtype=np.float32, shape=(n_test, len(columns)))
+
+            labels = block[LABEL_COLUMN].astype(str).to_numpy()
+            target = np.empty(len(block), dtype=np.uint8)
+            for label in np.unique(labels):
+                rows = labels == label
+                n_rows = int(rows.sum())
+                target[rows] = assignments[path][label][seen[label]:seen[label] + n_rows]
+                seen[label] += n_rows
+            if not target.any():
+                continue
+
+            # Later files are aligned to the first file's columns; a missing column reads as NaN
+            values = block.reindex(columns=columns).to_numpy(dtype=np.float32)
+            values[~np.isfinite(values)] = np.nan
+            codes = np.array([classes.setdefault(label, len(classes)) for label in labels], dtype=np.int16)
+
+            for mask_value, X_out, y_out, pos in ((1, X_train, y_train_codes, train_pos), (2, X_test, y_test_codes, test_pos)):
+                rows = target == mask_value
+                n_rows = int(rows.sum())
+                X_out[pos:pos + n_rows] = values[rows]
+                y_out[pos:pos + n_rows] = codes[rows]
+            train_pos += int((target == 1).sum())
+            test_pos += int((target == 2).sum())
+
+    class_names = np.asarray(sorted(classes, key=classes.get), dtype=object)
+    return {
+        "X_train": X_train,
+        "X_test": X_test,
+        "y_train": class_names[y_train_codes],  # object array: shared string refs, 8 bytes per row
+        "y_test": class_names[y_test_codes],
+        "features": columns or [],
+        "file_counts": file_counts,
+        "quotas": quotas,
+    }
+
+
+def preprocess_in_place(X_train: np.ndarray, X_test: np.ndarray, clip: float = 1e6) -> Tuple[StandardScaler, np.ndarray]:
+    """Median-fill, clip and standardise both memmaps in place, fitted on the train split only.
+
+    Mirrors ``features.scale_features`` (NaN -> column median, clip to +-``clip``,
+    StandardScaler) but never holds more than one column or one row block in memory.
+    """
+    # Exact medians over groups of columns: a few sequential passes instead of one per column
+    n_rows, n_cols = X_train.shape
+    group = max(1, MEDIAN_GATHER_BYTES // max(1, 4 * n_rows))
+    medians = np.zeros(n_cols, dtype=np.float64)
+    for j in range(0, n_cols, group) if n_rows else ():
+        with np.errstate(all="ignore"):
+            part = np.nanmedian(np.asarray(X_train[:, j:j + group]), axis=0)
+        medians[j:j + group] = np.nan_to_num(part, nan=0.0)  # all-NaN column -> 0.0
+
+    scaler = StandardScaler()
+    for X in (X_train, X_test):
+        for start in range(0, X.shape[0], ROW_BLOCK):
+            block = X[start:start + ROW_BLOCK]
+            missing = np.isnan(block)
+            if missing.any():
+                block[missing] = np.take(medians, np.nonzero(missing)[1])
+            np.clip(block, -clip, clip, out=block)
+            if X is X_train:
+                scaler.partial_fit(block)
+
+    for X in (X_train, X_test):
+        for start in range(0, X.shape[0], ROW_BLOCK):
+            X[start:start + ROW_BLOCK] = scaler.transform(X[start:start + ROW_BLOCK])
+        X.flush()
+    return scaler, medians
@@ -0,0 +1,740 @@
+import argparse
+import ipaddress
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Project root on the path so `python src/pcap_flows.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.synthetic import feature_names
+
+# Record header magic -> (byte order, timestamp units per microsecond); pcapng is not supported
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1),
+    b"\xa1\xb2\xc3\xd4": (">", 1),
+    b"\x4d\x3c\xb2\xa1": ("<", 1000),  # nanosecond-resolution pcap
+    b"\xa1\xb2\x3c\x4d": (">", 1000),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 101)
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+PROTO_TCP = 6
+PROTO_UDP = 17
+TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG, TCP_ECE, TCP_CWR = (1 << bit for bit in range(8))
+# IPv4 addresses are keyed as IPv4-mapped IPv6 (::ffff:a.b.c.d), so one key layout covers both
+IPV4_MAPPED = np.uint64(0xFFFF << 32)
+
+# Canonical (direction-free) flow key: protocol, then the lower and the higher endpoint
+KEY_DTYPE = np.dtype([
+    ("proto", "u1"), ("a_hi", ">u8"), ("a_lo", ">u8"), ("a_port", ">u2"), ("b_hi", ">u8"), ("b_lo", ">u8"), ("b_port", ">u2"),
+])
+
+# Per-flow accumulators. Sums, minima and maxima merge across packet batches; the
+# info fields are first/last values and the endpoints are the flow's forward direction
+SUM_FIELDS = (
+    "n_fwd", "n_bwd", "fwd_bytes", "bwd_bytes", "fwd_bytes_sq", "bwd_bytes_sq",
+    "flow_iat_n", "flow_iat_sum", "flow_iat_sq", "fwd_iat_n", "fwd_iat_sum", "fwd_iat_sq", "bwd_iat_n", "bwd_iat_sum", "bwd_iat_sq",
+    "fwd_psh", "bwd_psh", "fwd_urg", "bwd_urg", "fin", "syn", "rst", "psh", "ack", "urg", "cwr", "ece",
+    "fwd_hdr", "bwd_hdr", "act_data_fwd", "active_n", "active_sum", "active_sq", "idle_n", "idle_sum", "idle_sq",
+)
+MIN_FIELDS = ("fwd_len_min", "bwd_len_min", "flow_iat_min", "fwd_iat_min", "bwd_iat_min", "fwd_hdr_min", "active_min", "idle_min")
+MAX_FIELDS = ("fwd_len_max", "bwd_len_max", "flow_iat_max", "fwd_iat_max", "bwd_iat_max", "active_max", "idle_max")
+INFO_FIELDS = ("start_ts", "last_ts", "last_fwd_ts", "last_bwd_ts", "active_start", "init_win_fwd", "init_win_bwd")
+ENDPOINT_FIELDS = ("src_hi", "src_lo", "src_port", "dst_hi", "dst_lo", "dst_port", "proto")
+S = {name: j for j, name in enumerate(SUM_FIELDS)}
+MN = {name: j for j, name in enumerate(MIN_FIELDS)}
+MX = {name: j for j, name in enumerate(MAX_FIELDS)}
+INFO = {name: j for j, name in enumerate(INFO_FIELDS)}
+EP = {name: j for j, name in enumerate(ENDPOINT_FIELDS)}
+
+# Flow identifier columns, as in the CICIDS exports that have them (clean_features drops them)
+ID_COLUMNS = ["Flow ID", "Source IP", "Source Port", "Destination IP", "Protocol", "Timestamp"]
+# CICIDS2017's bulk columns are zero in every published flow
+BULK_COLUMNS = ("Fwd Avg Bytes/Bulk", "Fwd Avg Packets/Bulk", "Fwd Avg Bulk Rate", "Bwd Avg Bytes/Bulk", "Bwd Avg Packets/Bulk", "Bwd Avg Bulk Rate")
+
+
+def _gather(data: np.ndarray, pos: np.ndarray, width: int) -> np.ndarray:
+    # (n, width) bytes starting at each position; positions past the end are clamped (callers mask them out)
+    start = np.clip(pos, 0, len(data) - width)
+    return data[start[:, None] + np.arange(width)]
+
+
+def _uint(data: np.ndarray, pos: np.ndarray, dtype: str) -> np.ndarray:
+    # One fixed-width integer per position, e.g. dtype '>u2' for a big-endian 16-bit field
+    width = np.dtype(dtype).itemsize
+    return _gather(data, pos, width).view(dtype)[:, 0]
+
+
+def _record_offsets(buf: bytes, endian: str) -> Tuple[np.ndarray, int]:
+    # Start of every complete record in ``buf`` and the offset where the first incomplete one begins.
+    # The only per-record Python work in the reader: each offset depends on the previous record's length
+    caplen_at = struct.Struct(endian + "I").unpack_from
+    starts = array("q")
+    pos, end = 0, len(buf)
+    while pos + 16 <= end:
+        next_pos = pos + 16 + caplen_at(buf, pos + 8)[0]
+        if next_pos > end:
+            break
+        starts.append(pos)
+        pos = next_pos
+    return np.frombuffer(starts, dtype=np.int64), pos
+
+
+def _parse_packets(buf: bytes, starts: np.ndarray, endian: str, ts_divisor: int, linktype: int) -> Dict[str, np.ndarray]:
+    """Header fields of every TCP/UDP packet in ``buf``, one array per field.
+
+    Other protocols, non-first IP fragments and packets captured too short to
+    hold their TCP/UDP header are dropped. Payload lengths come from the IP
+    header, so captures with a small snaplen still give true byte counts.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    u32 = endian + "u4"
+    ts_sec = _uint(data, starts, u32).astype(np.int64)
+    ts_frac = _uint(data, starts + 4, u32).astype(np.int64)
+    caplen = _uint(data, starts + 8, u32).astype(np.int64)
+    l2 = starts + 16
+    end = l2 + caplen
+
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = _uint(data, l2 + 12, ">u2").astype(np.int64)
+        l3 = l2 + 14
+        vlan = np.isin(ethertype, ETHERTYPE_VLAN)
+        ethertype = np.where(vlan, _uint(data, l2 + 16, ">u2"), ethertype)
+        l3 = np.where(vlan, l3 + 4, l3)
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = _uint(data, l2 + 14, ">u2").astype(np.int64)
+        l3 = l2 + 16
+    elif linktype in LINKTYPE_RAW or linktype in (LINKTYPE_IPV4, LINKTYPE_IPV6):
+        version = data[np.minimum(l2, len(data) - 1)] >> 4
+        ethertype = np.select([version == 4, version == 6], [ETHERTYPE_IPV4, ETHERTYPE_IPV6], 0)
+        l3 = l2
+    else:
+        raise ValueError(f"Unsupported pcap link type {linktype} (expected Ethernet, raw IP or Linux cooked capture).")
+
+    v4 = (ethertype == ETHERTYPE_IPV4) & (l3 + 20 <= end)
+    v6 = (ethertype == ETHERTYPE_IPV6) & (l3 + 40 <= end)
+    ihl = (data[np.minimum(l3, len(data) - 1)] & 0x0F).astype(np.int64) * 4
+    ip_header = np.where(v6, 40, ihl)
+    proto = np.where(v6, data[np.minimum(l3 + 6, len(data) - 1)], data[np.minimum(l3 + 9, len(data) - 1)])
+    ip_payload = np.where(v6, _uint(data, l3 + 4, ">u2").astype(np.int64), _uint(data, l3 + 2, ">u2").astype(np.int64) - ihl)
+    first_fragment = v6 | ((_uint(data, l3 + 6, ">u2") & 0x1FFF) == 0)
+
+    l4 = l3 + ip_header
+    tcp = (proto == PROTO_TCP) & (l4 + 20 <= end)
+    udp = (proto == PROTO_UDP) & (l4 + 8 <= end)
+    keep = (v4 | v6) & first_fragment & (tcp | udp)
+    idx = np.flatnonzero(keep)
+    v6, l3, l4, tcp = v6[idx], l3[idx], l4[idx], tcp[idx]
+
+    src_hi = np.where(v6, _uint(data, l3 + 8, ">u8"), np.uint64(0))
+    src_lo = np.where(v6, _uint(data, l3 + 16, ">u8"), IPV4_MAPPED | _uint(data, l3 + 12, ">u4").astype(np.uint64))
+    dst_hi = np.where(v6, _uint(data, l3 + 24, ">u8"), np.uint64(0))
+    dst_lo = np.where(v6, _uint(data, l3 + 32, ">u8"), IPV4_MAPPED | _uint(data, l3 + 16, ">u4").astype(np.uint64))
+    l4_header = np.where(tcp, (_uint(data, l4 + 12, "u1") >> 4).astype(np.int64) * 4, 8)
+    return {
+        "ts": ((ts_sec[idx] * 1_000_000) + ts_frac[idx] // ts_divisor).astype(np.float64),  # microseconds, as CICFlowMeter reports
+        "src_hi": src_hi,
+        "src_lo": src_lo,
+        "src_port": _uint(data, l4, ">u2").astype(np.uint64),
+        "dst_hi": dst_hi,
+        "dst_lo": dst_lo,
+        "dst_port": _uint(data, l4 + 2, ">u2").astype(np.uint64),
+        "proto": proto[idx].astype(np.uint64),
+        "payload": np.maximum(ip_payload[idx] - l4_header, 0).astype(np.float64),
+        "header": l4_header.astype(np.float64),
+        "flags": np.where(tcp, _uint(data, l4 + 13, "u1"), 0).astype(np.uint8),
+        "window": np.where(tcp, _uint(data, l4 + 14, ">u2").astype(np.float64), -1.0),
+    }
+
+
+def iter_packet_batches(path: str | Path, batch_bytes: int = 16 << 20) -> Iterator[Dict[str, np.ndarray]]:
+    """Parsed TCP/UDP packets of a libpcap file, ``batch_bytes`` of capture at a time."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+        if header[:4] == PCAPNG_MAGIC:
+            raise ValueError(f"{path} is pcapng; convert it first (editcap -F pcap in.pcapng out.pcap).")
+        if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+            raise ValueError(f"{path} is not a libpcap file.")
+        endian, ts_divisor = PCAP_MAGIC[header[:4]]
+        linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0FFFFFFF
+        carry = b""
+        while True:
+            block = f.read(batch_bytes)
+            buf = carry + block if carry else block
+            starts, consumed = _record_offsets(buf, endian)
+            if len(starts):
+                yield _parse_packets(buf, starts, endian, ts_divisor, linktype)
+            carry = buf[consumed:]
+            if not block:
+                break  # a truncated final record (capture cut mid-write) is ignored
+
+
+def _last_index(mask: np.ndarray, segment_first: np.ndarray) -> np.ndarray:
+    # For each position, the last index <= it where ``mask`` holds within its segment, or -1
+    idx = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.where(idx >= segment_first, idx, -1)
+
+
+def _stat_columns(n: np.ndarray, total: np.ndarray, squares: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Mean and sample standard deviation (CICFlowMeter's), 0 for fewer than one / two values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(n > 0, total / n, 0.0)
+        var = np.where(n > 1, np.maximum(squares - total * mean, 0.0) / (n - 1), 0.0)
+    return mean, np.sqrt(var)
+
+
+def _finite(values: np.ndarray) -> np.ndarray:
+    # Empty minima/maxima (+-inf) are reported as 0, like CICFlowMeter's empty statistics
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def _format_ips(hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+    # Formats each distinct address once (captures repeat a few hosts across many flows); IPv4-mapped print as dotted quads
+    unique, inverse = np.unique(np.column_stack([hi, lo]), axis=0, return_inverse=True)
+    text = []
+    for h, l in unique.tolist():
+        if h == 0 and l >> 32 == 0xFFFF:
+            text.append(str(ipaddress.IPv4Address(l & 0xFFFFFFFF)))
+        else:
+            text.append(str(ipaddress.IPv6Address((h << 64) | l)))
+    return np.array(text, dtype=object)[inverse.ravel()]
+
+
+def flow_frame(sums: np.ndarray, mins: np.ndarray, maxs: np.ndarray, info: np.ndarray, endpoints: np.ndarray) -> pd.DataFrame:
+    """CICIDS feature columns (plus ``ID_COLUMNS``) of finished flows from their accumulators."""
+    s = {name: sums[:, j] for name, j in S.items()}
+    # The last active period ends with the flow
+    last_active = info[:, INFO["last_ts"]] - info[:, INFO["active_start"]]
+    record = last_active > 0
+    active_n = s["active_n"] + record
+    active_sum = s["active_sum"] + np.where(record, last_active, 0.0)
+    active_sq = s["active_sq"] + np.where(record, last_active ** 2, 0.0)
+    active_min = np.minimum(mins[:, MN["active_min"]], np.where(record, last_active, np.inf))
+    active_max = np.maximum(maxs[:, MX["active_max"]], np.where(record, last_active, -np.inf))
+
+    duration = info[:, INFO["last_ts"]] - info[:, INFO["start_ts"]]
+    seconds = duration / 1e6
+    n_fwd, n_bwd = s["n_fwd"], s["n_bwd"]
+    packets = n_fwd + n_bwd
+    total_bytes = s["fwd_bytes"] + s["bwd_bytes"]
+    fwd_mean, fwd_std = _stat_columns(n_fwd, s["fwd_bytes"], s["fwd_bytes_sq"])
+    bwd_mean, bwd_std = _stat_columns(n_bwd, s["bwd_bytes"], s["bwd_bytes_sq"])
+    pkt_mean, pkt_std = _stat_columns(packets, total_bytes, s["fwd_bytes_sq"] + s["bwd_bytes_sq"])
+    flow_iat_mean, flow_iat_std = _stat_columns(s["flow_iat_n"], s["flow_iat_sum"], s["flow_iat_sq"])
+    fwd_iat_mean, fwd_iat_std = _stat_columns(s["fwd_iat_n"], s["fwd_iat_sum"], s["fwd_iat_sq"])
+    bwd_iat_mean, bwd_iat_std = _stat_columns(s["bwd_iat_n"], s["bwd_iat_sum"], s["bwd_iat_sq"])
+    active_mean, active_std = _stat_columns(active_n, active_sum, active_sq)
+    idle_mean, idle_std = _stat_columns(s["idle_n"], s["idle_sum"], s["idle_sq"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Zero-duration flows give inf (or NaN for 0/0), as in the CICIDS exports
+        flow_bytes_s = total_bytes / seconds
+        flow_packets_s = packets / seconds
+        fwd_packets_s = n_fwd / seconds
+        bwd_packets_s = n_bwd / seconds
+        down_up = np.where(n_fwd > 0, np.floor(n_bwd / n_fwd), 0.0)
+
+    columns: Dict[str, Any] = {
+        "Destination Port": endpoints[:, EP["dst_port"]].astype(np.float64),
+        "Flow Duration": duration,
+        "Total Fwd Packets": n_fwd,
+        "Total Backward Packets": n_bwd,
+        "Total Length of Fwd Packets": s["fwd_bytes"],
+        "Total Length of Bwd Packets": s["bwd_bytes"],
+        "Fwd Packet Length Max": _finite(maxs[:, MX["fwd_len_max"]]),
+        "Fwd Packet Length Min": _finite(mins[:, MN["fwd_len_min"]]),
+        "Fwd Packet Length Mean": fwd_mean,
+        "Fwd Packet Length Std": fwd_std,
+        "Bwd Packet Length Max": _finite(maxs[:, MX["bwd_len_max"]]),
+        "Bwd Packet Length Min": _finite(mins[:, MN["bwd_len_min"]]),
+        "Bwd Packet Length Mean": bwd_mean,
+        "Bwd Packet Length Std": bwd_std,
+        "Flow Bytes/s": flow_bytes_s,
+        "Flow Packets/s": flow_packets_s,
+        "Flow IAT Mean": flow_iat_mean,
+        "Flow IAT Std": flow_iat_std,
+        "Flow IAT Max": _finite(maxs[:, MX["flow_iat_max"]]),
+        "Flow IAT Min": _finite(mins[:, MN["flow_iat_min"]]),
+        "Fwd IAT Total": s["fwd_iat_sum"],
+        "Fwd IAT Mean": fwd_iat_mean,
+        "Fwd IAT Std": fwd_iat_std,
+        "Fwd IAT Max": _finite(maxs[:, MX["fwd_iat_max"]]),
+        "Fwd IAT Min": _finite(mins[:, MN["fwd_iat_min"]]),
+        "Bwd IAT Total": s["bwd_iat_sum"],
+        "Bwd IAT Mean": bwd_iat_mean,
+        "Bwd IAT Std": bwd_iat_std,
+        "Bwd IAT Max": _finite(maxs[:, MX["bwd_iat_max"]]),
+        "Bwd IAT Min": _finite(mins[:, MN["bwd_iat_min"]]),
+        "Fwd PSH Flags": s["fwd_psh"],
+        "Bwd PSH Flags": s["bwd_psh"],
+        "Fwd URG Flags": s["fwd_urg"],
+        "Bwd URG Flags": s["bwd_urg"],
+        "Fwd Header Length": s["fwd_hdr"],
+        "Bwd Header Length": s["bwd_hdr"],
+        "Fwd Packets/s": fwd_packets_s,
+        "Bwd Packets/s": bwd_packets_s,
+        "Min Packet Length": _finite(np.minimum(mins[:, MN["fwd_len_min"]], mins[:, MN["bwd_len_min"]])),
+        "Max Packet Length": _finite(np.maximum(maxs[:, MX["fwd_len_max"]], maxs[:, MX["bwd_len_max"]])),
+        "Packet Length Mean": pkt_mean,
+        "Packet Length Std": pkt_std,
+        "Packet Length Variance": pkt_std ** 2,
+        "FIN Flag Count": s["fin"],
+        "SYN Flag Count": s["syn"],
+        "RST Flag Count": s["rst"],
+        "PSH Flag Count": s["psh"],
+        "ACK Flag Count": s["ack"],
+        "URG Flag Count": s["urg"],
+        "CWE Flag Count": s["cwr"],
+        "ECE Flag Count": s["ece"],
+        "Down/Up Ratio": down_up,
+        "Average Packet Size": pkt_mean,
+        "Avg Fwd Segment Size": fwd_mean,
+        "Avg Bwd Segment Size": bwd_mean,
+        "Fwd Header Length.1": s["fwd_hdr"],
+        "Subflow Fwd Packets": n_fwd,
+        "Subflow Fwd Bytes": s["fwd_bytes"],
+        "Subflow Bwd Packets": n_bwd,
+        "Subflow Bwd Bytes": s["bwd_bytes"],
+        "Init_Win_bytes_forward": np.where(np.isnan(info[:, INFO["init_win_fwd"]]), -1.0, info[:, INFO["init_win_fwd"]]),
+        "Init_Win_bytes_backward": np.where(np.isnan(info[:, INFO["init_win_bwd"]]), -1.0, info[:, INFO["init_win_bwd"]]),
+        "act_data_pkt_fwd": s["act_data_fwd"],
+        "min_seg_size_forward": _finite(mins[:, MN["fwd_hdr_min"]]),
+        "Active Mean": active_mean,
+        "Active Std": active_std,
+        "Active Max": _finite(active_max),
+        "Active Min": _finite(active_min),
+        "Idle Mean": idle_mean,
+        "Idle Std": idle_std,
+        "Idle Max": _finite(maxs[:, MX["idle_max"]]),
+        "Idle Min": _finite(mins[:, MN["idle_min"]]),
+    }
+    for name in BULK_COLUMNS:
+        columns[name] = np.zeros(len(sums))
+
+    src_ip = _format_ips(endpoints[:, EP["src_hi"]], endpoints[:, EP["src_lo"]])
+    dst_ip = _format_ips(endpoints[:, EP["dst_hi"]], endpoints[:, EP["dst_lo"]])
+    src_port = endpoints[:, EP["src_port"]].astype(np.int64)
+    dst_port = endpoints[:, EP["dst_port"]].astype(np.int64)
+    proto = endpoints[:, EP["proto"]].astype(np.int64)
+    ids = pd.DataFrame({
+        "Flow ID": [f"{a}-{b}-{p}-{q}-{r}" for a, b, p, q, r in zip(src_ip, dst_ip, src_port.tolist(), dst_port.tolist(), proto.tolist())],
+        "Source IP": src_ip,
+        "Source Port": src_port,
+        "Destination IP": dst_ip,
+        "Protocol": proto,
+        "Timestamp": pd.to_datetime(info[:, INFO["start_ts"]], unit="us"),
+    })
+    features = pd.DataFrame({name: columns[name] for name in feature_names()})
+    return pd.concat([ids, features], axis=1)
+
+
+class FlowTable:
+    """Bidirectional CICFlowMeter-style flows assembled from packet batches in bounded memory.
+
+    A flow is keyed by protocol and its two endpoints; its forward direction is
+    that of its first packet. A flow ends after a packet with FIN set, when it
+    sees no packet for ``idle_timeout_s``, or once it has lasted
+    ``active_timeout_s`` (CICFlowMeter's flow timeout); the next packet with the
+    same key starts a new flow. Gaps longer than ``activity_timeout_s`` split a
+    flow into the active and idle periods behind the Active/Idle columns.
+
+    Open flows live in preallocated arrays of ``max_flows`` rows. ``add()``
+    sorts a batch by flow and time, cuts it into per-flow segments, reduces
+    each segment with ``np.*.reduceat`` and merges the result into the table,
+    so the per-packet work is all array operations; Python-level work is per
+    flow. When the table is full the least recently seen flows are ended early.
+    """
+
+    def __init__(
+        self,
+        max_flows: int = 200_000,
+        idle_timeout_s: float = 60.0,
+        active_timeout_s: float = 120.0,
+        activity_timeout_s: float = 5.0,
+    ) -> None:
+        self.max_flows = max_flows
+        self.idle_us = idle_timeout_s * 1e6
+        self.active_us = active_timeout_s * 1e6
+        self.activity_us = activity_timeout_s * 1e6
+        self.sums = np.zeros((max_flows, len(SUM_FIELDS)))
+        self.mins = np.full((max_flows, len(MIN_FIELDS)), np.inf)
+        self.maxs = np.full((max_flows, len(MAX_FIELDS)), -np.inf)
+        self.info = np.full((max_flows, len(INFO_FIELDS)), np.nan)
+        self.endpoints = np.zeros((max_flows, len(ENDPOINT_FIELDS)), dtype=np.uint64)
+        self.keys = np.zeros(max_flows, dtype=KEY_DTYPE)
+        self.slots: Dict[bytes, int] = {}
+        self._free = list(range(max_flows - 1, -1, -1))
+        self.packets = 0
+        self.flows_emitted = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # --- open-flow slots ---
+    def _release(self, slots: np.ndarray) -> pd.DataFrame:
+        # End the flows in ``slots`` and free their rows
+        slots = np.asarray(slots, dtype=np.int64)
+        if not len(slots):
+            return pd.DataFrame()
+        frame = flow_frame(self.sums[slots], self.mins[slots], self.maxs[slots], self.info[slots], self.endpoints[slots])
+        self._free_rows(slots)
+        self.flows_emitted += len(slots)
+        return frame
+
+    def _open_slots(self) -> np.ndarray:
+        return np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+
+    def expire(self, now_us: float) -> pd.DataFrame:
+        """End flows idle for ``idle_timeout_s`` or older than ``active_timeout_s`` at ``now_us``."""
+        open_slots = self._open_slots()
+        if not len(open_slots):
+            return pd.DataFrame()
+        info = self.info[open_slots]
+        done = (now_us - info[:, INFO["last_ts"]] > self.idle_us) | (now_us - info[:, INFO["start_ts"]] > self.active_us)
+        return self._release(open_slots[done])
+
+    def _make_room(self, needed: int) -> pd.DataFrame:
+        # Evict the least recently seen flows when ``needed`` new ones do not fit
+        short = needed - len(self._free)
+        if short <= 0:
+            return pd.DataFrame()
+        open_slots = self._open_slots()
+        oldest = open_slots[np.argsort(self.info[open_slots, INFO["last_ts"]], kind="stable")[:short]]
+        self.evicted += len(oldest)
+        return self._release(oldest)
+
+    def flush(self) -> pd.DataFrame:
+        """End every open flow (e.g. at the end of a capture)."""
+        return self._release(self._open_slots())
+
+    # --- packet batches ---
+    def add(self, packets: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Fold a batch of parsed packets into the table; returns the flows it finished."""
+        n = len(packets["ts"])
+        if n == 0:
+            return pd.DataFrame()
+        self.packets += n
+        finished: List[pd.DataFrame] = []
+
+        # Direction-free key: the lower (address, port) endpoint first
+        p = packets
+        src_first = (p["src_hi"] < p["dst_hi"]) | (
+            (p["src_hi"] == p["dst_hi"]) & ((p["src_lo"] < p["dst_lo"]) | ((p["src_lo"] == p["dst_lo"]) & (p["src_port"] <= p["dst_port"])))
+        )
+        keys = np.empty(n, dtype=KEY_DTYPE)
+        keys["proto"] = p["proto"]
+        for side, first, second in (("a", "src", "dst"), ("b", "dst", "src")):
+            keys[f"{side}_hi"] = np.where(src_first, p[f"{first}_hi"], p[f"{second}_hi"])
+            keys[f"{side}_lo"] = np.where(src_first, p[f"{first}_lo"], p[f"{second}_lo"])
+            keys[f"{side}_port"] = np.where(src_first, p[f"{first}_port"], p[f"{second}_port"])
+        unique_keys, key_idx = np.unique(keys.view(np.dtype((np.void, KEY_DTYPE.itemsize))), return_inverse=True)
+        key_idx = key_idx.ravel()
+        state_slot = np.array([self.slots.get(k.tobytes(), -1) for k in unique_keys], dtype=np.int64)  # per flow key
+
+        order = np.lexsort((p["ts"], key_idx))
+        p = {name: values[order] for name, values in p.items()}
+        key_idx = key_idx[order]
+        ts = p["ts"]
+        fin = (p["flags"] & TCP_FIN) != 0
+        first_of_key = np.ones(n, dtype=bool)
+        first_of_key[1:] = key_idx[1:] != key_idx[:-1]
+        kslot = state_slot[key_idx]
+        state_row = np.maximum(kslot, 0)
+        has_state = first_of_key & (kslot >= 0)
+
+        # Flow boundaries: a new key, FIN on the previous packet, or an idle gap
+        prev_ts = np.empty(n)
+        prev_ts[1:] = ts[:-1]
+        prev_ts[first_of_key] = np.where(has_state, self.info[state_row, INFO["last_ts"]], np.nan)[first_of_key]
+        prev_fin = np.zeros(n, dtype=bool)
+        prev_fin[1:] = fin[:-1]
+        boundary = (first_of_key & ~has_state) | (~first_of_key & prev_fin) | (ts - prev_ts > self.idle_us)
+        segment_start = first_of_key | boundary
+        continuing = segment_start & has_state & ~boundary  # packet extends a flow already in the table
+        # ...and the active timeout, which depends on where each flow started: split until no flow overruns it
+        while True:
+            seg_id = np.cumsum(segment_start) - 1
+            starts = np.flatnonzero(segment_start)
+            flow_start = np.where(continuing[starts], self.info[state_row[starts], INFO["start_ts"]], ts[starts])
+            over = ts - flow_start[seg_id] > self.active_us
+            if not over.any():
+                break
+            _, first_over = np.unique(seg_id[over], return_index=True)
+            cut = np.flatnonzero(over)[first_over]
+            segment_start[cut] = True
+            boundary[cut] = True
+            continuing[cut] = False
+
+        # Flows in the table whose next packet starts a new flow end here
+        ended = np.unique(kslot[first_of_key & (kslot >= 0) & boundary])
+        finished.append(self._release(ended))
+
+        starts = np.flatnonzero(segment_start)
+        ends = np.append(starts[1:], n) - 1
+        n_seg = len(starts)
+        seg_first = starts[seg_id]  # per packet: index of its segment's first packet
+        seg_cont = continuing[starts]
+        seg_slot = np.where(seg_cont, kslot[starts], -1)
+        seg_row = np.maximum(seg_slot, 0)
+
+        # Forward direction: the table's for continuing flows, else the segment's first packet
+        endpoints = np.empty((n_seg, len(ENDPOINT_FIELDS)), dtype=np.uint64)
+        for name, j in EP.items():
+            endpoints[:, j] = np.where(seg_cont, self.endpoints[seg_row, j], p[name][starts])
+        is_fwd = (
+            (p["src_hi"] == endpoints[seg_id, EP["src_hi"]])
+            & (p["src_lo"] == endpoints[seg_id, EP["src_lo"]])
+            & (p["src_port"] == endpoints[seg_id, EP["src_port"]])
+        )
+        is_bwd = ~is_fwd
+        cont_packet = seg_cont[seg_id]
+
+        # Previous packet of the flow overall, and in each direction (from the table across batches)
+        prev_ts = np.where(segment_start, np.where(continuing, self.info[state_row, INFO["last_ts"]], np.nan), prev_ts)
+        prev_dir = {}
+        for direction, mask, field in (("fwd", is_fwd, "last_fwd_ts"), ("bwd", is_bwd, "last_bwd_ts")):
+            last = _last_index(mask, seg_first)
+            before = np.empty(n, dtype=np.int64)
+            before[0] = -1
+            before[1:] = last[:-1]
+            before = np.where(segment_start, -1, before)
+            table_value = np.where(cont_packet, self.info[seg_row[seg_id], INFO[field]], np.nan)
+            prev_dir[direction] = np.where(before >= 0, ts[np.maximum(before, 0)], table_value)
+
+        flow_valid = ~np.isnan(prev_ts)
+        flow_iat = np.where(flow_valid, np.maximum(ts - np.nan_to_num(prev_ts), 0.0), 0.0)
+        fwd_valid = is_fwd & ~np.isnan(prev_dir["fwd"])
+        fwd_iat = np.where(fwd_valid, np.maximum(ts - np.nan_to_num(prev_dir["fwd"]), 0.0), 0.0)
+        bwd_valid = is_bwd & ~np.isnan(prev_dir["bwd"])
+        bwd_iat = np.where(bwd_valid, np.maximum(ts - np.nan_to_num(prev_dir["bwd"]), 0.0), 0.0)
+
+        # Active/idle periods: a gap longer than activity_timeout ends the active period
+        gap = flow_valid & (flow_iat > self.activity_us)
+        marker = segment_start | gap
+        marker_value = np.where(continuing & ~gap, self.info[state_row, INFO["active_start"]], ts)
+        period_start = marker_value[np.maximum.accumulate(np.where(marker, np.arange(n), 0))]
+        prev_period_start = np.empty(n)
+        prev_period_start[0] = np.nan
+        prev_period_start[1:] = period_start[:-1]
+        prev_period_start = np.where(segment_start, np.where(continuing, self.info[state_row, INFO["active_start"]], np.nan), prev_period_start)
+        active = np.where(gap, np.nan_to_num(prev_ts) - np.nan_to_num(prev_period_start), 0.0)
+        active_rec = gap & (active > 0)
+        idle = np.where(gap, flow_iat, 0.0)
+
+        payload, header, flags = p["payload"], p["header"], p["flags"]
+        fwd, bwd = is_fwd.astype(np.float64), is_bwd.astype(np.float64)
+        flag = {bit: ((flags & bit) != 0).astype(np.float64) for bit in (TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG, TCP_CWR, TCP_ECE)}
+        contrib = np.column_stack([
+            fwd, bwd, payload * fwd, payload * bwd, payload ** 2 * fwd, payload ** 2 * bwd,
+            flow_valid, flow_iat, flow_iat ** 2, fwd_valid, fwd_iat, fwd_iat ** 2, bwd_valid, bwd_iat, bwd_iat ** 2,
+            flag[TCP_PSH] * fwd, flag[TCP_PSH] * bwd, flag[TCP_URG] * fwd, flag[TCP_URG] * bwd,
+            flag[TCP_FIN], flag[TCP_SYN], flag[TCP_RST], flag[TCP_PSH], flag[TCP_ACK], flag[TCP_URG], flag[TCP_CWR], flag[TCP_ECE],
+            header * fwd, header * bwd, is_fwd & (payload >= 1),
+            active_rec, np.where(active_rec, active, 0.0), np.where(active_rec, active ** 2, 0.0), gap, idle, idle ** 2,
+        ])
+        seg_sums = np.add.reduceat(contrib, starts, axis=0)
+        seg_mins = np.minimum.reduceat(np.column_stack([
+            np.where(is_fwd, payload, np.inf), np.where(is_bwd, payload, np.inf),
+            np.where(flow_valid, flow_iat, np.inf), np.where(fwd_valid, fwd_iat, np.inf), np.where(bwd_valid, bwd_iat, np.inf),
+            np.where(is_fwd, header, np.inf), np.where(active_rec, active, np.inf), np.where(gap, idle, np.inf),
+        ]), starts, axis=0)
+        seg_maxs = np.maximum.reduceat(np.column_stack([
+            np.where(is_fwd, payload, -np.inf), np.where(is_bwd, payload, -np.inf),
+            np.where(flow_valid, flow_iat, -np.inf), np.where(fwd_valid, fwd_iat, -np.inf), np.where(bwd_valid, bwd_iat, -np.inf),
+            np.where(active_rec, active, -np.inf), np.where(gap, idle, -np.inf),
+        ]), starts, axis=0)
+
+        last_fwd = _last_index(is_fwd, seg_first)[ends]
+        last_bwd = _last_index(is_bwd, seg_first)[ends]
+        first_bwd = np.minimum.reduceat(np.where(is_bwd, np.arange(n), n), starts)
+        seg_info = np.empty((n_seg, len(INFO_FIELDS)))
+        seg_info[:, INFO["start_ts"]] = ts[starts]
+        seg_info[:, INFO["last_ts"]] = ts[ends]
+        seg_info[:, INFO["last_fwd_ts"]] = np.where(last_fwd >= 0, ts[np.maximum(last_fwd, 0)], np.nan)
+        seg_info[:, INFO["last_bwd_ts"]] = np.where(last_bwd >= 0, ts[np.maximum(last_bwd, 0)], np.nan)
+        seg_info[:, INFO["active_start"]] = period_start[ends]
+        seg_info[:, INFO["init_win_fwd"]] = p["window"][starts]
+        seg_info[:, INFO["init_win_bwd"]] = np.where(first_bwd < n, p["window"][np.minimum(first_bwd, n - 1)], np.nan)
+
+        # Merge the table's accumulators into continuing segments
+        c = np.flatnonzero(seg_cont)
+        rows = seg_slot[c]
+        seg_sums[c] += self.sums[rows]
+        seg_mins[c] = np.minimum(seg_mins[c], self.mins[rows])
+        seg_maxs[c] = np.maximum(seg_maxs[c], self.maxs[rows])
+        table_info = self.info[rows]
+        for field in ("start_ts", "init_win_fwd"):
+            seg_info[c, INFO[field]] = table_info[:, INFO[field]]
+        for field in ("last_fwd_ts", "last_bwd_ts"):
+            seg_info[c, INFO[field]] = np.where(np.isnan(seg_info[c, INFO[field]]), table_info[:, INFO[field]], seg_info[c, INFO[field]])
+        seg_info[c, INFO["init_win_bwd"]] = np.where(np.isnan(table_info[:, INFO["init_win_bwd"]]), seg_info[c, INFO["init_win_bwd"]], table_info[:, INFO["init_win_bwd"]])
+
+        # A segment stays open if it is its key's last one and did not end on FIN
+        last_of_key = np.ones(n_seg, dtype=bool)
+        last_of_key[:-1] = key_idx[starts[1:]] != key_idx[starts[:-1]]
+        stays_open = last_of_key & ~fin[ends]
+        done = np.flatnonzero(~stays_open)
+        if len(done):
+            finished.append(flow_frame(seg_sums[done], seg_mins[done], seg_maxs[done], seg_info[done], endpoints[done]))
+            self.flows_emitted += len(done)
+            self._free_rows(seg_slot[done][seg_cont[done]])  # their table rows were merged into the emitted segments
+
+        # Continuing flows are updated in place before expiry, so it judges them by this batch's packets
+        keep = np.flatnonzero(stays_open)
+        keep_cont = keep[seg_cont[keep]]
+        keep_new = keep[~seg_cont[keep]]
+        self._store(seg_slot[keep_cont], keep_cont, seg_sums, seg_mins, seg_maxs, seg_info, endpoints)
+        finished.append(self.expire(float(ts.max())))
+        finished.append(self._make_room(len(keep_new)))
+        if len(keep_new) > len(self._free):
+            # More new flows than the whole table holds: the least recently seen end right away
+            by_recency = keep_new[np.argsort(seg_info[keep_new, INFO["last_ts"]], kind="stable")]
+            overflow, keep_new = by_recency[: len(keep_new) - len(self._free)], np.sort(by_recency[len(keep_new) - len(self._free):])
+            finished.append(flow_frame(seg_sums[overflow], seg_mins[overflow], seg_maxs[overflow], seg_info[overflow], endpoints[overflow]))
+            self.flows_emitted += len(overflow)
+            self.evicted += len(overflow)
+        new_rows = np.array([self._free.pop() for _ in range(len(keep_new))], dtype=np.int64)
+        self._store(new_rows, keep_new, seg_sums, seg_mins, seg_maxs, seg_info, endpoints)
+        new_keys = unique_keys[key_idx[starts[keep_new]]]
+        self.keys.view(np.dtype((np.void, KEY_DTYPE.itemsize)))[new_rows] = new_keys
+        for key, row in zip(new_keys, new_rows.tolist()):
+            self.slots[key.tobytes()] = row
+
+        finished = [frame for frame in finished if len(frame)]
+        return pd.concat(finished, ignore_index=True) if finished else pd.DataFrame()
+
+    def _store(self, rows: np.ndarray, source: np.ndarray, sums, mins, maxs, info, endpoints) -> None:
+        self.sums[rows] = sums[source]
+        self.mins[rows] = mins[source]
+        self.maxs[rows] = maxs[source]
+        self.info[rows] = info[source]
+        self.endpoints[rows] = endpoints[source]
+
+    def _free_rows(self, slots: np.ndarray) -> None:
+        # Forget the flows in ``slots`` (already emitted or merged elsewhere) and recycle their rows
+        slots = np.asarray(slots, dtype=np.int64)
+        key_view = self.keys.view(np.dtype((np.void, KEY_DTYPE.itemsize)))
+        for slot in slots.tolist():
+            del self.slots[key_view[slot].tobytes()]
+            self._free.append(slot)
+        self.sums[slots] = 0.0
+        self.mins[slots] = np.inf
+        self.maxs[slots] = -np.inf
+        self.info[slots] = np.nan
+
+
+def extract_flows(path: str | Path, table: FlowTable | None = None, batch_bytes: int = 16 << 20, flush: bool = True) -> Iterator[pd.DataFrame]:
+    """Finished flows of a pcap file, one frame per packet batch that finished any, then the rest.
+
+    With ``flush=False`` flows still open at the end of the file stay in
+    ``table``, so the next file of a split capture continues them.
+    """
+    table = table if table is not None else FlowTable()
+    for packets in iter_packet_batches(path, batch_bytes):
+        frame = table.add(packets)
+        if len(frame):
+            yield frame
+    if flush:
+        frame = table.flush()
+        if len(frame):
+            yield frame
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Turn libpcap captures into CICIDS flow rows, optionally scoring each batch of finished flows."
+    )
+    parser.add_argument("inputs", nargs="+", help="libpcap files (convert pcapng with editcap -F pcap first).")
+    parser.add_argument(
+        "--output", required=True, help="Flows (ID columns, features and, with --model, predictions) as CSV, or Parquet for a .parquet path."
+    )
+    parser.add_argument("--model", default=None, help="Bundle or .ids.json artifact to score finished flows with.")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default="sklearn")
+    parser.add_argument("--max-flows", type=int, default=200_000, help="Open flows kept in memory; the least recently seen are ended early.")
+    parser.add_argument("--idle-timeout", type=float, default=60.0, help="Seconds without a packet that end a flow.")
+    parser.add_argument("--active-timeout", type=float, default=120.0, help="Longest flow in seconds (CICFlowMeter's flow timeout).")
+    parser.add_argument("--activity-timeout", type=float, default=5.0, help="Gap in seconds that separates active periods.")
+    parser.add_argument("--batch-mb", type=float, default=16.0, help="Capture read (and reduced) per batch.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Stream captures through one FlowTable and append each batch of finished flows to --output.
+
+    Flows stay open across files, so a capture split into consecutive files
+    yields the same flows as the whole capture. With ``--model`` every batch is
+    scored as it finishes (one ``score`` call per batch, not per flow).
+    """
+    args = parse_args()
+    version = None
+    if args.model:
+        from src.model_manager import ModelManager  # only needed when scoring
+
+        version = ModelManager(args.model, engine=args.engine, poll_interval=0, n_jobs=1).load()
+    table = FlowTable(args.max_flows, args.idle_timeout, args.active_timeout, args.activity_timeout)
+    batch_bytes = int(args.batch_mb * (1 << 20))
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    parquet = output.suffix in (".parquet", ".pq")  # several times faster to write than CSV
+    if parquet:
+        # pyarrow only for Parquet output: importing the extractor or writing CSV never loads it
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    writer: Any = None  # pq.ParquetWriter, opened with the first batch's schema
+    totals = {"flows": 0, "attacks": 0}
+
+    def write(frame: pd.DataFrame) -> None:
+        nonlocal writer
+        if not len(frame):
+            return
+        if version is not None:
+            labels, confidences = version.score(frame[version.features].to_numpy(dtype=np.float64))
+            frame["prediction"] = np.asarray(labels).astype(str)
+            frame["confidence"] = confidences
+            totals["attacks"] += int((frame["prediction"] != "BENIGN").sum())
+        first = totals["flows"] == 0
+        if parquet:
+            table_part = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table_part.schema)
+            writer.write_table(table_part)
+        else:
+            frame.to_csv(output, mode="w" if first else "a", header=first, index=False)
+        totals["flows"] += len(frame)
+
+    started = time.perf_counter()
+    for path in args.inputs:
+        for frame in extract_flows(path, table, batch_bytes, flush=False):
+            write(frame)
+    write(table.flush())
+    if writer is not None:
+        writer.close()
+    seconds = time.perf_counter() - started
+
+    print(
+        f"✔ {table.packets:,} packets -> {totals['flows']:,} flows in {seconds:.2f}s "
+        f"({table.packets / seconds:,.0f} packets/s), wrote {output}"
+    )
+    if table.evicted:
+        print(f"  {table.evicted:,} flows ended early because more than --max-flows {args.max_flows:,} were open")
+    if version is not None:
+        print(f"  scored with {version.model_id} ({version.engine}): {totals['attacks']:,} non-BENIGN flows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Key digest size; 128 bits keeps accidental collisions out of reach at any cache size
+DIGEST_BYTES = 16
+# Rough per-entry footprint (digest, OrderedDict node, value tuple, float) for the memory estimate
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def quantize(X: np.ndarray, bits: int) -> np.ndarray:
+    # Keep ``bits`` mantissa bits of every value (relative rounding, so ports and byte rates are treated alike)
+    mantissa, exponent = np.frexp(X)
+    scale = float(2 ** bits)
+    return np.ldexp(np.round(mantissa * scale) / scale, exponent)
+
+
+class PredictionCache:
+    """Bounded LRU/TTL memo of (label, confidence) per feature vector for the active model.
+
+    Keys are a blake2b digest of the raw float64 row (after optional
+    ``quantize_bits`` mantissa rounding, so near-identical flows share an entry).
+    Entries belong to one ``model_id``: when the active model changes the cache
+    is cleared, and requests still draining on the previous version bypass it.
+    Lookups and stores carry the scoring version's id and are checked against
+    ``model_id`` under the lock, so a request that was already scoring when a
+    reload invalidated the cache can neither read the new model's entries nor
+    leave its old predictions behind.
+    At most ``max_entries`` are kept (least recently used evicted first) and an
+    entry older than ``ttl_s`` counts as a miss. Identical rows within one batch
+    are scored once. Safe to share between inference threads.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl_s: float | None = 300.0, quantize_bits: int | None = None) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s if ttl_s and ttl_s > 0 else None
+        self.quantize_bits = quantize_bits or None
+        self.model_id: str | None = None
+        self._entries: "OrderedDict[bytes, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.bypassed = 0
+
+    def keys(self, X: np.ndarray) -> List[bytes]:
+        X = np.ascontiguousarray(X, dtype=np.float64) + 0.0  # + 0.0 folds -0.0 into 0.0
+        if self.quantize_bits:
+            X = quantize(X, self.quantize_bits)
+        return [hashlib.blake2b(row.tobytes(), digest_size=DIGEST_BYTES).digest() for row in X]
+
+    def invalidate(self, model_id: str | None = None) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.model_id = model_id
+            self.invalidations += 1
+
+    def lookup(self, keys: List[bytes], model_id: str | None = None) -> List[Tuple[Any, float] | None]:
+        now = time.monotonic()
+        found: List[Tuple[Any, float] | None] = []
+        with self._lock:
+            if model_id != self.model_id:  # invalidated for another model since the caller checked
+                self.bypassed += len(keys)
+                return [None] * len(keys)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl_s is not None and now - entry[2] > self.ttl_s:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    found.append((entry[0], entry[1]))
+        return found
+
+    def store(self, keys: List[bytes], labels: np.ndarray, confidences: np.ndarray, model_id: str | None = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if model_id != self.model_id:  # scored by a model that is no longer the cache's
+                return
+            for key, label, confidence in zip(keys, labels, confidences):
+                self._entries[key] = (label, float(confidence), now)
+                self._entries.move_to_end(key)
+            overflow = len(self._entries) - self.max_entries
+            for _ in range(max(overflow, 0)):
+                self._entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+    def score(self, version: Any, X: np.ndarray, active_model_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """``version.score(X)`` with cached rows filled in and only the distinct misses scored."""
+        if active_model_id != self.model_id:
+            self.invalidate(active_model_id)
+        if version.model_id != active_model_id:
+            with self._lock:
+                self.bypassed += len(X)
+            return version.score(X)
+
+        keys = self.keys(X)
+        found = self.lookup(keys, version.model_id)
+        labels = np.empty(len(X), dtype=object)
+        confidences = np.empty(len(X), dtype=np.float64)
+        first_row: Dict[bytes, int] = {}
+        pending: List[int] = []
+        for row, (key, hit) in enumerate(zip(keys, found)):
+            if hit is not None:
+                labels[row], confidences[row] = hit
+            else:
+                first_row.setdefault(key, row)
+                pending.append(row)
+        if pending:
+            unique_rows = list(first_row.values())
+            unique_labels, unique_confidences = version.score(X[unique_rows])
+            unique_keys = [keys[row] for row in unique_rows]
+            self.store(unique_keys, unique_labels, unique_confidences, version.model_id)
+            by_key = dict(zip(unique_keys, zip(unique_labels, unique_confidences)))
+            for row in pending:
+                labels[row], confidences[row] = by_key[keys[row]]
+        return labels, confidences
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, hits, misses = len(self._entries), self.hits, self.misses
+            counters = {
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "bypassed": self.bypassed,
+            }
+        return {
+            "model_id": self.model_id,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "approx_bytes": entries * (DIGEST_BYTES + ENTRY_OVERHEAD_BYTES),
+            "ttl_s": self.ttl_s,
+            "quantize_bits": self.quantize_bits,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            **counters,
+        }
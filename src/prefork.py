@@ -0,0 +1,241 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Set
+
+# Project root on the path so `python src/prefork.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Read by OpenBLAS / MKL / OpenMP / Accelerate / numexpr when they are first loaded
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# A worker that dies sooner than this after starting is respawned only after a pause
+MIN_WORKER_LIFETIME_S = 5.0
+
+# How often the supervisor checks for exited workers and reload requests
+SUPERVISOR_TICK_S = 0.2
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Serve src.serve's app from N pre-forked workers sharing one loaded model (python -m src.prefork)."
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per available CPU).",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Inference threads per worker (default: available CPUs // workers, at least 1).",
+    )
+    parser.add_argument(
+        "--model-n-jobs",
+        type=int,
+        default=1,
+        help="Forest threads per predict_proba call (IDS_MODEL_N_JOBS); requests are parallel across the pool instead.",
+    )
+    parser.add_argument("--backlog", type=int, default=2048, help="Listen backlog of the shared socket.")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+def available_cpus() -> int:
+    # Respects taskset / cgroup cpusets, unlike os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def pin_threads(inference_threads: int, model_n_jobs: int) -> None:
+    """Per-worker thread budget; must run before NumPy/sklearn are imported."""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = "1"  # BLAS is not the bottleneck for tree inference; parallelism comes from the pool
+    os.environ["IDS_INFERENCE_THREADS"] = str(inference_threads)
+    os.environ["IDS_MODEL_N_JOBS"] = str(model_n_jobs)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # IPPROTO_TCP, not the default 0: asyncio only sets TCP_NODELAY on accepted sockets whose proto says TCP,
+    # and without it every response waits ~40 ms for the client's delayed ACK
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+    from threadpoolctl import threadpool_limits
+
+    # Covers libraries that were loaded before pin_threads (e.g. when imported as a module)
+    threadpool_limits(limits=1)
+    config = uvicorn.Config(app, log_level=log_level, access_log=False, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main() -> None:
+    """Load the model once, then fork ``--workers`` uvicorn workers that share it.
+
+    The parent builds the app with ``src.serve.create_app`` (which loads and warms
+    the bundle), binds the listening socket and forks. Every child serves that socket with its own event
+    loop, so the kernel spreads connections across them, and the model's arrays stay
+    shared copy-on-write with the parent. BLAS/OpenMP pools are pinned to one thread
+    before NumPy is imported and each worker gets ``--threads-per-worker`` inference
+    threads, so workers x threads never exceeds the CPUs this process may use.
+    Crashed workers are respawned; SIGTERM/SIGINT drain every worker. POSIX only.
+
+    Hot reload also happens in the parent, so a new model is shared like the first
+    one: workers do not watch the bundle. The parent polls it every
+    ``IDS_RELOAD_POLL_S`` (or reloads on SIGHUP), loads and warms the new version,
+    forks a new set of workers and sends SIGTERM to the old ones, which finish their
+    in-flight requests first. A bundle that fails to load leaves the workers alone.
+    """
+    args = parse_args()
+    cpus = available_cpus()
+    workers = max(1, args.workers or cpus)
+    threads = max(1, args.threads_per_worker or cpus // workers)
+    pin_threads(threads, args.model_n_jobs)
+
+    from src.serve import create_app
+
+    app = create_app()  # loads and warms the model once, in the parent
+    manager = app.state.manager
+    # The parent watches the bundle; a worker that reloaded on its own would hold a private copy of the new model
+    poll_interval, manager.poll_interval = manager.poll_interval, 0
+
+    if threading.active_count() > 1:
+        # Threads do not survive fork(); one holding a lock would deadlock the children
+        print(f"warning: {threading.active_count() - 1} extra thread(s) running before fork", file=sys.stderr)
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers do not write to (and thereby un-share) the model's pages
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    version = manager.current
+    print(
+        f"prefork: {version.model_id} ({version.engine}) on {args.host}:{args.port}, "
+        f"{workers} workers x {threads} inference threads, model n_jobs={args.model_n_jobs}, {cpus} CPUs"
+    )
+
+    children: Dict[int, float] = {}
+    retiring: Set[int] = set()  # workers of a replaced model, finishing their in-flight requests
+    stopping = False
+    reload_requested = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)  # reloads are the parent's job
+            code = 0
+            try:
+                run_worker(app, sock, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)  # never return into the parent's supervisor loop
+        children[pid] = time.monotonic()
+
+    def shutdown(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children) + list(retiring):
+            terminate(pid)
+
+    def request_reload(signum, frame) -> None:
+        nonlocal reload_requested
+        reload_requested = True
+
+    def terminate(pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGTERM)  # uvicorn finishes in-flight requests, then exits
+        except ProcessLookupError:
+            pass
+
+    def reload(forced: bool) -> None:
+        # Load and warm in the parent (no requests run here, so the old version drains at once),
+        # then fork workers that share the new model and retire the ones serving the old one
+        if forced:
+            try:
+                manager.load()
+            except Exception as exc:
+                print(f"prefork: reload failed, keeping {manager.current.model_id}: {type(exc).__name__}: {exc}", file=sys.stderr)
+                reloaded = False
+            else:
+                reloaded = True
+        else:
+            reloaded = manager.poll()
+            if manager.last_error is not None and not reloaded:
+                print(f"prefork: reload failed, keeping {manager.current.model_id}: {manager.last_error}", file=sys.stderr)
+                manager.last_error = None
+        if not reloaded:
+            return
+        # Collect what is left of the old model, then freeze the new one before forking, as at startup
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        previous = list(children)
+        for _ in range(workers):
+            spawn()
+        for pid in previous:
+            children.pop(pid, None)
+            retiring.add(pid)
+            terminate(pid)
+        print(f"prefork: now serving {manager.current.model_id}, {len(previous)} workers retired")
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGHUP, request_reload)
+    for _ in range(workers):
+        spawn()
+
+    next_poll = time.monotonic() + poll_interval
+    while children or retiring:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            # No worker exited: time to look at the bundle?
+            if not stopping and (reload_requested or (poll_interval > 0 and time.monotonic() >= next_poll)):
+                forced, reload_requested = reload_requested, False
+                reload(forced)
+                next_poll = time.monotonic() + poll_interval
+            time.sleep(SUPERVISOR_TICK_S)
+            continue
+        if pid in retiring:
+            retiring.discard(pid)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"prefork: worker {pid} exited ({os.waitstatus_to_exitcode(status)}), respawning", file=sys.stderr)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_S:
+            time.sleep(1.0)  # avoid a tight crash loop
+        spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
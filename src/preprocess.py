@@ -0,0 +1,108 @@
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+
+# Same bound scale_features clips to
+DEFAULT_CLIP = 1e6
+
+
+class Preprocessing:
+    """Fitted inf/NaN handling that training applies before the scaler.
+
+    Non-finite values become the column's training median, then every value is
+    clipped to ``[clip_lower, clip_upper]``. Stored in the bundle under
+    ``preprocessing`` so serving repeats exactly what the model was trained on.
+    ``input_dtype`` is the dtype training read the raw features in: ``"float32"``
+    when they went through a float32 buffer, so requests are rounded to the
+    same values before the float64 arithmetic, whatever dtype they arrive in.
+    """
+
+    def __init__(self, medians: Sequence[float], clip_lower: float = -DEFAULT_CLIP, clip_upper: float = DEFAULT_CLIP, input_dtype: str = "float64") -> None:
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.clip_lower = float(clip_lower)
+        self.clip_upper = float(clip_upper)
+        self.input_dtype = np.dtype(input_dtype).name
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        # Returns a new float64 array: request matrices may be read-only views of the body,
+        # and JSON (float64) and raw bulk (float32) requests must score the same
+        X = np.asarray(X, dtype=self.input_dtype).astype(np.float64)
+        finite = np.isfinite(X)
+        if not finite.all():
+            X = np.where(finite, X, self.medians)
+        return np.clip(X, self.clip_lower, self.clip_upper)
+
+    def to_bundle(self) -> Dict[str, Any]:
+        # Plain lists so the bundle entry does not depend on this class
+        return {"medians": self.medians.tolist(), "clip_lower": self.clip_lower, "clip_upper": self.clip_upper, "input_dtype": self.input_dtype}
+
+    @classmethod
+    def from_bundle(cls, entry: Dict[str, Any]) -> "Preprocessing":
+        # Bundles written before input_dtype was recorded were scored in float64
+        return cls(entry["medians"], entry["clip_lower"], entry["clip_upper"], entry.get("input_dtype", "float64"))
+
+
+class ArrayScaler:
+    """``StandardScaler.transform`` of a fitted scaler, from its ``mean_`` and ``scale_`` arrays.
+
+    Artifacts served by the compiled engine use it instead of rebuilding a
+    StandardScaler, so those workers start without importing scikit-learn. The
+    arithmetic is sklearn's: a float copy of ``X`` (float32 stays float32), minus
+    the mean, divided by the scale, in place.
+    """
+
+    def __init__(self, mean: np.ndarray | None, scale: np.ndarray | None, with_mean: bool = True, with_std: bool = True) -> None:
+        self.mean_ = mean
+        self.scale_ = scale
+        self.with_mean = with_mean
+        self.with_std = with_std
+        fitted = mean if mean is not None else scale
+        self.n_features_in_ = len(fitted) if fitted is not None else None
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        X = np.array(X, dtype=X.dtype if X.dtype in (np.float32, np.float64) else np.float64)
+        if X.ndim != 2 or (self.n_features_in_ is not None and X.shape[1] != self.n_features_in_):
+            raise ValueError(f"X has shape {X.shape}, but the scaler expects {self.n_features_in_} features.")
+        if self.with_mean and self.mean_ is not None:
+            X -= self.mean_
+        if self.with_std and self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+
+def fused_fit_transform(X: np.ndarray, clip: float = DEFAULT_CLIP) -> Tuple[np.ndarray, Preprocessing, np.ndarray, np.ndarray]:
+    """inf -> NaN -> median fill -> clip -> standardise, one column at a time, in place.
+
+    ``X`` must be a writable float32 array in Fortran order (see ``features.to_float32_buffer``),
+    so each column is contiguous. Every column is read from memory once: its median,
+    mean and variance are computed and it is transformed while it is still in cache.
+    Medians are exact; sums are accumulated in float64 like StandardScaler.
+    Returns ``(X, preprocessing, mean, var)``.
+    """
+    n_rows, n_cols = X.shape
+    medians = np.zeros(n_cols, dtype=np.float64)
+    means = np.zeros(n_cols, dtype=np.float64)
+    variances = np.zeros(n_cols, dtype=np.float64)
+    for j in range(n_cols):
+        col = X[:, j]
+        finite = np.isfinite(col)
+        values = col if finite.all() else col[finite]
+        # Median in float64 like pandas, stored as the float32 value the buffer really holds;
+        # a column with no finite value falls back to 0.0
+        median = np.float32(np.median(values.astype(np.float64), overwrite_input=True)) if len(values) else np.float32(0.0)
+        medians[j] = median
+        if len(values) < n_rows:
+            col[~finite] = median
+        np.clip(col, -clip, clip, out=col)
+
+        if n_rows:
+            col64 = col.astype(np.float64)
+            means[j] = col64.mean()
+            variances[j] = col64.var()
+            scale = np.sqrt(variances[j])
+            if scale < 10 * np.finfo(np.float64).eps:
+                scale = 1.0  # StandardScaler leaves constant columns unscaled
+            col64 -= means[j]
+            col64 /= scale
+            col[:] = col64
+    return X, Preprocessing(medians, -clip, clip, input_dtype="float32"), means, variances
@@ -0,0 +1,156 @@
+import cProfile
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_STATUS = "/proc/self/status"
+_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def _status_mb(field: str) -> float | None:
+    try:
+        with open(_STATUS, "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024  # reported in kB
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float | None:
+    # VmHWM where /proc exists; otherwise ru_maxrss (kB on Linux, bytes on macOS)
+    peak = _status_mb("VmHWM:")
+    if peak is None and resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+    return peak
+
+
+def current_rss_mb() -> float | None:
+    return _status_mb("VmRSS:")
+
+
+def reset_peak_rss() -> bool:
+    # Linux >= 4.0: writing 5 resets VmHWM to the current RSS, so each stage gets its own peak
+    try:
+        with open(_CLEAR_REFS, "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler:
+    """Wall time, CPU time, peak RSS and data shape per pipeline stage.
+
+    ``with profiler.stage("fit") as s: ...`` records one stage; set ``s["rows"]`` and
+    ``s["columns"]`` inside the block to record the data size. Stages entered inside
+    another stage are recorded as ``parent/child`` and a stage that runs several times
+    (one per CSV chunk) accumulates. Where VmHWM cannot be reset (non-Linux), peak RSS
+    is the process peak so far rather than the stage's own. The stage named
+    ``profile_stage`` is also run under cProfile and dumped to ``profile_dir``.
+    """
+
+    def __init__(self, profile_stage: str | None = None, profile_dir: str | Path = "profiles") -> None:
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.profile_stage = profile_stage
+        self.profile_dir = Path(profile_dir)
+        self.profile_paths: List[str] = []
+        self._stack: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        full_name = "/".join([frame["name"] for frame in self._stack] + [name])
+        # Fold the peak so far into the enclosing stages before this stage resets it
+        self._fold_peak(peak_rss_mb())
+        frame = {"name": name, "peak": None, "per_stage_peak": reset_peak_rss()}
+        self._stack.append(frame)
+        record: Dict[str, Any] = {}
+        profile = cProfile.Profile() if self.profile_stage in (name, full_name) else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._fold_peak(peak_rss_mb())
+            self._stack.pop()
+            if profile is not None:
+                self._dump(profile, full_name)
+            self._record(full_name, wall, cpu, frame, record)
+
+    def _fold_peak(self, peak: float | None) -> None:
+        if peak is None:
+            return
+        for frame in self._stack:
+            frame["peak"] = peak if frame["peak"] is None else max(frame["peak"], peak)
+
+    def _record(self, name: str, wall: float, cpu: float, frame: Dict[str, Any], record: Dict[str, Any]) -> None:
+        entry = self.stages.setdefault(name, {"stage": name, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": None})
+        entry["calls"] += 1
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu  # includes the forest's worker threads, not child processes
+        if frame["peak"] is not None:
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0.0, frame["peak"])
+            entry["peak_is_per_stage"] = frame["per_stage_peak"]
+        rss = current_rss_mb()
+        if rss is not None:
+            entry["rss_after_mb"] = rss
+        # Chunked stages add up their rows; columns are the same for every chunk
+        if "rows" in record:
+            entry["rows"] = entry.get("rows", 0) + int(record["rows"])
+        if "columns" in record:
+            entry["columns"] = int(record["columns"])
+
+    def _dump(self, profile: cProfile.Profile, name: str) -> None:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.profile_dir / f"{name.replace('/', '.')}-{stamp}-{os.getpid()}.prof"
+        profile.dump_stats(path)  # open with snakeviz, or flameprof/gprof2dot for a flame graph
+        self.profile_paths.append(str(path))
+
+    def as_dict(self) -> List[Dict[str, Any]]:
+        return [
+            {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+            for entry in self.stages.values()
+        ]
+
+    def as_metrics(self) -> Dict[str, float]:
+        metrics = {}
+        for name, entry in self.stages.items():
+            for key in ("wall_s", "cpu_s", "peak_rss_mb", "rows", "columns"):
+                if entry.get(key) is not None:
+                    metrics[f"stage/{name}/{key}"] = float(entry[key])
+        return metrics
+
+    def format_table(self) -> str:
+        lines = [f"{'stage':<32} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'rows':>10} {'cols':>5}"]
+        for entry in self.stages.values():
+            peak = entry["peak_rss_mb"]
+            lines.append(
+                f"{entry['stage']:<32} {entry['calls']:>5} {entry['wall_s']:>9.2f} {entry['cpu_s']:>9.2f} "
+                f"{'-' if peak is None else f'{peak:.0f}':>9} {entry.get('rows', '-'):>10} {entry.get('columns', '-'):>5}"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def maybe_stage(profiler: StageProfiler | None, name: str) -> Iterator[Dict[str, Any]]:
+    # For library code where profiling is optional: a throwaway record when no profiler is given
+    if profiler is None:
+        yield {}
+    else:
+        with profiler.stage(name) as record:
+            yield record
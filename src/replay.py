@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import wire
+from src.features import LABEL_COLUMN
+
+# Scoring routes of serve.py, fastest first; the first one the server lists is used
+BULK_ROUTE = "/predict/bulk"
+BATCH_ROUTE = "/predict/batch"
+SINGLE_ROUTE = "/predict"
+
+
+def replay_matrix(frame: pd.DataFrame, features: Sequence[str]) -> Tuple[np.ndarray, np.ndarray | None]:
+    # One contiguous float32 block in the server's feature order (absent columns are NaN) plus the labels
+    X = np.full((len(frame), len(features)), np.nan, dtype=np.float32)
+    for j, name in enumerate(features):
+        if name in frame.columns:
+            X[:, j] = frame[name].to_numpy(dtype=np.float32, na_value=np.nan)
+    labels = frame[LABEL_COLUMN].astype(str).to_numpy() if LABEL_COLUMN in frame.columns else None
+    return X, labels
+
+
+class ReplayClient:
+    """Scores blocks of flows against serve.py over one keep-alive connection pool.
+
+    ``connect()`` reads the feature order from ``GET /schema`` and picks the
+    fastest route the server offers (from ``GET /openapi.json``): raw float32 on
+    ``/predict/bulk``, column-oriented JSON on ``/predict/batch``, or one
+    ``/predict`` call per flow for servers that predate batching. Up to
+    ``pool_size`` blocks are in flight at once, each on a pooled connection.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 4, timeout: float = 10.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        for route in (BULK_ROUTE, BATCH_ROUTE, SINGLE_ROUTE):
+            if self.base_url.endswith(route):  # accept a full scoring URL too
+                self.base_url = self.base_url[: -len(route)]
+                break
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="replay")
+        self.features: List[str] | None = None
+        self.route = SINGLE_ROUTE
+
+    def connect(self, fallback_features: Sequence[str]) -> None:
+        try:
+            response = self.session.get(f"{self.base_url}/schema", timeout=self.timeout)
+            response.raise_for_status()
+            self.features = list(response.json()["features"])
+        except (requests.RequestException, KeyError, ValueError):
+            self.features = list(fallback_features)  # older server: send the dataset's columns by name
+        try:
+            response = self.session.get(f"{self.base_url}/openapi.json", timeout=self.timeout)
+            response.raise_for_status()
+            paths = response.json().get("paths", {})
+        except (requests.RequestException, ValueError):
+            paths = {}
+        self.route = next((route for route in (BULK_ROUTE, BATCH_ROUTE) if route in paths), SINGLE_ROUTE)
+
+    def _post(self, route: str, **kwargs: Any) -> requests.Response:
+        response = self.session.post(f"{self.base_url}{route}", timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def score_block(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.route == BULK_ROUTE:
+            body = wire.encode_raw_float32(self.features, X)
+            result = wire.decode_raw_results(self._post(BULK_ROUTE, data=body, headers={"Content-Type": wire.RAW_FLOAT32}).content)
+            return np.asarray(result["predictions"]).astype(str), np.asarray(result["confidences"], dtype=np.float64)
+
+        # JSON has no NaN/inf: non-finite values are sent as null (the server's default)
+        flows = pd.DataFrame(X.astype(np.float64), columns=self.features).astype(object).where(np.isfinite(X), None).to_dict("records")
+        if self.route == BATCH_ROUTE:
+            predictions = self._post(BATCH_ROUTE, json={"flows": flows}).json()["predictions"]
+        else:
+            predictions = [self._post(SINGLE_ROUTE, json={"features": flow}).json() for flow in flows]
+        labels = np.array([str(p["prediction"]) for p in predictions])
+        return labels, np.array([float(p["confidence"]) for p in predictions])
+
+    def score_blocks(self, blocks: Iterator[np.ndarray]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        # Keeps up to pool_size requests in flight; results come back in submission order
+        pending = []
+        for block in blocks:
+            pending.append(self.executor.submit(self.score_block, block))
+            if len(pending) >= self.pool_size:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+class FlowReplay:
+    """Replays a flow matrix through a ReplayClient at ``rate`` flows/s, in ``block_rows`` blocks.
+
+    ``run_for(seconds)`` sends blocks until that much wall time has passed and
+    returns everything scored meanwhile, so a UI can redraw once per refresh
+    interval instead of once per flow. Playback wraps around at the end of the
+    data and a ``rate`` of 0 sends as fast as the server answers.
+    """
+
+    def __init__(self, X: np.ndarray, client: ReplayClient, rate: float, block_rows: int = 1024, labels: np.ndarray | None = None) -> None:
+        self.X = X
+        self.labels = labels
+        self.client = client
+        self.rate = rate
+        self.block_rows = max(1, block_rows)
+        self.position = 0
+        self.sent = 0
+        self._started: float | None = None
+        self._paced_rate = rate
+
+    def _next_block(self, deadline: float) -> Iterator[np.ndarray]:
+        while time.monotonic() < deadline and len(self.X):
+            rows = self.block_rows
+            if self.rate > 0:
+                rows = max(1, min(rows, int(self.rate * 0.1)))  # at most ~100 ms of traffic per block at low rates
+                due = self._started + self.sent / self.rate
+                delay = due - time.monotonic()
+                if delay > 0:
+                    if time.monotonic() + delay >= deadline:
+                        return
+                    time.sleep(delay)
+            rows = min(rows, len(self.X) - self.position)
+            block = self.X[self.position:self.position + rows]
+            self.position = (self.position + rows) % len(self.X)
+            self.sent += rows
+            yield block
+
+    def run_for(self, seconds: float) -> Dict[str, Any]:
+        started = time.monotonic()
+        # Re-anchor the schedule on a new rate or after a pause between refreshes, rather than bursting to catch up
+        if self._started is None or self.rate != self._paced_rate or (self.rate > 0 and started - (self._started + self.sent / self.rate) > 1.0):
+            self._started, self.sent, self._paced_rate = started, 0, self.rate
+        first = self.position
+        labels, confidences = [], []
+        for block_labels, block_confidences in self.client.score_blocks(self._next_block(started + seconds)):
+            labels.append(block_labels)
+            confidences.append(block_confidences)
+        elapsed = time.monotonic() - started
+        labels_out = np.concatenate(labels) if labels else np.array([], dtype=str)
+        true_labels = None
+        if self.labels is not None and len(labels_out):
+            true_labels = np.take(self.labels, np.arange(first, first + len(labels_out)), mode="wrap")
+        return {
+            "predictions": labels_out,
+            "confidences": np.concatenate(confidences) if confidences else np.array([], dtype=np.float64),
+            "labels": true_labels,
+            "seconds": elapsed,
+            "flows_per_s": len(labels_out) / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Throughput of src.prefork as it is given 1..N cores (one worker per core); run from the project root."
+    )
+    parser.add_argument(
+        "--cores",
+        default=None,
+        help="Comma-separated core counts to measure (default: 1..available CPUs minus --client-cpus).",
+    )
+    parser.add_argument(
+        "--workers",
+        default=None,
+        help="Comma-separated worker counts to measure on all server cores instead of one worker per core "
+        "(the curve on a machine with fewer cores than the deployment).",
+    )
+    parser.add_argument("--client-cpus", type=int, default=1, help="CPUs reserved for this load generator when there are enough.")
+    parser.add_argument("--endpoint", choices=("predict", "batch"), default="predict", help="/predict (one flow) or /predict/batch.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Flows per /predict/batch request.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests kept in flight.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per core count.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each measurement.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default=None, help="Write the curve as JSON to this path.")
+    return parser.parse_args()
+
+
+def split_cpus(client_cpus: int) -> Tuple[List[int], List[int]]:
+    # Server cores first, the load generator on the last ones, so both are not timed on the same CPU
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) > client_cpus:
+        return cpus[:-client_cpus], cpus[-client_cpus:]
+    return cpus, cpus  # a single CPU: client and server share it
+
+
+def request_body(features: List[str], endpoint: str, batch_size: int) -> bytes:
+    rng = np.random.default_rng(0)
+    if endpoint == "predict":
+        payload = {"values": rng.standard_normal(len(features)).round(4).tolist()}
+    else:
+        values = rng.standard_normal((batch_size, len(features))).round(4)
+        payload = {"columns": {name: values[:, j].tolist() for j, name in enumerate(features)}}
+    return json.dumps(payload).encode("utf-8")
+
+
+async def drive(url: str, body: bytes, concurrency: int, warmup: float, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30.0, headers={"content-type": "application/json"}) as client:
+        measure_from = time.perf_counter() + warmup
+        stop_at = measure_from + duration
+
+        async def user() -> None:
+            nonlocal errors
+            while True:
+                started = time.perf_counter()
+                if started >= stop_at:
+                    return
+                response = await client.post(url, content=body)
+                finished = time.perf_counter()
+                if started >= measure_from:
+                    if response.status_code == 200:
+                        latencies.append(finished - started)
+                    else:
+                        errors += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    latencies_ms = np.asarray(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+    }
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 120.0) -> List[str]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"src.prefork exited with {process.returncode} before it was ready.")
+        try:
+            return httpx.get(f"{base_url}/schema", timeout=1.0).json()["features"]
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise TimeoutError(f"{base_url} was not ready after {timeout:.0f} s.")
+
+
+def measure(n_cores: int, n_workers: int, server_cpus: List[int], args: argparse.Namespace) -> Dict[str, Any]:
+    cores = server_cpus[:n_cores]
+    env = {**os.environ, "IDS_RELOAD_POLL_S": "0"}
+    command = [sys.executable, "-m", "src.prefork", "--workers", str(n_workers), "--port", str(args.port), "--host", "127.0.0.1"]
+    # The affinity is inherited by the workers, so src.prefork also sizes its thread pools from it
+    process = subprocess.Popen(command, env=env, preexec_fn=lambda: os.sched_setaffinity(0, cores))
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        features = wait_ready(base_url, process)
+        path = "/predict" if args.endpoint == "predict" else "/predict/batch"
+        body = request_body(features, args.endpoint, args.batch_size)
+        result = asyncio.run(drive(base_url + path, body, args.concurrency, args.warmup, args.duration))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    flows = 1 if args.endpoint == "predict" else args.batch_size
+    return {"cores": n_cores, "workers": n_workers, **result, "flows_per_s": result["rps"] * flows}
+
+
+def main() -> None:
+    args = parse_args()
+    server_cpus, client_cpus = split_cpus(args.client_cpus)
+    os.sched_setaffinity(0, client_cpus)
+    if args.workers:
+        # Fixed cores, varying workers
+        points = [(len(server_cpus), int(w)) for w in args.workers.split(",")]
+    else:
+        core_counts = [int(c) for c in args.cores.split(",")] if args.cores else list(range(1, len(server_cpus) + 1))
+        if max(core_counts) > len(server_cpus):
+            raise ValueError(f"Only {len(server_cpus)} CPUs are available for the server.")
+        points = [(n_cores, n_cores) for n_cores in core_counts]
+
+    curve = []
+    print(f"{'cores':>5} {'workers':>7} {'req/s':>9} {'flows/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8} {'errors':>6}")
+    for n_cores, n_workers in points:
+        point = measure(n_cores, n_workers, server_cpus, args)
+        point["speedup"] = point["rps"] / curve[0]["rps"] if curve and curve[0]["rps"] else 1.0
+        curve.append(point)
+        print(
+            f"{n_cores:>5} {n_workers:>7} {point['rps']:>9.1f} {point['flows_per_s']:>10.1f} {point['p50_ms'] or 0:>8.1f} "
+            f"{point['p99_ms'] or 0:>8.1f} {point['speedup']:>8.2f} {point['errors']:>6}"
+        )
+
+    if args.output:
+        settings = {key: getattr(args, key) for key in ("endpoint", "batch_size", "concurrency", "duration")}
+        report = {"settings": settings, "shared_client_cpu": server_cpus == client_cpus, "curve": curve}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
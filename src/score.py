@@ -0,0 +1,250 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Project root on the path so `python src/score.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.features import LABEL_COLUMN, clean_chunk, dataset_schema
+from src.model_manager import ModelManager, ModelVersion
+from src.out_of_core import resolve_paths
+
+MANIFEST_NAME = "_scoring.json"
+SUMMARY_NAME = "_summary.json"
+SCAN_BLOCK_BYTES = 16 << 20
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+# Set in each worker: inherited from the parent under fork, loaded by _init_worker otherwise
+_version: ModelVersion | None = None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Score archived flow CSV/Parquet files with a registered model and write Parquet predictions."
+    )
+    parser.add_argument("inputs", nargs="+", help="CSV or Parquet files; globs are expanded.")
+    parser.add_argument("--output", required=True, help="Directory for the Parquet parts, checkpoints and summary.")
+    parser.add_argument("--model-id", default=None, help="Registry model_id to score with (default: the bundle at --model).")
+    parser.add_argument("--model", default="src/models/rf.pk1", help="Bundle or .ids.json artifact when no --model-id is given.")
+    parser.add_argument("--registry", default="src/models/model_registry.json")
+    parser.add_argument("--engine", choices=("sklearn", "compiled"), default="sklearn")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: available CPUs).")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Input rows per chunk (CSV) / per part (Parquet).")
+    parser.add_argument("--restart", action="store_true", help="Discard checkpoints in --output instead of resuming.")
+    return parser.parse_args()
+
+
+def plan_csv_chunks(path: str, chunksize: int) -> Iterator[Dict[str, Any]]:
+    """Byte ranges of ``chunksize`` data lines each, found by counting newlines.
+
+    Scanning is a vectorised pass over the raw bytes, so the parent never parses
+    the CSV; each worker parses only its own range. Assumes no quoted newlines,
+    which CICIDS exports never contain.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = position = f.tell()
+        first_row = rows = 0
+        while True:
+            block = f.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+            while len(newlines) >= chunksize - rows:
+                end = position + int(newlines[chunksize - rows - 1]) + 1
+                yield {"start": start, "end": end, "first_row": first_row, "header_bytes": len(header)}
+                newlines = newlines[chunksize - rows:]
+                first_row += chunksize
+                start, rows = end, 0
+            rows += len(newlines)
+            position += len(block)
+        if position > start:
+            yield {"start": start, "end": position, "first_row": first_row, "header_bytes": len(header)}
+
+
+def plan_parquet_chunks(path: str, chunksize: int) -> Iterator[Dict[str, Any]]:
+    # One task per row group (the unit Parquet can read independently); big groups are sliced by the worker
+    metadata = pq.ParquetFile(path).metadata
+    first_row = 0
+    for group in range(metadata.num_row_groups):
+        yield {"row_group": group, "first_row": first_row, "chunksize": chunksize}
+        first_row += metadata.row_group(group).num_rows
+
+
+def plan_tasks(paths: List[str], chunksize: int) -> List[Dict[str, Any]]:
+    tasks = []
+    for file_index, path in enumerate(paths):
+        is_parquet = path.lower().endswith(PARQUET_SUFFIXES)
+        planner = plan_parquet_chunks if is_parquet else plan_csv_chunks
+        for chunk_index, chunk in enumerate(planner(path, chunksize)):
+            tasks.append({"path": path, "kind": "parquet" if is_parquet else "csv", "file_index": file_index, "chunk_index": chunk_index, **chunk})
+    return tasks
+
+
+def part_path(output_dir: Path, task: Dict[str, Any]) -> Path:
+    return output_dir / f"part-{task['file_index']:04d}-{task['chunk_index']:06d}.parquet"
+
+
+def input_fingerprint(paths: List[str]) -> List[Dict[str, Any]]:
+    # Size + mtime rather than a content hash: resuming must not re-read days of CSVs first
+    return [{"path": path, "size": os.stat(path).st_size, "mtime_ns": os.stat(path).st_mtime_ns} for path in paths]
+
+
+def prepare_output(output_dir: Path, manifest: Dict[str, Any], restart: bool) -> None:
+    manifest_path = output_dir / MANIFEST_NAME
+    if restart and output_dir.exists():
+        for path in output_dir.glob("part-*.parquet"):
+            path.unlink()
+        manifest_path.unlink(missing_ok=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise ValueError(f"{output_dir} holds a run with a different model, inputs or chunksize; pass --restart to discard it.")
+        return
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _init_worker(model_path: str, engine: str) -> None:
+    global _version
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=1)  # parallelism comes from the processes
+    if _version is None:  # spawn/forkserver start methods: load once per worker
+        _version = ModelManager(model_path, engine=engine, poll_interval=0, n_jobs=1).load()
+
+
+def _read_chunk(task: Dict[str, Any], dtypes: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+    if task["kind"] == "csv":
+        with open(task["path"], "rb") as f:
+            header = f.read(task["header_bytes"])
+            f.seek(task["start"])
+            data = f.read(task["end"] - task["start"])
+        chunk = pd.read_csv(io.BytesIO(header + data), dtype=dtypes)
+        chunk.index = pd.RangeIndex(task["first_row"], task["first_row"] + len(chunk))
+        yield chunk
+        return
+    table = pq.ParquetFile(task["path"]).read_row_group(task["row_group"])
+    for offset in range(0, table.num_rows, task["chunksize"]):
+        chunk = table.slice(offset, task["chunksize"]).to_pandas()
+        first_row = task["first_row"] + offset
+        chunk.index = pd.RangeIndex(first_row, first_row + len(chunk))
+        yield chunk
+
+
+def _score_task(task: Dict[str, Any], dtypes: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    version = _version
+    tables, rows_in = [], 0
+    for chunk in _read_chunk(task, dtypes):
+        rows_in += len(chunk)
+        chunk = clean_chunk(chunk)  # same cleaning as training; rows with missing values are dropped
+        missing = [name for name in version.features if name not in chunk.columns]
+        if missing:
+            raise ValueError(f"{task['path']} lacks {len(missing)} model feature(s), e.g. {missing[:3]}.")
+        labels, confidences = version.score(chunk[version.features].to_numpy(dtype=np.float64)) if len(chunk) else ([], [])
+        columns = {
+            "source_file": pa.array([task["path"]] * len(chunk), type=pa.string()).dictionary_encode(),
+            "row": pa.array(chunk.index.to_numpy(), type=pa.int64()),  # data-row offset in the input (header excluded)
+            "prediction": pa.array(np.asarray(labels, dtype=str), type=pa.string()),
+            "confidence": pa.array(np.asarray(confidences, dtype=np.float32), type=pa.float32()),
+        }
+        if LABEL_COLUMN in chunk.columns:
+            columns["label"] = pa.array(chunk[LABEL_COLUMN].astype(str).to_numpy(), type=pa.string())
+        tables.append(pa.table(columns))
+
+    table = pa.concat_tables(tables) if tables else pa.table({})
+    table = table.replace_schema_metadata({"model_id": version.model_id})
+    # Written under a temporary name and renamed: an existing part is a completed checkpoint
+    target = part_path(Path(output_dir), task)
+    tmp = target.with_name(f".{target.name}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, target)
+    return {"part": target.name, "rows_in": rows_in, "rows_scored": table.num_rows, "seconds": time.perf_counter() - started}
+
+
+def run_scoring(args: argparse.Namespace) -> Dict[str, Any]:
+    paths = resolve_paths({"paths": args.inputs})
+    output_dir = Path(args.output)
+
+    # Resolve and load the model once in the parent; forked workers share it
+    manager = ModelManager(args.model, registry_path=args.registry, engine=args.engine, poll_interval=0, n_jobs=1)
+    model_path = manager.path_for(args.model_id) if args.model_id else Path(args.model)
+    global _version
+    _version = manager.load(model_path)
+
+    manifest = {
+        "model_id": _version.model_id,
+        "model_path": str(model_path),
+        "engine": args.engine,
+        "chunksize": args.chunksize,
+        "inputs": input_fingerprint(paths),
+    }
+    prepare_output(output_dir, manifest, args.restart)
+
+    tasks = plan_tasks(paths, args.chunksize)
+    pending = [task for task in tasks if not part_path(output_dir, task).exists()]
+    dtypes = {path: dataset_schema(path) for path in paths if not path.lower().endswith(PARQUET_SUFFIXES)}
+    workers = max(1, min(args.workers or len(os.sched_getaffinity(0)), len(pending) or 1))
+    print(
+        f"Scoring {len(paths)} file(s) with {_version.model_id}: {len(tasks)} chunks, "
+        f"{len(tasks) - len(pending)} already done, {workers} workers"
+    )
+
+    # fork shares the loaded model copy-on-write; other start methods load it in _init_worker
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    started = time.perf_counter()
+    rows_in = rows_scored = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(str(model_path), args.engine)) as pool:
+        futures = {pool.submit(_score_task, task, dtypes.get(task["path"]), str(output_dir)) for task in pending}
+        done_count = 0
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()  # a failed chunk stops the run; finished parts are kept for the next run
+                done_count += 1
+                rows_in += result["rows_in"]
+                rows_scored += result["rows_scored"]
+                elapsed = time.perf_counter() - started
+                print(f"  [{done_count}/{len(pending)}] {result['part']}: {result['rows_scored']} rows ({rows_in / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        **manifest,
+        "chunks": len(tasks),
+        "chunks_resumed": len(tasks) - len(pending),
+        "rows_in": rows_in,
+        "rows_scored": rows_scored,
+        "rows_dropped": rows_in - rows_scored,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_in / elapsed, 1) if elapsed > 0 else None,
+        "workers": workers,
+    }
+    with open(output_dir / SUMMARY_NAME, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    summary = run_scoring(args)
+    print(
+        f"✔ Scored {summary['rows_scored']:,} rows ({summary['rows_dropped']:,} dropped) in {summary['seconds']:.1f}s "
+        f"= {summary['rows_per_second'] or 0:,.0f} rows/s; predictions in {args.output}"
+    )
@@ -1,48 +1,350 @@
-from fastapi import FastAPI # for creating the API
-from pydantic import BaseModel # for defining the request body
-import joblib # for loading the model and scaler
+from fastapi import FastAPI, HTTPException, Request, Response # for creating the API and returning request errors
+from pydantic import BaseModel, ValidationError # for defining and validating the request body
 import numpy as np # for making predictions
-import uvicorn # for running the API
+import asyncio
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from starlette.concurrency import run_in_threadpool # keeps sklearn off the event loop
 
 # Add project root to Python path so imports work with reload
 project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-# Load the saved model and scaler
+from src.batching import MicroBatcher # coalesces concurrent /predict calls
+from src.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, ServingMetrics # Prometheus /metrics
+from src.model_manager import ModelManager # hot-reloadable model versions
+from src.prediction_cache import PredictionCache # memoizes repeated feature vectors
+from src import wire # Arrow IPC / raw float32 encodings for bulk scoring
 
-bundle = joblib.load('src/models/rf.pk1') # load the model and scaler from the saved file
-model = bundle['model'] # get the model from the bundle
-scaler = bundle['scaler'] # get the scaler from the bundle
-feature_names = bundle['features'] # get the features from the bundle
+# Importing this module loads no model and no heavy library: create_app() loads the bundle, and only
+# what its format needs (joblib + scikit-learn for .pk1, neither for an .ids.json served by the compiled engine)
+DEFAULT_MODEL_PATH = "src/models/rf.pk1"
 
 # Define the data structure FASTAPI EXPECTS
 
 class Flowdata(BaseModel): # class is a blueprint for creating objects
-    features: dict # dictionary of feature names and values
+    features: dict[str, float | None] | None = None # dictionary of feature names and values (null = default)
+    values: list[float] | None = None # positional: one value per feature, in GET /schema order
 
-# Create the API and intializes fastapi app
-app = FastAPI(title="AI Cybersecurity Intrusion Detection System", description="Classify network flows into benign or malicious categories. ")
+class BatchFlowdata(BaseModel): # many flows scored in one call
+    flows: list[dict[str, float | None]] | None = None # row-oriented: one feature dict per flow
+    columns: dict[str, list[float]] | None = None # column-oriented: feature name -> one value per flow
 
-# Define the endpoint
-@app.post("/predict")
-def predict(flow_data: Flowdata): # function is a block of code that can be called to perform a task
-    # Convert the input data to a numpy array
-    X = np.array([[flow_data.features.get(f, 0.0) for f in feature_names]])
-    x_scaled = scaler.transform(X)
+def json_body(model):
+    # OpenAPI request body of a route that parses its JSON itself, so /docs still shows the schema
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
 
-    # Predict class
-    y_pred = model.predict(x_scaled)[0] # predict the class of the input data
-    proba = model.predict_proba(x_scaled).max() # max probability of the predicted class
+def build_row(flow_data: Flowdata, schema):
+    # One flow as a (1, n_features) row plus the names of features that fell back to the default
+    if (flow_data.features is None) == (flow_data.values is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'features' or 'values'.")
+    try:
+        if flow_data.values is not None:
+            return schema.from_positional(flow_data.values), []
+        return schema.from_dict(flow_data.features)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
 
-    # Return the prediction and probability
-    return {
-        "prediction": y_pred,
-        "confidence": round(float(proba), 4)
-    }
+def build_batch_matrix(batch: BatchFlowdata, schema):
+    # Assemble one float64 matrix in bundle feature order from either input layout
+    if (batch.flows is None) == (batch.columns is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'flows' or 'columns'.")
+    try:
+        if batch.flows is not None:
+            return schema.from_dicts(batch.flows)
+        return schema.from_columns(batch.columns)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
 
-# Run with uvicorn locally
+def create_app(model_path: str | None = None) -> FastAPI:
+    """Load and warm the bundle at ``model_path`` and return the API serving it.
+
+    ``model_path`` defaults to ``IDS_MODEL_PATH`` (else src/models/rf.pk1); every other
+    setting is read from the ``IDS_*`` environment variables when this is called. Each
+    app owns its model manager, metrics, cache and batcher (``app.state``), so tests,
+    benchmarks and src.prefork build one explicitly instead of importing a global.
+    """
+    # Request, stage and prediction metrics for GET /metrics (on unless IDS_METRICS=0)
+    metrics = ServingMetrics() if os.environ.get("IDS_METRICS", "1") == "1" else None
+
+    # Load the saved model and scaler
+
+    model_path = model_path or os.environ.get("IDS_MODEL_PATH", DEFAULT_MODEL_PATH) # or an .ids.json artifact (memory-mapped)
+    manager = ModelManager(
+        model_path,
+        registry_path=os.environ.get("IDS_MODEL_REGISTRY"), # default: model_registry.json next to the bundle
+        engine=os.environ.get("IDS_ENGINE", "sklearn"), # sklearn (default) or the flat-array compiled forest
+        poll_interval=float(os.environ.get("IDS_RELOAD_POLL_S", "2")), # 0 disables watching the bundle file
+        drain_timeout=float(os.environ.get("IDS_RELOAD_DRAIN_S", "30")),
+        verify_artifacts=os.environ.get("IDS_ARTIFACT_VERIFY", "0") == "1", # 1 re-hashes artifact arrays at every load
+        n_jobs=int(os.environ["IDS_MODEL_N_JOBS"]) if os.environ.get("IDS_MODEL_N_JOBS") else None, # forest threads per call; unset keeps the bundle's
+        cascade=os.environ.get("IDS_CASCADE", "1") == "1", # 0 ignores a bundle's first-stage screen and scores every flow with the forest
+        metrics=metrics, # times preprocessing, scaler.transform and the model call(s) of every scored batch
+    )
+    manager.load(compiled_path=os.environ.get("IDS_COMPILED_MODEL")) # optional pre-exported .npz for the first bundle
+    admin_token = os.environ.get("IDS_ADMIN_TOKEN") # required by /admin routes when set
+
+    # Optional prediction cache shared by every scoring route (off unless IDS_CACHE=1)
+    cache = PredictionCache(
+        max_entries=int(os.environ.get("IDS_CACHE_MAX_ENTRIES", "100000")), # LRU bound, roughly 200 bytes per entry
+        ttl_s=float(os.environ.get("IDS_CACHE_TTL_S", "300")), # 0 keeps entries until evicted or the model changes
+        quantize_bits=int(os.environ.get("IDS_CACHE_QUANTIZE_BITS", "0")), # mantissa bits kept in the key; 0 = exact vectors
+    ) if os.environ.get("IDS_CACHE", "0") == "1" else None
+
+    # Inference runs on a dedicated pool of this many threads (0 = starlette's shared threadpool)
+    inference_threads = int(os.environ.get("IDS_INFERENCE_THREADS", "0"))
+    # Threads are started on first use, so a pool created before src.prefork forks is safe
+    inference_pool = ThreadPoolExecutor(max_workers=inference_threads, thread_name_prefix="inference") if inference_threads > 0 else None
+
+    def score_matrix(X, version):
+        # Preprocess, scale and score a (n_flows, n_features) matrix with a single forest pass
+        if cache is not None:
+            labels, confidences = cache.score(version, X, manager.current.model_id) # only uncached rows reach the forest
+        else:
+            labels, confidences = version.score(X)
+        if metrics is not None:
+            metrics.count_predictions(labels)
+        return labels, confidences, version.model_id
+
+    async def run_inference(fn, *args):
+        # Off the event loop, on the bounded inference pool when one is configured
+        if inference_pool is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, fn, *args)
+
+    # Optional micro-batching of concurrent /predict calls (off unless IDS_MICROBATCH=1)
+    batcher = MicroBatcher(
+        score_matrix,
+        max_batch_size=int(os.environ.get("IDS_MICROBATCH_MAX_SIZE", "64")),
+        max_wait_ms=float(os.environ.get("IDS_MICROBATCH_MAX_WAIT_MS", "2")),
+        executor=inference_pool,
+    ) if os.environ.get("IDS_MICROBATCH", "0") == "1" else None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # The batcher's queue and worker task must live on the server's event loop
+        if batcher is not None:
+            await batcher.start()
+        manager.watch() # reload rf.pk1 in the background when a retrain replaces it
+        yield
+        manager.stop()
+        if batcher is not None:
+            await batcher.stop()
+        if inference_pool is not None:
+            inference_pool.shutdown(wait=False)
+
+    # Create the API and intializes fastapi app
+    app = FastAPI(title="AI Cybersecurity Intrusion Detection System", description="Classify network flows into benign or malicious categories. ", lifespan=lifespan)
+    app.state.manager, app.state.metrics, app.state.cache, app.state.batcher = manager, metrics, cache, batcher
+    if metrics is not None:
+        app.add_middleware(MetricsMiddleware, metrics=metrics) # latency and status of every request, by route
+
+    def observe_stage(stage, started):
+        # Time since ``started`` (a perf_counter reading) into the stage's histogram
+        if metrics is not None:
+            metrics.observe_stage(stage, time.perf_counter() - started)
+
+    def parse_json(model, body):
+        # Validate a JSON body here rather than in FastAPI's signature handling, so the parse time is measured
+        started = time.perf_counter()
+        try:
+            parsed = model.model_validate_json(body)
+        except ValidationError as exc:
+            raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_input=False))
+        observe_stage("parse", started)
+        return parsed
+
+    def batch_response(X, defaulted_counts, version):
+        # Shared response body of the batch routes
+        if len(X) == 0:
+            return {"count": 0, "predictions": [], "defaulted_features": defaulted_counts, "model_id": version.model_id}
+        labels, confidences, model_id = score_matrix(X, version)
+
+        return {
+            "model_id": model_id, # bundle that scored this response
+            "count": len(labels),
+            "predictions": [
+                {"prediction": str(label), "confidence": round(float(conf), 4)}
+                for label, conf in zip(labels, confidences)
+            ],
+            "defaulted_features": defaulted_counts, # feature name -> number of flows that used the default
+        }
+
+    # Define the endpoint
+    @app.post("/predict", openapi_extra=json_body(Flowdata))
+    async def predict(request: Request): # function is a block of code that can be called to perform a task
+        flow_data = parse_json(Flowdata, await request.body())
+        # One model version parses and scores the flow, even if a reload lands meanwhile
+        with manager.lease() as version:
+            # Convert the input data to a numpy array
+            started = time.perf_counter()
+            X, defaulted = build_row(flow_data, version.schema)
+            observe_stage("assemble", started)
+
+            # Predict class and its probability in one pass over the forest
+            if batcher is not None:
+                label, confidence, model_id = await batcher.submit(X, version) # scored together with concurrent requests
+            else:
+                labels, confidences, model_id = await run_inference(score_matrix, X, version)
+                label, confidence = labels[0], confidences[0]
+
+        # Return the prediction and probability
+        return {
+            "prediction": str(label),
+            "confidence": round(float(confidence), 4),
+            "defaulted_features": defaulted, # features that were missing or null and scored as 0.0
+            "model_id": model_id, # bundle that scored this flow
+        }
+
+    @app.post("/predict/batch", openapi_extra=json_body(BatchFlowdata))
+    async def predict_batch(request: Request):
+        # Score N flows with one scaler.transform and one predict_proba call
+        batch = parse_json(BatchFlowdata, await request.body())
+        with manager.lease() as version:
+            started = time.perf_counter()
+            X, defaulted_counts = build_batch_matrix(batch, version.schema)
+            observe_stage("assemble", started)
+            return await run_inference(batch_response, X, defaulted_counts, version)
+
+    @app.post("/predict/packed")
+    async def predict_packed(request: Request):
+        # Body is raw little-endian float64, n_features values per flow in GET /schema order
+        body = await request.body()
+        with manager.lease() as version:
+            started = time.perf_counter()
+            try:
+                X = version.schema.from_packed(body)
+            except ValueError as exc:
+                raise HTTPException(status_code=422, detail=str(exc))
+            observe_stage("assemble", started)
+            return await run_inference(batch_response, X, {}, version)
+
+    @app.post("/predict/bulk")
+    async def predict_bulk(request: Request):
+        # Content-negotiated bulk scoring: the response uses the same encoding as the request
+        content_type = request.headers.get("content-type", wire.JSON).split(";")[0].strip().lower()
+        body = await request.body()
+
+        with manager.lease() as version:
+            if content_type == wire.JSON:
+                batch = parse_json(BatchFlowdata, body) # same body and response as /predict/batch
+                started = time.perf_counter()
+                X, defaulted_counts = build_batch_matrix(batch, version.schema)
+                observe_stage("assemble", started)
+                return await run_inference(batch_response, X, defaulted_counts, version)
+
+            if content_type == wire.ARROW_STREAM:
+                decode = wire.decode_arrow # imports pyarrow on the first Arrow request
+            elif content_type == wire.RAW_FLOAT32:
+                decode = wire.decode_raw_float32
+            else:
+                raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'. Use {wire.JSON}, {wire.ARROW_STREAM} or {wire.RAW_FLOAT32}.")
+
+            started = time.perf_counter()
+            try:
+                X, defaulted_counts = decode(body, version.schema)
+            except Exception as exc: # malformed Arrow streams raise pyarrow errors, not ValueError
+                raise HTTPException(status_code=422, detail=str(exc))
+            observe_stage("parse", started) # decoding a binary body is parsing and assembly in one step
+            if len(X):
+                labels, confidences, model_id = await run_inference(score_matrix, X, version)
+            else:
+                labels, confidences, model_id = np.array([], dtype=str), np.array([], dtype=np.float64), version.model_id
+
+            if content_type == wire.ARROW_STREAM:
+                content = wire.encode_arrow(labels, confidences, defaulted_counts, model_id=model_id)
+            else:
+                content = wire.encode_raw_results(labels, confidences, version.classes_, defaulted_counts, model_id=model_id)
+        return Response(content=content, media_type=content_type, headers={"X-Model-Id": model_id})
+
+    @app.get("/schema")
+    def feature_schema():
+        # Feature order expected by positional and packed inputs
+        version = manager.current
+        return {**version.schema.describe(), "model_id": version.model_id}
+
+    @app.get("/stats/batching")
+    def batching_stats():
+        # Queue depth and batch-size histograms of the /predict micro-batcher
+        if batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **batcher.stats()}
+
+    @app.get("/stats/cache")
+    def cache_stats():
+        # Hit/miss/eviction counters of the prediction cache
+        if cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **cache.stats()}
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        # Prometheus text: request and stage latency histograms, counters, predictions per class, active model
+        if metrics is None:
+            raise HTTPException(status_code=404, detail="Metrics are disabled (IDS_METRICS=0).")
+        status = manager.status()
+        current = status["current"]
+        extra = [
+            ("ids_model_info", "gauge", "Model serving new requests (always 1; the model is in the labels).",
+             [({"model_id": current["model_id"], "engine": current["engine"]}, 1)]),
+            ("ids_model_reloads_total", "counter", "Models swapped in since start.", [({}, status["reloads"])]),
+            ("ids_model_draining", "gauge", "Replaced models still finishing requests.", [({}, len(status["draining"]))]),
+        ]
+        if current["cascade"] is not None:
+            extra.append(("ids_cascade_flows_total", "counter", "Flows through the first-stage screen of the active model.", [({}, current["cascade"]["flows"])]))
+            extra.append(("ids_cascade_escalated_total", "counter", "Of those, flows escalated to the forest.", [({}, current["cascade"]["escalated"])]))
+        if cache is not None:
+            stats = cache.stats()
+            for name in ("hits", "misses", "evictions"):
+                extra.append((f"ids_cache_{name}_total", "counter", f"Prediction cache {name}.", [({}, stats[name])]))
+            extra.append(("ids_cache_entries", "gauge", "Prediction cache entries.", [({}, stats["entries"])]))
+        if batcher is not None:
+            extra.append(("ids_microbatch_batches_total", "counter", "Micro-batches scored for /predict.", [({}, batcher.total_batches)]))
+            extra.append(("ids_microbatch_flows_total", "counter", "Flows scored in micro-batches.", [({}, batcher.total_flows)]))
+        return Response(content=metrics.render(extra), media_type=METRICS_CONTENT_TYPE)
+
+    def require_admin(request: Request):
+        # Admin routes need the X-Admin-Token header when IDS_ADMIN_TOKEN is set
+        if admin_token and request.headers.get("x-admin-token") != admin_token:
+            raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+    @app.get("/admin/model")
+    def model_status(request: Request):
+        # Serving version, versions still draining, and the last reload error
+        require_admin(request)
+        return manager.status()
+
+    @app.post("/admin/reload")
+    def reload_model(request: Request, model_id: str | None = None, wait: bool = False):
+        # Load rf.pk1 again, or a registered version by model_id, and swap it in once warm
+        require_admin(request)
+        try:
+            path = manager.path_for(model_id) if model_id else None
+        except (KeyError, FileNotFoundError) as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+        thread = manager.reload_async(path)
+        if wait:
+            thread.join() # runs in FastAPI's threadpool, so the event loop keeps serving
+            if manager.last_error:
+                raise HTTPException(status_code=500, detail=manager.last_error)
+        return {"accepted": True, "waited": wait, **manager.status()}
+
+    return app
+
+def __getattr__(name):
+    # ``src.serve:app`` still works (uvicorn, older scripts): built from the environment on first access
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Run with uvicorn locally (development); production: python -m src.prefork --workers N
 if __name__ == "__main__":
-    uvicorn.run("src.serve:app", host="0.0.0.0", port=8000, reload=True) # run the API on the specified host and port and reload the server when changes are made to the code
\ No newline at end of file
+    import uvicorn # for running the API
+
+    uvicorn.run("src.serve:create_app", factory=True, host="0.0.0.0", port=8000, reload=True) # run the API on the specified host and port and reload the server when changes are made to the code
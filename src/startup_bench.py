@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Project root on the path so `python src/startup_bench.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Each scenario runs in a fresh interpreter: (code, IDS_* environment); {model} / {artifact} are the bundle paths
+SCENARIOS = {
+    "import_serve": ("import src.serve", {}),
+    "serve_artifact_compiled": ("from src.serve import create_app\ncreate_app({artifact!r})", {"IDS_ENGINE": "compiled"}),
+    "serve_pickle_sklearn": ("from src.serve import create_app\ncreate_app({model!r})", {"IDS_ENGINE": "sklearn"}),
+    "import_train": ("import src.train_supervised", {}),
+}
+# Target seconds from the first statement to the end of the scenario (median); None = reported only.
+# An autoscaled scoring pod should take traffic within a second of starting on the compiled artifact.
+BUDGETS_S = {
+    "import_serve": 0.75,
+    "serve_artifact_compiled": 1.0,
+    "serve_pickle_sklearn": None,  # unpickling a forest imports all of scikit-learn; use the artifact for fast starts
+    "import_train": 2.0,
+}
+# Libraries a scenario must not load: each is only needed on another path
+MUST_NOT_IMPORT = {
+    "import_serve": ("sklearn", "joblib", "pyarrow", "uvicorn", "mlflow", "pandas"),
+    "serve_artifact_compiled": ("sklearn", "joblib", "pyarrow", "uvicorn", "mlflow", "pandas"),
+    "serve_pickle_sklearn": ("uvicorn", "mlflow"),  # pyarrow comes with pandas, which scikit-learn imports
+    "import_train": ("mlflow",),
+}
+
+# Printed by the child after the scenario ran
+_EPILOGUE = "\nimport json as _json, sys as _sys\nprint(_json.dumps({'seconds': _time.perf_counter() - _started, 'modules': sorted(_sys.modules)}))\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time cold starts of serve.py and train_supervised.py in fresh interpreters, with a python -X importtime breakdown."
+    )
+    parser.add_argument("--model", default=None, help="Pickled .pk1/.joblib bundle (default: a synthetic forest trained for this run).")
+    parser.add_argument("--artifact", default=None, help=".ids.json artifact of the same bundle (default: saved from the synthetic forest).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per scenario (median is reported).")
+    parser.add_argument("--trees", type=int, default=100, help="Trees of the synthetic forest.")
+    parser.add_argument("--rows", type=int, default=20_000, help="Synthetic rows the forest is trained on.")
+    parser.add_argument("--top", type=int, default=8, help="Packages listed per scenario in the import breakdown.")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every budget (e.g. 2 on a slow CI runner).")
+    parser.add_argument("--output", default=None, help="Optional JSON path for the full report.")
+    return parser.parse_args()
+
+
+def build_bundle(workdir: Path, trees: int, rows: int) -> Tuple[str, str]:
+    # A forest shaped like a real one (same features and classes), saved both ways
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    from src.artifact import save_artifact
+    from src.features import clean_features, load_dataset, scale_features_fused, split_X_y
+    from src.synthetic import write_csv
+
+    X, y, _ = split_X_y(clean_features(load_dataset(str(write_csv(workdir / "synthetic.csv", rows)))))
+    X_scaled, scaler, preprocessing = scale_features_fused(X)
+    model = RandomForestClassifier(n_estimators=trees, class_weight="balanced", n_jobs=-1, random_state=0).fit(X_scaled, y)
+    bundle = {"model_id": f"startup-rf{trees}", "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}
+    joblib.dump(bundle, workdir / "startup.pk1")
+    save_artifact(bundle, workdir / "startup.ids.json")
+    return str(workdir / "startup.pk1"), str(workdir / "startup.ids.json")
+
+
+def run_child(code: str, env: Dict[str, str], importtime: bool = False) -> Tuple[Dict[str, Any], float, str]:
+    # (child's own report, wall seconds including interpreter start-up, stderr)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", "import time as _time; _started = _time.perf_counter()\n" + code + _EPILOGUE]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"scenario failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), wall, completed.stderr
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    # (module, self us, cumulative us, nesting depth) per "import time:" line; depth 0 = imported by the scenario itself
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def by_package(modules: List[Tuple[str, int, int, int]]) -> Dict[str, float]:
+    # Self time summed per top-level package, in seconds, largest first ("src" = this project)
+    totals: Dict[str, int] = {}
+    for name, self_us, _, _ in modules:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return {package: us / 1e6 for package, us in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def run_scenario(name: str, paths: Dict[str, str], repeats: int, budget_scale: float) -> Dict[str, Any]:
+    code, ids_env = SCENARIOS[name]
+    env = {**os.environ, **ids_env, "IDS_RELOAD_POLL_S": "0", "PYTHONPATH": str(PROJECT_ROOT)}
+    code = code.format(**paths)
+    runs, walls = [], []
+    for _ in range(repeats):
+        report, wall, _ = run_child(code, env)
+        runs.append(report["seconds"])
+        walls.append(wall)
+    report, _, stderr = run_child(code, env, importtime=True)  # separate run: -X importtime slows every import down
+    modules = parse_importtime(stderr)
+
+    loaded = {module.split(".")[0] for module in report["modules"]}
+    forbidden = [package for package in MUST_NOT_IMPORT.get(name, ()) if package in loaded]
+    budget = BUDGETS_S.get(name)
+    budget = budget * budget_scale if budget is not None else None
+    seconds = sorted(runs)[len(runs) // 2]
+    return {
+        "seconds": seconds,
+        "min_seconds": min(runs),
+        "process_seconds": sorted(walls)[len(walls) // 2],  # interpreter start-up and exit included
+        "budget_s": budget,
+        "over_budget": budget is not None and seconds > budget,
+        "forbidden_imports": forbidden,
+        "modules_loaded": len(report["modules"]),
+        "import_seconds": sum(self_us for _, self_us, _, _ in modules) / 1e6,
+        "packages": by_package(modules),
+        "slowest_top_level": [  # imports made by the scenario itself, with everything they pulled in
+            {"module": module, "cumulative_s": cumulative / 1e6}
+            for module, _, cumulative, _ in sorted((m for m in modules if m[3] == 0), key=lambda m: -m[2])[:5]
+        ],
+    }
+
+
+def format_report(results: Dict[str, Dict[str, Any]], top: int) -> str:
+    lines = [f"{'scenario':<26} {'median s':>9} {'process s':>10} {'budget s':>9} {'status':>7}"]
+    for name, result in results.items():
+        ok = not result["over_budget"] and not result["forbidden_imports"]
+        budget = "-" if result["budget_s"] is None else f"{result['budget_s']:.2f}"
+        lines.append(f"{name:<26} {result['seconds']:>9.3f} {result['process_seconds']:>10.3f} {budget:>9} {'ok' if ok else 'FAIL':>7}")
+        if result["forbidden_imports"]:
+            lines.append(f"  loads {', '.join(result['forbidden_imports'])}, which this path does not use")
+    for name, result in results.items():
+        packages = list(result["packages"].items())[:top]
+        lines.append(f"\n{name}: {result['import_seconds']:.3f}s importing {result['modules_loaded']} modules (-X importtime, self time by package)")
+        lines += [f"  {package:<24} {seconds * 1000:>8.1f} ms" for package, seconds in packages]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}.")
+
+    with tempfile.TemporaryDirectory(prefix="ids-startup-") as tmp:
+        model, artifact = args.model, args.artifact
+        if model is None or artifact is None:
+            started = time.perf_counter()
+            built_model, built_artifact = build_bundle(Path(tmp), args.trees, args.rows)
+            model, artifact = model or built_model, artifact or built_artifact
+            print(f"built a {args.trees}-tree synthetic forest in {time.perf_counter() - started:.1f}s")
+        paths = {"model": str(Path(model).resolve()), "artifact": str(Path(artifact).resolve())}
+        results = {name: run_scenario(name, paths, args.repeats, args.budget_scale) for name in names}
+
+    print(format_report(results, args.top))
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "model": paths["model"], "artifact": paths["artifact"], "results": results}, f, indent=2)
+        print(f"✔ Results written to {output}")
+
+    failed = [name for name, result in results.items() if result["over_budget"] or result["forbidden_imports"]]
+    if failed:
+        print(f"✘ Over budget or loading unused libraries: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
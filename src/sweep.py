@@ -0,0 +1,203 @@
+import argparse
+import copy
+import itertools
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Project root on the path so `python src/sweep.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.artifact import promote_artifact
+from src.train_supervised import ensure_registry_entry, load_config, load_training_data, promote_bundle, train_on_data
+
+DEFAULT_WORKDIR = "data/.sweep"
+
+# Set in each worker by _init_worker: memory-mapped matrices plus the small metadata
+_worker_data: Dict[str, Any] = {}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run a parallel hyper-parameter sweep over model.params from a YAML config."
+    )
+    parser.add_argument(
+        "--config",
+        default="configs/sweep_rf.yaml",
+        help="Training config with a `sweep` section.",
+    )
+    parser.add_argument(
+        "--no-promote",
+        action="store_true",
+        help="Keep the current rf.pk1 even if a trial beats it.",
+    )
+    return parser.parse_args()
+
+
+def expand_trials(sweep_cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parameter overrides for every trial.
+
+    ``grid`` takes the cartesian product of the value lists. ``random`` draws
+    ``n_trials`` combinations: a list is sampled uniformly, and a ``{low, high}``
+    mapping draws an int (both bounds ints) or a float in that range.
+    """
+    space = sweep_cfg.get("params", {})
+    strategy = sweep_cfg.get("strategy", "grid")
+    if strategy == "grid":
+        names = list(space)
+        for name in names:
+            if not isinstance(space[name], list):
+                raise ValueError(f"Grid values for '{name}' must be a list.")
+        return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+    if strategy != "random":
+        raise ValueError(f"Unknown sweep strategy '{strategy}' (expected 'grid' or 'random').")
+    rng = np.random.default_rng(sweep_cfg.get("seed", 0))
+    trials = []
+    for _ in range(int(sweep_cfg.get("n_trials", 10))):
+        trial = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                trial[name] = values[rng.integers(len(values))]
+            elif isinstance(values, (int, float)):
+                trial[name] = values
+            elif isinstance(values.get("low"), int) and isinstance(values.get("high"), int):
+                trial[name] = int(rng.integers(values["low"], values["high"], endpoint=True))
+            else:
+                trial[name] = float(rng.uniform(values["low"], values["high"]))
+        trials.append(trial)
+    return trials
+
+
+def plan_parallelism(sweep_cfg: Dict[str, Any], model_params: Dict[str, Any], n_trials: int) -> Tuple[int, int]:
+    """(worker processes, n_jobs per forest) with workers * n_jobs <= budget."""
+    budget = int(sweep_cfg.get("cpu_budget") or os.cpu_count() or 1)
+    requested = model_params.get("n_jobs")
+    if sweep_cfg.get("workers"):
+        workers = int(sweep_cfg["workers"])
+    elif isinstance(requested, int) and requested > 0:
+        workers = budget // requested  # honour an explicit per-forest n_jobs
+    else:
+        workers = n_trials
+    workers = max(1, min(workers, n_trials, budget))
+    return workers, max(1, budget // workers)
+
+
+def share_matrices(data: Dict[str, Any], workdir: Path) -> Dict[str, str]:
+    """Write X/y once as .npy files that every worker memory-maps read-only.
+
+    X is stored as C-contiguous float32, the dtype the forest trains on, so the
+    workers' fits use the mapped pages directly instead of each making a copy.
+    """
+    workdir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for name in ("X_train", "X_test", "y_train", "y_test"):
+        values = np.asarray(data[name])
+        if name.startswith("X"):
+            filename = getattr(data[name], "filename", None)
+            if filename and values.dtype == np.float32 and values.flags.c_contiguous:
+                paths[name] = str(filename)  # out-of-core matrices are already on disk
+                continue
+            values = np.ascontiguousarray(values, dtype=np.float32)
+        else:
+            values = values.astype(str)  # fixed-width unicode, so labels can be mapped too
+        path = workdir / f"{name}.npy"
+        np.save(path, values)
+        paths[name] = str(path)
+    return paths
+
+
+def _init_worker(paths: Dict[str, str], meta: Dict[str, Any]) -> None:
+    _worker_data.clear()
+    _worker_data.update(meta)
+    for name, path in paths.items():
+        _worker_data[name] = np.load(path, mmap_mode="r")
+
+
+def _run_trial(config: Dict[str, Any], run_name: str, model_id: str, tags: Dict[str, str]) -> Dict[str, Any]:
+    result = train_on_data(config, _worker_data, run_name_override=run_name, model_id=model_id, promote=False, register=False, tags=tags)
+    result.pop("classification_report")
+    result.pop("profiler")  # stage timings are already in the registry entry
+    return result
+
+
+def run_sweep(config: Dict[str, Any], promote: bool = True) -> Dict[str, Any]:
+    sweep_cfg = config.get("sweep", {})
+    metric = sweep_cfg.get("metric", "macro_f1")
+    trials = expand_trials(sweep_cfg)
+    if not trials:
+        raise ValueError("The sweep has no trials; check sweep.params.")
+
+    base_params = config.get("model", {}).get("params", {})
+    workers, n_jobs = plan_parallelism(sweep_cfg, base_params, len(trials))
+    sweep_id = f"sweep-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
+    print(f"{sweep_id}: {len(trials)} trials on {workers} workers x {n_jobs} forest jobs")
+
+    # Load and scale once; workers only see memory-mapped copies of the result
+    data = load_training_data(config)
+    workdir = Path(sweep_cfg.get("workdir", DEFAULT_WORKDIR)) / sweep_id
+    paths = share_matrices(data, workdir)
+    meta = {key: value for key, value in data.items() if key not in paths}
+    del data
+
+    mlflow_cfg = config.get("mlflow", {})
+    if mlflow_cfg.get("enabled", True):
+        import mlflow
+
+        # Create the experiment once, before workers race to do it
+        mlflow.set_tracking_uri(mlflow_cfg.get("tracking_uri", "mlruns"))
+        mlflow.set_experiment(mlflow_cfg.get("experiment_name", "default"))
+
+    output_cfg = config.get("output", {})
+    output_dir = Path(output_cfg.get("dir", "src/models"))
+    registry_path = Path(output_cfg.get("registry_path", output_dir / "model_registry.json"))
+
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths, meta)) as pool:
+            futures = {}
+            for i, overrides in enumerate(trials):
+                trial_config = copy.deepcopy(config)
+                trial_config.pop("sweep", None)
+                params = trial_config.setdefault("model", {}).setdefault("params", {})
+                params.update(overrides)
+                params["n_jobs"] = n_jobs
+                tags = {"sweep_id": sweep_id, "trial": str(i)}
+                future = pool.submit(_run_trial, trial_config, f"{sweep_id}-trial{i:03d}", f"rf-{sweep_id[6:]}-t{i:03d}", tags)
+                futures[future] = overrides
+            for future in as_completed(futures):
+                result = future.result()
+                result["params"] = futures[future]
+                # Registry writes stay in this process so concurrent trials never clobber the file
+                ensure_registry_entry(registry_path, result.pop("registry_entry"))
+                results.append(result)
+                print(f"  {result['model_id']} {metric}={result['metrics'][metric]:.4f} {json.dumps(futures[future])}")
+    finally:
+        if not sweep_cfg.get("keep_workdir", False):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results.sort(key=lambda r: r["metrics"][metric], reverse=True)
+    best = results[0]
+    if promote and sweep_cfg.get("promote_best", True):
+        promote_bundle(best["model_path"], output_dir / "rf.pk1")  # same bundle the API loads
+        if best.get("artifact_path"):
+            promote_artifact(best["artifact_path"], output_dir / "rf.ids.json")
+    return {"sweep_id": sweep_id, "metric": metric, "best": best, "trials": results, "promoted": promote and sweep_cfg.get("promote_best", True)}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    summary = run_sweep(load_config(args.config), promote=not args.no_promote)
+    best = summary["best"]
+    print(f"✔ Best of {len(summary['trials'])}: {best['model_id']} ({summary['metric']}={best['metrics'][summary['metric']]:.4f}) {json.dumps(best['params'])}")
+    if summary["promoted"]:
+        print(f"  promoted to {Path(best['model_path']).parent / 'rf.pk1'}")
@@ -0,0 +1,326 @@
+import argparse
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Raw CICIDS2017 header, leading spaces and the duplicated 'Fwd Header Length' included
+# (pandas reads the second one as 'Fwd Header Length.1'); 78 numeric columns, then Label
+RAW_FEATURE_COLUMNS = [
+    " Destination Port", " Flow Duration", " Total Fwd Packets", " Total Backward Packets",
+    "Total Length of Fwd Packets", " Total Length of Bwd Packets", " Fwd Packet Length Max",
+    " Fwd Packet Length Min", " Fwd Packet Length Mean", " Fwd Packet Length Std",
+    "Bwd Packet Length Max", " Bwd Packet Length Min", " Bwd Packet Length Mean", " Bwd Packet Length Std",
+    "Flow Bytes/s", " Flow Packets/s", " Flow IAT Mean", " Flow IAT Std", " Flow IAT Max", " Flow IAT Min",
+    "Fwd IAT Total", " Fwd IAT Mean", " Fwd IAT Std", " Fwd IAT Max", " Fwd IAT Min",
+    "Bwd IAT Total", " Bwd IAT Mean", " Bwd IAT Std", " Bwd IAT Max", " Bwd IAT Min",
+    "Fwd PSH Flags", " Bwd PSH Flags", " Fwd URG Flags", " Bwd URG Flags",
+    " Fwd Header Length", " Bwd Header Length", "Fwd Packets/s", " Bwd Packets/s",
+    " Min Packet Length", " Max Packet Length", " Packet Length Mean", " Packet Length Std",
+    " Packet Length Variance", "FIN Flag Count", " SYN Flag Count", " RST Flag Count", " PSH Flag Count",
+    " ACK Flag Count", " URG Flag Count", " CWE Flag Count", " ECE Flag Count", " Down/Up Ratio",
+    " Average Packet Size", " Avg Fwd Segment Size", " Avg Bwd Segment Size", " Fwd Header Length",
+    "Fwd Avg Bytes/Bulk", " Fwd Avg Packets/Bulk", " Fwd Avg Bulk Rate", " Bwd Avg Bytes/Bulk",
+    " Bwd Avg Packets/Bulk", "Bwd Avg Bulk Rate", "Subflow Fwd Packets", " Subflow Fwd Bytes",
+    " Subflow Bwd Packets", " Subflow Bwd Bytes", "Init_Win_bytes_forward", " Init_Win_bytes_backward",
+    " act_data_pkt_fwd", " min_seg_size_forward", "Active Mean", " Active Std", " Active Max", " Active Min",
+    "Idle Mean", " Idle Std", " Idle Max", " Idle Min",
+]
+RAW_LABEL_COLUMN = " Label"
+
+# Flow counts per label in the full CICIDS2017 week (MachineLearningCVE), i.e. the real imbalance
+CLASS_COUNTS = {
+    "BENIGN": 2273097,
+    "DoS Hulk": 231073,
+    "PortScan": 158930,
+    "DDoS": 128027,
+    "DoS GoldenEye": 10293,
+    "FTP-Patator": 7938,
+    "SSH-Patator": 5897,
+    "DoS slowloris": 5796,
+    "DoS Slowhttptest": 5499,
+    "Bot": 1966,
+    "Web Attack - Brute Force": 1507,
+    "Web Attack - XSS": 652,
+    "Infiltration": 36,
+    "Web Attack - Sql Injection": 21,
+    "Heartbleed": 11,
+}
+
+# Typical destination ports per class; classes not listed draw any port
+CLASS_PORTS = {
+    "BENIGN": [80, 443, 53, 8080, 123, 137, 389, 3268],
+    "DoS Hulk": [80], "DDoS": [80], "DoS GoldenEye": [80], "DoS slowloris": [80], "DoS Slowhttptest": [80],
+    "FTP-Patator": [21], "SSH-Patator": [22], "Bot": [8080, 80], "Heartbleed": [444],
+    "Web Attack - Brute Force": [80], "Web Attack - XSS": [80], "Web Attack - Sql Injection": [80],
+}
+
+# Columns that hold a 0/1 flag or a small count rather than a heavy-tailed flow statistic
+FLAG_COLUMNS = {
+    "Fwd PSH Flags", "Bwd PSH Flags", "Fwd URG Flags", "Bwd URG Flags", "FIN Flag Count", "SYN Flag Count",
+    "RST Flag Count", "PSH Flag Count", "ACK Flag Count", "URG Flag Count", "CWE Flag Count", "ECE Flag Count",
+}
+# The rate columns where the real exports hold inf (zero-duration flows) and NaN
+RATE_COLUMNS = ("Flow Bytes/s", "Flow Packets/s")
+
+
+def feature_names() -> List[str]:
+    # Column names as load_dataset/clean_features see them (stripped, duplicate renamed by pandas)
+    names = [raw.strip() for raw in RAW_FEATURE_COLUMNS]
+    names[names.index("Fwd Header Length", names.index("Fwd Header Length") + 1)] = "Fwd Header Length.1"
+    return names
+
+
+def class_sizes(n_rows: int, min_per_class: int = 2) -> Dict[str, int]:
+    """Rows per label for ``n_rows`` flows with the CICIDS2017 class proportions.
+
+    Every class gets at least ``min_per_class`` rows (so stratified splits keep it);
+    the remainder after rounding goes to BENIGN.
+    """
+    total = sum(CLASS_COUNTS.values())
+    sizes = {label: max(min_per_class, int(n_rows * count / total)) for label, count in CLASS_COUNTS.items()}
+    sizes["BENIGN"] += n_rows - sum(sizes.values())
+    if sizes["BENIGN"] < min_per_class:
+        raise ValueError(f"n_rows={n_rows} is too small for {len(CLASS_COUNTS)} classes of {min_per_class} rows.")
+    return sizes
+
+
+def class_profiles(n_features: int, separation: float, seed: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    # Log-space (mean, std) per column and class; attacks are offset from BENIGN and narrower
+    rng = np.random.default_rng(seed)
+    benign_mu = rng.uniform(0.0, 12.0, n_features)
+    profiles = {"BENIGN": (benign_mu, np.full(n_features, 2.0))}
+    for label in CLASS_COUNTS:
+        if label != "BENIGN":
+            profiles[label] = (benign_mu + separation * 2.0 * rng.standard_normal(n_features), rng.uniform(0.5, 1.5, n_features))
+    return profiles
+
+
+def generate_flows(
+    n_rows: int,
+    seed: int = 0,
+    inf_rate: float = 0.001,
+    nan_rate: float = 0.0005,
+    separation: float = 1.0,
+    min_per_class: int = 2,
+    profile_seed: int | None = None,
+) -> pd.DataFrame:
+    """Synthetic CICIDS-shaped flows: the 78 numeric columns plus ``Label``, rows shuffled.
+
+    Each class has its own log-normal profile per column, offset from BENIGN by
+    ``separation`` standard deviations on average, so a forest learns it but not
+    perfectly. Counts and flags are integers, ports follow the class, and the rate
+    columns get ``inf_rate`` infinities and ``nan_rate`` NaNs like the real exports.
+    The class profiles come from ``profile_seed`` (default: ``seed``) and the rows from
+    ``seed``, so files written in several chunks share one set of profiles.
+    Column names are stripped (as after ``load_dataset``); see ``write_csv`` for raw files.
+    """
+    rng = np.random.default_rng(seed)
+    names = feature_names()
+    flags = np.array([name in FLAG_COLUMNS for name in names])
+    port = names.index("Destination Port")
+    profiles = class_profiles(len(names), separation, seed if profile_seed is None else profile_seed)
+
+    blocks, labels = [], []
+    for label, size in class_sizes(n_rows, min_per_class).items():
+        mu, sigma = profiles[label]
+        block = np.exp(mu + sigma * rng.standard_normal((size, len(names)))) - 1.0
+        block = np.floor(block)  # packet counts, bytes and microsecond timings are whole numbers
+
+        flag_p = 1.0 / (1.0 + np.exp(-(mu[flags] - 6.0)))  # per-class flag frequency
+        block[:, flags] = rng.random((size, int(flags.sum()))) < flag_p
+        ports = CLASS_PORTS.get(label)
+        block[:, port] = rng.choice(ports, size) if ports else rng.integers(1, 65536, size)
+        blocks.append(block)
+        labels.append(np.full(size, label, dtype=object))
+
+    X = np.vstack(blocks)
+    y = np.concatenate(labels)
+    order = rng.permutation(len(y))
+    X, y = X[order], y[order]
+
+    for name in RATE_COLUMNS:
+        col = names.index(name)
+        X[rng.random(len(X)) < inf_rate, col] = np.inf
+    X[rng.random(len(X)) < nan_rate, names.index(RATE_COLUMNS[0])] = np.nan
+
+    df = pd.DataFrame(X, columns=names)
+    df["Label"] = y
+    return df
+
+
+def write_csv(path: str | Path, n_rows: int, seed: int = 0, chunk_rows: int = 250_000, **kwargs) -> Path:
+    # Raw CICIDS layout (leading spaces, duplicate header), written in chunks to bound memory;
+    # pyarrow's writer is ~10x faster than DataFrame.to_csv and round-trips every value exactly
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = RAW_FEATURE_COLUMNS + [RAW_LABEL_COLUMN]
+    with open(path, "wb") as f:
+        f.write((",".join(header) + "\n").encode("utf-8"))
+        for i, start in enumerate(range(0, n_rows, chunk_rows)):
+            rows = min(chunk_rows, n_rows - start)
+            chunk = generate_flows(rows, seed=seed + i + 1, profile_seed=seed, **kwargs)
+            pacsv.write_csv(pa.Table.from_pandas(chunk, preserve_index=False), f, pacsv.WriteOptions(include_header=False))
+    return path
+
+
+# Packet-level synthetic traffic for the pcap flow extractor
+PCAP_SNAPLEN = 96
+TCP_FLAGS = {"FIN": 0x01, "SYN": 0x02, "RST": 0x04, "PSH": 0x08, "ACK": 0x10}
+
+
+def _session(rng: np.random.Generator, kind: str) -> Tuple[List[int], List[int], List[int], List[float]]:
+    # (directions 0=fwd/1=bwd, TCP flags, payload bytes, gaps in microseconds) of one flow's packets
+    f = TCP_FLAGS
+    if kind == "dns":
+        return [0, 1], [0, 0], [int(rng.integers(30, 60)), int(rng.integers(80, 300))], [0.0, float(rng.exponential(20_000))]
+    exchanges = int(rng.integers(1, 6)) if kind == "web" else 1
+    scale = 5_000.0 if kind == "web" else 200.0  # flood connections are opened and torn down fast
+    directions, flags, payload = [0, 1, 0], [f["SYN"], f["SYN"] | f["ACK"], f["ACK"]], [0, 0, 0]
+    for _ in range(exchanges):
+        directions.append(0)
+        flags.append(f["PSH"] | f["ACK"])
+        payload.append(int(rng.integers(200, 600)) if kind == "web" else int(rng.integers(20, 80)))
+        for _ in range(int(rng.integers(1, 5)) if kind == "web" else 1):
+            directions.append(1)
+            flags.append(f["ACK"])
+            payload.append(int(rng.integers(500, 1461)) if kind == "web" else int(rng.integers(0, 200)))
+    directions.append(0)
+    flags.append(f["FIN"] | f["ACK"])  # the extractor ends a flow on FIN, so it is the last packet
+    payload.append(0)
+    gaps = [0.0] + rng.exponential(scale, len(directions) - 1).tolist()
+    return directions, flags, payload, gaps
+
+
+def _dotted(address: int) -> str:
+    return ".".join(str(address >> shift & 0xFF) for shift in (24, 16, 8, 0))
+
+
+def synthetic_packets(n_flows: int, seed: int = 0, attack_share: float = 0.3, span_s: float = 60.0) -> Tuple[Dict[str, np.ndarray], pd.DataFrame]:
+    """Packets of ``n_flows`` synthetic IPv4 flows, sorted by time, and one ground-truth row per flow.
+
+    BENIGN flows are HTTP sessions (handshake, request/response exchanges, FIN)
+    and DNS lookups over UDP; DDoS flows are short HTTP-flood connections from
+    many sources to one server. Every flow has its own (address, port) pair, so
+    the truth frame's packet and byte totals are what an extractor should report.
+    """
+    rng = np.random.default_rng(seed)
+    kinds = np.where(rng.random(n_flows) < attack_share, "flood", np.where(rng.random(n_flows) < 0.8, "web", "dns"))
+    starts = np.sort(rng.uniform(0.0, span_s * 1e6, n_flows)) + 1.5e15  # microseconds since the epoch
+    columns: Dict[str, List[Any]] = {name: [] for name in ("ts", "src", "dst", "sport", "dport", "proto", "flags", "payload", "window")}
+    truth = []
+    for i, kind in enumerate(kinds.tolist()):
+        client = (192 << 24 | 168 << 16 | 10 << 8) + 1 + i // 60_000 if kind != "flood" else (172 << 24 | 16 << 16) + 1 + i % 65_000
+        server = {"web": (10 << 24) + 1 + i % 50, "dns": (8 << 24 | 8 << 16 | 8 << 8 | 8), "flood": (192 << 24 | 168 << 16 | 10 << 8 | 50)}[kind]
+        sport = 1024 + i % 60_000
+        dport = {"web": 80 if i % 3 else 443, "dns": 53, "flood": 80}[kind]
+        proto = 17 if kind == "dns" else 6
+        directions, flags, payload, gaps = _session(rng, kind)
+        ts = starts[i] + np.floor(np.cumsum(gaps))
+        for d, fl, size, t in zip(directions, flags, payload, ts.tolist()):
+            columns["ts"].append(t)
+            columns["src"].append(server if d else client)
+            columns["dst"].append(client if d else server)
+            columns["sport"].append(dport if d else sport)
+            columns["dport"].append(sport if d else dport)
+            columns["proto"].append(proto)
+            columns["flags"].append(fl)
+            columns["payload"].append(size)
+            columns["window"].append((28_960 if d else 29_200) if proto == 6 else 0)
+        fwd = np.array(directions) == 0
+        sizes = np.array(payload)
+        truth.append({
+            "Source IP": _dotted(client), "Source Port": sport, "Destination IP": _dotted(server), "Destination Port": dport, "Protocol": proto,
+            "Label": "DDoS" if kind == "flood" else "BENIGN",
+            "Flow Duration": float(ts[-1] - ts[0]),
+            "Total Fwd Packets": int(fwd.sum()), "Total Backward Packets": int((~fwd).sum()),
+            "Total Length of Fwd Packets": int(sizes[fwd].sum()), "Total Length of Bwd Packets": int(sizes[~fwd].sum()),
+        })
+    packets = {name: np.asarray(values) for name, values in columns.items()}
+    order = np.argsort(packets["ts"], kind="stable")
+    return {name: values[order] for name, values in packets.items()}, pd.DataFrame(truth)
+
+
+def _put(buf: np.ndarray, pos: np.ndarray, values: np.ndarray, dtype: str) -> None:
+    # Write one big/little-endian integer per packet at byte offsets ``pos``
+    width = np.dtype(dtype).itemsize
+    buf[pos[:, None] + np.arange(width)] = np.asarray(values).astype(dtype).view(np.uint8).reshape(-1, width)
+
+
+def write_pcap(path: str | Path, n_flows: int, seed: int = 0, snaplen: int = PCAP_SNAPLEN, **kwargs) -> pd.DataFrame:
+    """Write ``synthetic_packets`` as an Ethernet/IPv4 libpcap file; returns the ground-truth flows.
+
+    Packets are truncated to ``snaplen`` bytes like a header-only capture; the IP
+    total length still carries the full size. Assembled with array writes, so
+    large captures are quick to generate.
+    """
+    if snaplen < 64:
+        raise ValueError("snaplen must be at least 64 bytes (Ethernet + IPv4 + TCP headers).")
+    packets, truth = synthetic_packets(n_flows, seed=seed, **kwargs)
+    tcp = packets["proto"] == 6
+    l4_header = np.where(tcp, 20, 8)
+    ip_length = 20 + l4_header + packets["payload"]
+    caplen = np.minimum(14 + ip_length, snaplen)
+    record = np.concatenate([[0], np.cumsum(16 + caplen)])
+    buf = np.zeros(int(record[-1]), dtype=np.uint8)
+    rec, eth = record[:-1], record[:-1] + 16
+    ip, l4 = eth + 14, eth + 34
+
+    ts = packets["ts"].astype(np.int64)
+    _put(buf, rec, ts // 1_000_000, "<u4")
+    _put(buf, rec + 4, ts % 1_000_000, "<u4")
+    _put(buf, rec + 8, caplen, "<u4")
+    _put(buf, rec + 12, 14 + ip_length, "<u4")
+    _put(buf, eth + 12, np.full(len(ts), 0x0800), ">u2")
+    _put(buf, ip, np.full(len(ts), 0x45), "u1")
+    _put(buf, ip + 2, ip_length, ">u2")
+    _put(buf, ip + 6, np.full(len(ts), 0x4000), ">u2")  # don't fragment
+    _put(buf, ip + 8, np.full(len(ts), 64), "u1")
+    _put(buf, ip + 9, packets["proto"], "u1")
+    _put(buf, ip + 12, packets["src"], ">u4")
+    _put(buf, ip + 16, packets["dst"], ">u4")
+    _put(buf, l4, packets["sport"], ">u2")
+    _put(buf, l4 + 2, packets["dport"], ">u2")
+    t = np.flatnonzero(tcp)
+    _put(buf, l4[t] + 12, np.full(len(t), 0x50), "u1")  # data offset: 5 words
+    _put(buf, l4[t] + 13, packets["flags"][t], "u1")
+    _put(buf, l4[t] + 14, packets["window"][t], ">u2")
+    u = np.flatnonzero(~tcp)
+    _put(buf, l4[u] + 4, 8 + packets["payload"][u], ">u2")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, snaplen, 1))
+        f.write(buf.tobytes())
+    return truth
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Write a synthetic CICIDS-shaped CSV (78 features + Label), or a synthetic pcap.")
+    parser.add_argument("--rows", type=int, default=200_000, help="Flows to generate.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="data/synthetic-cicids.csv")
+    parser.add_argument("--inf-rate", type=float, default=0.001, help="Fraction of inf in each rate column.")
+    parser.add_argument("--nan-rate", type=float, default=0.0005, help="Fraction of NaN in Flow Bytes/s.")
+    parser.add_argument(
+        "--pcap", default=None, help="Write a libpcap capture of --rows flows here instead (ground truth goes to --output)."
+    )
+    parser.add_argument("--span-s", type=float, default=60.0, help="Capture length in seconds (with --pcap).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.pcap:
+        truth = write_pcap(args.pcap, args.rows, seed=args.seed, span_s=args.span_s)
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        truth.to_csv(args.output, index=False)
+        print(f"✔ Wrote {args.rows:,} synthetic flows to {args.pcap} (ground truth in {args.output})")
+    else:
+        path = write_csv(args.output, args.rows, seed=args.seed, inf_rate=args.inf_rate, nan_rate=args.nan_rate)
+        print(f"✔ Wrote {args.rows:,} synthetic flows to {path}")
@@ -1,19 +1,34 @@
 import argparse
 import hashlib
 import json
+import os
+import shutil
+import sys
 from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict
 
 import joblib
-import mlflow
+import numpy as np
 import yaml
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
 
-from features import clean_features, load_dataset, scale_features, split_X_y
+# Project root on the path so `python src/train_supervised.py` resolves the src.* imports
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.artifact import promote_artifact, save_artifact
+from src.cascade import Cascade, build_screen, calibrate_threshold, evaluate_cascade
+from src.dataset_cache import DatasetCache, file_sha256
+from src.features import clean_features, load_dataset, load_dataset_streaming, scale_features, scale_features_fused, split_X_y
+from src.forest_optimizer import optimize_forest, validation_split
+from src.out_of_core import build_split_matrices, combined_sha256, preprocess_in_place, resolve_paths
+from src.preprocess import DEFAULT_CLIP, Preprocessing
+from src.profiling import StageProfiler
 
 
 def parse_args() -> argparse.Namespace:
@@ -30,6 +45,16 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Optional MLflow run name override.",
     )
+    parser.add_argument(
+        "--profile-stage",
+        default=None,
+        help="Run one stage (e.g. fit, scale_features, load_dataset/read_csv) under cProfile.",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="Where --profile-stage writes its .prof file.",
+    )
     return parser.parse_args()
 
 
@@ -44,6 +69,15 @@ def build_model(model_cfg: Dict[str, Any], random_state: int) -> RandomForestCla
     return RandomForestClassifier(**params)
 
 
+def headline_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "accuracy": report.get("accuracy"),
+        "macro_precision": report["macro avg"]["precision"],
+        "macro_recall": report["macro avg"]["recall"],
+        "macro_f1": report["macro avg"]["f1-score"],
+    }
+
+
 def ensure_registry_entry(registry_path: Path, entry: Dict[str, Any]) -> None:
     registry_path.parent.mkdir(parents=True, exist_ok=True)
     if registry_path.exists():
@@ -60,40 +94,267 @@ def ensure_registry_entry(registry_path: Path, entry: Dict[str, Any]) -> None:
         json.dump(registry, f, indent=2)
 
 
-def train_from_config(config: Dict[str, Any], run_name_override: str | None = None) -> Dict[str, Any]:
-    dataset_path = config["dataset"]["path"]
-    df = load_dataset(dataset_path)
-    df = clean_features(df)
+def promote_bundle(source: Path | str, target: Path | str) -> None:
+    # Copy then rename, so a serving process watching the target never loads a half-written file
+    target = Path(target)
+    tmp = target.with_name(f".{target.name}.tmp")
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
 
-    X, y, numeric_columns = split_X_y(df)
-    X_scaled, scaler = scale_features(X)
+def optimization_record(optimization: Dict[str, Any], optimize_cfg: Dict[str, Any]) -> Dict[str, Any]:
+    # JSON summary of the trade-off for the registry (the candidates themselves go to MLflow)
+    budgets = {key: optimize_cfg.get(key) for key in ("latency_budget_ms", "size_budget_mb", "max_macro_f1_drop")}
+    return {
+        "chosen": optimization["chosen"],
+        "full": optimization["full"],
+        "full_test_metrics": optimization["full_test_metrics"],
+        "engine": optimization["engine"],
+        "budgets": budgets,
+        "validation_rows": optimization["validation_rows"],
+        "evaluation_rows": optimization["evaluation_rows"],
+        "pareto_front": [candidate["name"] for candidate in optimization["pareto_front"]],
+    }
 
+
+def log_optimization(optimization: Dict[str, Any], optimize_cfg: Dict[str, Any]) -> None:
+    import mlflow
+
+    chosen, full = optimization["chosen"], optimization["full"]
+    mlflow.log_params({f"optimize__{key}": value for key, value in optimize_cfg.items() if not isinstance(value, (list, dict))})
+    mlflow.log_param("optimize__chosen", chosen["name"])
+    # The front as a metric series ordered by latency, so MLflow can chart macro F1 against it
+    for step, candidate in enumerate(optimization["pareto_front"]):
+        mlflow.log_metrics(
+            {"pareto_latency_p50_ms": candidate["latency_p50_ms"], "pareto_val_macro_f1": candidate["val_macro_f1"], "pareto_size_mb": candidate["size_mb"]},
+            step=step,
+        )
+    mlflow.log_metrics({
+        "optimized_latency_p50_ms": chosen["latency_p50_ms"],
+        "optimized_val_macro_f1": chosen["val_macro_f1"],
+        "optimized_size_mb": chosen["size_mb"],
+        "full_latency_p50_ms": full["latency_p50_ms"],
+        "full_val_macro_f1": full["val_macro_f1"],
+        "full_size_mb": full["size_mb"],
+        "full_test_macro_f1": optimization["full_test_metrics"]["macro_f1"],
+    })
+    mlflow.log_dict(
+        {"candidates": optimization["candidates"], "pareto_front": optimization["pareto_front"], "chosen": chosen["name"]},
+        "artifacts/pareto_front.json",
+    )
+
+
+def log_cascade(calibration: Dict[str, Any], evaluation: Dict[str, Any], cascade_cfg: Dict[str, Any]) -> None:
+    import mlflow
+
+    screen_cfg = cascade_cfg.get("screen", {})
+    mlflow.log_params({
+        "cascade__screen": screen_cfg.get("type", "forest"),
+        **{f"cascade__screen__{key}": value for key, value in screen_cfg.get("params", {}).items()},
+        "cascade__max_recall_loss": calibration["max_recall_loss"],
+        "cascade__threshold": calibration["threshold"],
+    })
+    mlflow.log_metrics({
+        "cascade_escalation_rate": evaluation["escalation_rate"],
+        "cascade_max_recall_loss": evaluation["max_recall_loss"],
+        "cascade_accuracy": evaluation["accuracy"],
+        "cascade_flows_per_s": evaluation["cascade_flows_per_s"],
+        "forest_flows_per_s": evaluation["forest_flows_per_s"],
+        "cascade_speedup": evaluation["speedup"],
+    })
+    mlflow.log_dict({"calibration": calibration, "test": evaluation}, "artifacts/cascade.json")
+
+
+def load_training_data(config: Dict[str, Any], profiler: StageProfiler | None = None) -> Dict[str, Any]:
+    profiler = profiler or StageProfiler()
+    dataset_cfg = config["dataset"]
     split_cfg = config.get("split", {})
+    preprocessing_cfg = config.get("preprocessing", {})
+    clip = float(preprocessing_cfg.get("clip", DEFAULT_CLIP))
     test_size = split_cfg.get("test_size", 0.2)
-    stratify = y if split_cfg.get("stratify", True) else None
     random_state = config.get("random_state", 42)
+    cache = None
+    if dataset_cfg.get("cache_dir"):
+        # Cleaned columns are memory-mapped from the cache; the CSV is parsed only on a miss
+        cache = DatasetCache(
+            dataset_cfg["cache_dir"],
+            max_bytes=int(dataset_cfg.get("cache_max_bytes", 20 * 2**30)),
+            chunksize=dataset_cfg.get("chunksize") or 25_000,
+        )
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled,
-        y,
-        test_size=test_size,
-        random_state=random_state,
-        stratify=stratify,
-    )
+    if dataset_cfg.get("mode") == "out_of_core":
+        # Multi-file training: sampled rows go straight into float32 memmaps on disk
+        paths = resolve_paths(dataset_cfg)
+        sampling_cfg = dataset_cfg.get("sampling", {})
+        with profiler.stage("build_split_matrices") as stage:
+            data = build_split_matrices(
+                paths,
+                workdir=dataset_cfg.get("workdir", "data/.ooc"),
+                test_size=test_size,
+                fraction=sampling_cfg.get("fraction", 1.0),
+                class_caps=sampling_cfg.get("class_caps"),
+                chunksize=dataset_cfg.get("chunksize") or 25_000,
+                random_state=random_state,
+                cache=cache,
+            )
+            stage["rows"] = len(data["X_train"]) + len(data["X_test"])
+            stage["columns"] = data["X_train"].shape[1]
+        with profiler.stage("preprocess_in_place") as stage:
+            scaler, medians = preprocess_in_place(data["X_train"], data["X_test"], clip=clip)
+            stage["rows"] = len(data["X_train"]) + len(data["X_test"])
+            stage["columns"] = data["X_train"].shape[1]
+        with profiler.stage("dataset_sha256"):
+            dataset_sha256, per_file_sha256 = combined_sha256(paths)
+        return {
+            "X_train": data["X_train"],
+            "X_test": data["X_test"],
+            "y_train": data["y_train"],
+            "y_test": data["y_test"],
+            "scaler": scaler,
+            "preprocessing": Preprocessing(medians, -clip, clip, input_dtype="float32"),  # the memmaps are float32
+            "features": data["features"],
+            "dataset_path": paths[0] if len(paths) == 1 else paths,
+            "dataset_sha256": dataset_sha256,
+            "test_size": test_size,
+            "random_state": random_state,
+            "dataset_files": per_file_sha256,
+            "sampling": {"file_counts": data["file_counts"], "quotas": data["quotas"]},
+        }
+
+    dataset_path = dataset_cfg["path"]
+    if cache is not None:
+        with profiler.stage("load_dataset") as stage:
+            df = load_dataset(dataset_path, cache=cache)
+            stage["rows"], stage["columns"] = df.shape
+        dataset_sha256 = df.attrs["dataset_sha256"]  # memoized by the cache
+    else:
+        if dataset_cfg.get("chunksize"):
+            # Streaming loader cleans each chunk and keeps float32/int32 columns
+            with profiler.stage("load_dataset") as stage:
+                df = load_dataset_streaming(dataset_path, chunksize=dataset_cfg["chunksize"], profiler=profiler)
+                stage["rows"], stage["columns"] = df.shape
+        else:
+            with profiler.stage("load_dataset") as stage:
+                df = load_dataset(dataset_path)
+                stage["rows"], stage["columns"] = df.shape
+            with profiler.stage("clean_features") as stage:
+                df = clean_features(df)
+                stage["rows"], stage["columns"] = df.shape
+        with profiler.stage("dataset_sha256"):
+            dataset_sha256 = file_sha256(dataset_path)
+
+    with profiler.stage("split_X_y") as stage:
+        X, y, numeric_columns = split_X_y(df)
+        stage["rows"], stage["columns"] = X.shape
+    with profiler.stage("scale_features") as stage:
+        if preprocessing_cfg.get("fused", True):
+            # One float32 buffer, transformed column by column in place
+            X_scaled, scaler, preprocessing = scale_features_fused(X, clip=clip)
+        else:
+            X_scaled, scaler = scale_features(X)
+            medians = X.replace([np.inf, -np.inf], np.nan).median().fillna(0.0)
+            preprocessing = Preprocessing(medians.to_numpy(), -1e6, 1e6)  # scale_features' fixed bounds
+        stage["rows"], stage["columns"] = X_scaled.shape
+
+    stratify = y if split_cfg.get("stratify", True) else None
+
+    with profiler.stage("train_test_split") as stage:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_scaled,
+            y,
+            test_size=test_size,
+            random_state=random_state,
+            stratify=stratify,
+        )
+        stage["rows"], stage["columns"] = X_scaled.shape
+    return {
+        "X_train": X_train,
+        "X_test": X_test,
+        "y_train": y_train,
+        "y_test": y_test,
+        "scaler": scaler,
+        "preprocessing": preprocessing,
+        "features": numeric_columns,
+        "dataset_path": dataset_path,
+        "dataset_sha256": dataset_sha256,
+        "test_size": test_size,
+        "random_state": random_state,
+    }
+
+
+def train_on_data(
+    config: Dict[str, Any],
+    data: Dict[str, Any],
+    run_name_override: str | None = None,
+    model_id: str | None = None,
+    promote: bool = True,
+    register: bool = True,
+    tags: Dict[str, str] | None = None,
+    profiler: StageProfiler | None = None,
+) -> Dict[str, Any]:
+    # Fit, evaluate, log and save one model on already-loaded data (see sweep.py for the parallel caller)
+    profiler = profiler or StageProfiler()
+    X_train, X_test, y_train, y_test = data["X_train"], data["X_test"], data["y_train"], data["y_test"]
+    scaler, numeric_columns = data["scaler"], data["features"]
+    dataset_path, dataset_sha256 = data["dataset_path"], data["dataset_sha256"]
+    test_size, random_state = data["test_size"], data["random_state"]
 
     model_cfg = config.get("model", {})
+    optimize_cfg = config.get("optimize", {})
+    optimizing = optimize_cfg.get("enabled", False)
+    cascade_cfg = config.get("cascade", {})
+    cascading = cascade_cfg.get("enabled", False)
     model = build_model(model_cfg, random_state=random_state)
-    model.fit(X_train, y_train)
+    X_fit, y_fit = X_train, y_train
+    if optimizing or cascading:
+        # Tree selection and threshold calibration need rows the models were not fit on;
+        # they come out of the training split (optimize's validation_size wins when both are on)
+        validation_size = (optimize_cfg if optimizing else cascade_cfg).get("validation_size", 0.1)
+        with profiler.stage("validation_split") as stage:
+            X_fit, X_val, y_fit, y_val = validation_split(X_train, y_train, validation_size, random_state)
+            stage["rows"], stage["columns"] = X_val.shape
+    with profiler.stage("fit") as stage:
+        model.fit(X_fit, y_fit)
+        stage["rows"], stage["columns"] = X_fit.shape
 
-    y_pred = model.predict(X_test)
-    report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
-    cm = confusion_matrix(y_test, y_pred).tolist()
-    metrics = {
-        "accuracy": report.get("accuracy"),
-        "macro_precision": report["macro avg"]["precision"],
-        "macro_recall": report["macro avg"]["recall"],
-        "macro_f1": report["macro avg"]["f1-score"],
-    }
+    optimization = None
+    if optimizing:
+        # Smaller sub-forests / depth caps / students on the latency-accuracy Pareto front
+        with profiler.stage("optimize") as stage:
+            optimization = optimize_forest(model, X_fit, y_fit, X_val, y_val, optimize_cfg, random_state)
+            stage["rows"] = optimization["validation_rows"]
+        if optimization["chosen"]["name"] != "full":
+            with profiler.stage("predict_full") as stage:
+                full_report = classification_report(y_test, model.predict(X_test), output_dict=True, zero_division=0)
+                stage["rows"], stage["columns"] = X_test.shape
+            optimization["full_test_metrics"] = headline_metrics(full_report)
+        model = optimization["model"]
+
+    cascade = None
+    if cascading:
+        # Cheap first stage trained on the same rows; its exit threshold is set on the validation split
+        with profiler.stage("cascade_fit") as stage:
+            screen = build_screen(cascade_cfg.get("screen", {}), random_state).fit(X_fit, y_fit)
+            stage["rows"], stage["columns"] = X_fit.shape
+        exit_classes = cascade_cfg.get("exit_classes", ["BENIGN"])
+        with profiler.stage("cascade_calibrate") as stage:
+            calibration = calibrate_threshold(screen, model, X_val, y_val, exit_classes, float(cascade_cfg.get("max_recall_loss", 0.002)))
+            stage["rows"] = calibration["validation_rows"]
+        cascade = Cascade(screen, calibration["threshold"], exit_classes)
+        with profiler.stage("cascade_evaluate") as stage:
+            cascade_eval = evaluate_cascade(cascade, model, X_test, y_test)
+            stage["rows"], stage["columns"] = X_test.shape
+
+    with profiler.stage("predict") as stage:
+        y_pred = model.predict(X_test)
+        stage["rows"], stage["columns"] = X_test.shape
+    with profiler.stage("classification_report") as stage:
+        report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+        cm = confusion_matrix(y_test, y_pred).tolist()
+        stage["rows"] = len(y_test)
+    metrics = headline_metrics(report)
+    if optimization is not None and "full_test_metrics" not in optimization:
+        optimization["full_test_metrics"] = metrics  # the full forest was kept
 
     # --- MLflow Tracking ---
     mlflow_cfg = config.get("mlflow", {})
@@ -106,16 +367,29 @@ def train_from_config(config: Dict[str, Any], run_name_override: str | None = No
     output_dir.mkdir(parents=True, exist_ok=True)
 
     timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    model_id = f"rf-{timestamp}"
+    model_id = model_id or f"rf-{timestamp}"
     versioned_path = output_dir / f"{model_id}.joblib"
     bundle = {
+        "model_id": model_id,  # reported by serve.py with every prediction
         "model": model,
         "scaler": scaler,
         "features": numeric_columns,
         "trained_at": timestamp,
+        # inf/NaN -> training median, then clip; serve.py applies it before the scaler
+        "preprocessing": data["preprocessing"].to_bundle(),
     }
+    if cascade is not None:
+        # serve.py screens with it unless IDS_CASCADE=0
+        bundle["cascade"] = {
+            "model": cascade.screen,
+            "threshold": cascade.threshold,
+            "exit_classes": cascade.exit_classes,
+            "calibration": calibration,
+        }
 
     if mlflow_enabled:
+        import mlflow  # only when tracking is on: importing it takes about a second
+
         mlflow.set_tracking_uri(mlflow_cfg.get("tracking_uri", "mlruns"))
         mlflow.set_experiment(mlflow_cfg.get("experiment_name", "default"))
         mlflow_context = mlflow.start_run(run_name=run_name)
@@ -124,22 +398,45 @@ def train_from_config(config: Dict[str, Any], run_name_override: str | None = No
 
     with mlflow_context:
         if mlflow_enabled:
+            if tags:
+                mlflow.set_tags(tags)
             mlflow.log_params(
                 {
-                    "dataset": dataset_path,
+                    "dataset": dataset_path if isinstance(dataset_path, str) else ",".join(dataset_path),
+                    "dataset_sha256": dataset_sha256,
                     "test_size": test_size,
                     "random_state": random_state,
                     **{f"model__{k}": v for k, v in model_cfg.get("params", {}).items()},
                 }
             )
-            mlflow.log_metrics(metrics)
+            if "sampling" in data:
+                mlflow.log_dict(data["sampling"], "artifacts/sampling.json")
             mlflow.log_dict(report, "artifacts/classification_report.json")
             mlflow.log_dict({"confusion_matrix": cm}, "artifacts/confusion_matrix.json")
+            if optimization is not None:
+                log_optimization(optimization, optimize_cfg)
+            if cascade is not None:
+                log_cascade(calibration, cascade_eval, cascade_cfg)
 
-        joblib.dump(bundle, versioned_path)
-        joblib.dump(bundle, output_dir / "rf.pk1")  # maintain compatibility with the API
+        with profiler.stage("joblib_dump"):
+            joblib.dump(bundle, versioned_path)
+            if promote:
+                promote_bundle(versioned_path, output_dir / "rf.pk1")  # maintain compatibility with the API
+
+        artifact_path = None
+        if output_cfg.get("artifact", False):
+            # Memory-mappable copy for fast cold starts (IDS_MODEL_PATH=src/models/rf.ids.json)
+            with profiler.stage("artifact_save"):
+                artifact_path = save_artifact(bundle, output_dir / f"{model_id}.ids.json")
+                if promote:
+                    promote_artifact(artifact_path, output_dir / "rf.ids.json")
 
         if mlflow_enabled:
+            # Stage timings are logged last so they include saving the bundle
+            mlflow.log_metrics({**metrics, **profiler.as_metrics()})
+            mlflow.log_dict({"stages": profiler.as_dict()}, "artifacts/stages.json")
+            for profile_path in profiler.profile_paths:
+                mlflow.log_artifact(profile_path, "profiles")
             mlflow.log_artifact(versioned_path)
 
     # --- Model Registry Entry ---
@@ -150,28 +447,64 @@ def train_from_config(config: Dict[str, Any], run_name_override: str | None = No
         "model_path": str(versioned_path),
         "created_at_utc": timestamp,
         "dataset_path": dataset_path,
+        "dataset_sha256": dataset_sha256,
         "metrics": metrics,
         "config_hash": config_hash,
         "features": numeric_columns,
     }
-    ensure_registry_entry(registry_path, metadata)
+    if artifact_path is not None:
+        metadata["artifact_path"] = str(artifact_path)
+    if optimization is not None:
+        # The served model is the chosen candidate; metrics above are its test metrics
+        metadata["optimization"] = optimization_record(optimization, optimize_cfg)
+    if cascade is not None:
+        # metrics above are the forest's alone; these are the cascade's on the same test split
+        metadata["cascade"] = {"calibration": calibration, "test": cascade_eval, "screen": cascade_cfg.get("screen", {})}
+    if "dataset_files" in data:
+        # Out-of-core runs: per-file hashes plus the rows sampled from each (file, class)
+        metadata["dataset_files"] = data["dataset_files"]
+        metadata["sampling"] = data["sampling"]
+    metadata["stages"] = profiler.as_dict()
+    if tags:
+        metadata["tags"] = tags
+    if register:
+        ensure_registry_entry(registry_path, metadata)
 
     return {
         "model_id": model_id,
         "metrics": metrics,
         "model_path": str(versioned_path),
+        "artifact_path": str(artifact_path) if artifact_path is not None else None,
         "registry_path": str(registry_path),
+        "registry_entry": metadata,
         "classification_report": report,
+        "optimization": optimization_record(optimization, optimize_cfg) if optimization is not None else None,
+        "cascade": metadata.get("cascade"),
+        "profiler": profiler,
     }
 
 
-def run_training(config_path: str, run_name: str | None = None) -> Dict[str, Any]:
+def train_from_config(
+    config: Dict[str, Any], run_name_override: str | None = None, profiler: StageProfiler | None = None
+) -> Dict[str, Any]:
+    profiler = profiler or StageProfiler()
+    data = load_training_data(config, profiler=profiler)
+    return train_on_data(config, data, run_name_override=run_name_override, profiler=profiler)
+
+
+def run_training(
+    config_path: str, run_name: str | None = None, profile_stage: str | None = None, profile_dir: str = "profiles"
+) -> Dict[str, Any]:
     config = load_config(config_path)
-    return train_from_config(config, run_name_override=run_name)
+    profiler = StageProfiler(profile_stage=profile_stage, profile_dir=profile_dir)
+    return train_from_config(config, run_name_override=run_name, profiler=profiler)
 
 
 if __name__ == "__main__":
     args = parse_args()
-    results = run_training(args.config, run_name=args.run_name)
+    results = run_training(args.config, run_name=args.run_name, profile_stage=args.profile_stage, profile_dir=args.profile_dir)
     print(f"✔ Trained model {results['model_id']} saved to {results['model_path']}")
-    print(f"Metrics: {json.dumps(results['metrics'], indent=2)}")
\ No newline at end of file
+    print(f"Metrics: {json.dumps(results['metrics'], indent=2)}")
+    print(results["profiler"].format_table())
+    for profile_path in results["profiler"].profile_paths:
+        print(f"cProfile output: {profile_path}")
\ No newline at end of file
@@ -0,0 +1,169 @@
+import json
+import struct
+from typing import TYPE_CHECKING, Any, Dict, Sequence, Tuple
+
+import numpy as np
+
+# pyarrow is imported by the Arrow functions only: JSON and raw float32 traffic never loads it
+if TYPE_CHECKING:
+    from src.ingest import FeatureSchema
+
+# Content types accepted (and echoed back) by POST /predict/bulk
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+RAW_FLOAT32 = "application/x-ids-float32"
+
+# Raw frames start with a little-endian uint32 length followed by that many bytes of JSON
+_HEADER_LENGTH = struct.Struct("<I")
+
+# A single FixedSizeList<float> column with this name is taken as the whole feature matrix
+PACKED_COLUMN = "features"
+
+
+def _read_header(body: bytes | memoryview) -> Tuple[Dict[str, Any], int]:
+    if len(body) < _HEADER_LENGTH.size:
+        raise ValueError("Raw body is too short to hold a header.")
+    (length,) = _HEADER_LENGTH.unpack_from(body, 0)
+    end = _HEADER_LENGTH.size + length
+    if len(body) < end:
+        raise ValueError("Raw body ends inside its header.")
+    return json.loads(bytes(body[_HEADER_LENGTH.size:end])), end
+
+
+def _write_header(header: Dict[str, Any]) -> bytes:
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return _HEADER_LENGTH.pack(len(encoded)) + encoded
+
+
+def _place_columns(
+    schema: "FeatureSchema", names: Sequence[str], matrix: np.ndarray
+) -> Tuple[np.ndarray, Dict[str, int]]:
+    # A matrix already in bundle order is used as-is; otherwise copy columns into place
+    if tuple(names) == schema.names:
+        return matrix, {}
+    positions = {name: j for j, name in enumerate(names)}
+    X = schema.empty(matrix.shape[0])
+    defaulted: Dict[str, int] = {}
+    for j, name in enumerate(schema.names):
+        source = positions.get(name)
+        if source is None:
+            X[:, j] = schema.default
+            if len(X):
+                defaulted[name] = len(X)
+        else:
+            X[:, j] = matrix[:, source]
+    return X, defaulted
+
+
+def encode_raw_float32(names: Sequence[str], matrix: np.ndarray) -> bytes:
+    """Client-side helper: header with the column order, then the float32 matrix."""
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    if matrix.ndim != 2 or matrix.shape[1] != len(names):
+        raise ValueError("Matrix must have one column per feature name.")
+    return _write_header({"features": list(names), "rows": int(matrix.shape[0])}) + matrix.tobytes()
+
+
+def decode_raw_float32(body: bytes, schema: "FeatureSchema") -> Tuple[np.ndarray, Dict[str, int]]:
+    header, offset = _read_header(body)
+    names = header.get("features")
+    if not isinstance(names, list) or not names:
+        raise ValueError("Raw header must list the matrix column order under 'features'.")
+    payload = memoryview(body)[offset:]
+    row_bytes = 4 * len(names)
+    if len(payload) % row_bytes:
+        raise ValueError(f"Raw payload must be a multiple of {row_bytes} bytes ({len(names)} float32 per flow).")
+    # View of the request body: no copy when the columns are already in bundle order
+    matrix = np.frombuffer(payload, dtype="<f4").reshape(-1, len(names))
+    return _place_columns(schema, names, matrix)
+
+
+def encode_raw_results(
+    labels: np.ndarray, confidences: np.ndarray, classes: Sequence[Any], defaulted: Dict[str, int], model_id: str | None = None
+) -> bytes:
+    # int32 class indices followed by float32 confidences, one of each per flow
+    class_list = [str(c) for c in classes]
+    lookup = {name: i for i, name in enumerate(class_list)}
+    indices = np.fromiter((lookup[str(label)] for label in labels), dtype="<i4", count=len(labels))
+    header = _write_header({"classes": class_list, "count": int(len(labels)), "defaulted_features": defaulted, "model_id": model_id})
+    return header + indices.tobytes() + np.asarray(confidences, dtype="<f4").tobytes()
+
+
+def decode_raw_results(body: bytes) -> Dict[str, Any]:
+    header, offset = _read_header(body)
+    count = header["count"]
+    indices = np.frombuffer(body, dtype="<i4", count=count, offset=offset)
+    confidences = np.frombuffer(body, dtype="<f4", count=count, offset=offset + 4 * count)
+    classes = np.asarray(header["classes"])
+    return {
+        "predictions": classes[indices] if count else classes[:0],
+        "confidences": confidences,
+        "defaulted_features": header.get("defaulted_features", {}),
+        "model_id": header.get("model_id"),
+    }
+
+
+def decode_arrow(body: bytes, schema: "FeatureSchema") -> Tuple[np.ndarray, Dict[str, int]]:
+    """Read an Arrow IPC stream of flows into a model matrix in bundle order.
+
+    Either one column per feature (any numeric type), or a single ``features``
+    FixedSizeList column holding each flow's values in bundle order. The second
+    layout is viewed in place without copying.
+    """
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+
+    if table.num_columns == 1 and table.column_names[0] == PACKED_COLUMN:
+        column = table.column(0).combine_chunks()  # no copy for a single-batch stream
+        if not pa.types.is_fixed_size_list(column.type) or column.type.list_size != schema.n_features:
+            raise ValueError(f"'{PACKED_COLUMN}' must be a fixed-size list of {schema.n_features} floats.")
+        if column.null_count or column.flatten().null_count:
+            raise ValueError(f"'{PACKED_COLUMN}' must not contain nulls.")
+        return column.flatten().to_numpy(zero_copy_only=False).reshape(-1, schema.n_features), {}
+
+    X = schema.empty(table.num_rows)
+    defaulted: Dict[str, int] = {}
+    present = set(table.column_names)
+    for j, name in enumerate(schema.names):
+        if name not in present:
+            X[:, j] = schema.default
+            if table.num_rows:
+                defaulted[name] = table.num_rows
+            continue
+        column = table.column(name)
+        if column.null_count:
+            defaulted[name] = column.null_count
+            column = column.fill_null(schema.default)
+        start = 0
+        for chunk in column.chunks:
+            X[start:start + len(chunk), j] = chunk.to_numpy(zero_copy_only=False)
+            start += len(chunk)
+    return X, defaulted
+
+
+def encode_arrow(labels: np.ndarray, confidences: np.ndarray, defaulted: Dict[str, int], model_id: str | None = None) -> bytes:
+    import pyarrow as pa
+
+    batch = pa.record_batch(
+        [
+            pa.array([str(label) for label in labels], type=pa.string()).dictionary_encode(),
+            pa.array(np.asarray(confidences, dtype=np.float64)),
+        ],
+        names=["prediction", "confidence"],
+    ).replace_schema_metadata({"defaulted_features": json.dumps(defaulted), "model_id": model_id or ""})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_arrow_flows(matrix: np.ndarray, names: Sequence[str]) -> bytes:
+    """Client-side helper: one float64 column per feature."""
+    import pyarrow as pa
+
+    matrix = np.asarray(matrix)
+    batch = pa.record_batch([pa.array(matrix[:, j]) for j in range(matrix.shape[1])], names=list(names))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
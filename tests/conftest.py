@@ -0,0 +1,14 @@
+from pathlib import Path
+
+import pytest
+
+from src.synthetic import write_csv
+
+# Enough rows that every CICIDS class is present and the loaders' chunking is exercised
+SYNTHETIC_ROWS = 6_000
+
+
+@pytest.fixture(scope="session")
+def synthetic_csv(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # CICIDS-shaped flows: raw header with leading spaces, inf/NaN in the rate columns
+    return write_csv(tmp_path_factory.mktemp("data") / "synthetic.csv", SYNTHETIC_ROWS, seed=1)
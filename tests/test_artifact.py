@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from src.artifact import ArtifactError, load_artifact, promote_artifact, save_artifact
+
+
+@pytest.fixture()
+def promoted(tmp_path):
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(300, 4)), rng.integers(0, 3, 300)
+    bundle = {"model": RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y), "scaler": StandardScaler().fit(X), "features": list("abcd")}
+    save_artifact(bundle, tmp_path / "candidate.ids.json")
+    promote_artifact(tmp_path / "candidate.ids.json", tmp_path / "serving" / "rf.ids.json")
+    return tmp_path
+
+
+def flip_last_byte(path) -> bytearray:
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 1
+    path.write_bytes(data)
+    return data
+
+
+def test_load_checks_sizes_and_rehashes_only_when_asked(promoted):
+    nodes = promoted / "candidate.ids" / "tree_nodes.npy"
+    data = flip_last_byte(nodes)
+
+    load_artifact(promoted / "serving" / "rf.ids.json")  # same size: the hot path does not read the arrays
+    with pytest.raises(ArtifactError, match="SHA-256"):
+        load_artifact(promoted / "serving" / "rf.ids.json", verify=True)
+
+    nodes.write_bytes(data[:-8])
+    with pytest.raises(ArtifactError, match="size"):
+        load_artifact(promoted / "serving" / "rf.ids.json")
+
+
+def test_promote_rehashes_the_source(promoted):
+    flip_last_byte(promoted / "candidate.ids" / "tree_nodes.npy")
+
+    with pytest.raises(ArtifactError, match="SHA-256"):
+        promote_artifact(promoted / "candidate.ids.json", promoted / "serving" / "rf.ids.json")
@@ -0,0 +1,103 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.batching import MicroBatcher
+
+
+def echo_scores(X: np.ndarray, *context):
+    # Label = the row's first value, so every flow can check it got its own answer back
+    return X[:, 0].astype(int), np.full(len(X), 0.5), *context
+
+
+async def submit_all(batcher: MicroBatcher, rows, contexts=None):
+    contexts = contexts or [None] * len(rows)
+    return await asyncio.gather(*(batcher.submit(row, context) for row, context in zip(rows, contexts)), return_exceptions=True)
+
+
+def run(batcher: MicroBatcher, scenario):
+    async def main():
+        await batcher.start()
+        try:
+            return await scenario()
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_flows_share_one_call():
+    calls = []
+
+    def score(X):
+        calls.append(len(X))
+        return echo_scores(X)
+
+    batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=50)
+    rows = [np.array([[float(i), 0.0]]) for i in range(20)]
+    results = run(batcher, lambda: submit_all(batcher, rows))
+
+    assert [label for label, _ in results] == list(range(20))
+    assert calls == [8, 8, 4]
+    assert batcher.stats()["total_flows"] == 20
+
+
+def test_flows_are_scored_with_their_own_context():
+    batcher = MicroBatcher(echo_scores, max_batch_size=8, max_wait_ms=50)
+    rows = [np.array([[float(i)]]) for i in range(6)]
+    contexts = ["v1", "v2"] * 3
+    results = run(batcher, lambda: submit_all(batcher, rows, contexts))
+
+    assert [(label, context) for label, _, context in results] == [(i, contexts[i]) for i in range(6)]
+    assert batcher.stats()["total_batches"] == 1  # one batch, one model call per context
+
+
+def test_failing_group_fails_only_its_requests():
+    def score(X, context):
+        if context == "broken":
+            raise ValueError("model error")
+        return echo_scores(X, context)
+
+    batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        first = await submit_all(batcher, [np.array([[1.0]]), np.array([[2.0]])], ["broken", "ok"])
+        # Rows of another width cannot be stacked: the group fails outside score_fn, the worker keeps going
+        second = await submit_all(batcher, [np.array([[3.0]]), np.array([[4.0, 4.0]])], ["ok", "ok"])
+        third = await submit_all(batcher, [np.array([[5.0]])], ["ok"])
+        return first, second, third
+
+    first, second, third = run(batcher, scenario)
+    assert isinstance(first[0], ValueError) and first[1] == (2, 0.5, "ok")
+    assert all(isinstance(result, ValueError) for result in second)
+    assert third == [(5, 0.5, "ok")]
+    assert batcher.worker_restarts == 0
+
+
+def test_dead_worker_fails_its_batch_and_restarts(monkeypatch):
+    batcher = MicroBatcher(echo_scores, max_batch_size=4, max_wait_ms=50)
+    observe = batcher.queue_depths.observe
+    failures = iter([True])
+
+    def observe_once_broken(value):
+        if next(failures, False):
+            raise RuntimeError("bookkeeping bug")
+        observe(value)
+
+    monkeypatch.setattr(batcher.queue_depths, "observe", observe_once_broken)
+
+    async def scenario():
+        first = await asyncio.wait_for(submit_all(batcher, [np.array([[1.0]])]), timeout=5)
+        second = await asyncio.wait_for(submit_all(batcher, [np.array([[2.0]])]), timeout=5)
+        return first, second
+
+    first, second = run(batcher, scenario)
+    assert isinstance(first[0], RuntimeError)  # failed, not left hanging
+    assert second == [(2, 0.5)]
+    assert batcher.worker_restarts == 1
+
+
+def test_submit_before_start_is_refused():
+    with pytest.raises(RuntimeError, match="not running"):
+        asyncio.run(MicroBatcher(echo_scores).submit(np.zeros((1, 1))))
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.cascade import Cascade, attack_recalls, build_screen, calibrate_threshold
+from src.features import clean_features, load_dataset, scale_features_fused, split_X_y
+
+
+class TableModel:
+    # Answers from a fixed probability table, indexed by each row's first value
+    def __init__(self, classes, proba) -> None:
+        self.classes_ = np.array(classes)
+        self.proba = np.asarray(proba, dtype=np.float64)
+
+    def predict_proba(self, X):
+        return self.proba[X[:, 0].astype(int)]
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def benign_screen(benign_confidences) -> TableModel:
+    # A BENIGN confidence under 0.5 means the screen says DDoS
+    p = np.asarray(benign_confidences)
+    return TableModel(["BENIGN", "DDoS"], np.column_stack([p, 1 - p]))
+
+
+# Rows 0-3 are DDoS, 4-9 BENIGN; a perfect forest; the screen exits row 0 (DDoS) as BENIGN at 0.9
+Y_VAL = np.array(["DDoS"] * 4 + ["BENIGN"] * 6)
+X_VAL = np.arange(10, dtype=np.float64)[:, None]
+FOREST = TableModel(["BENIGN", "DDoS"], np.column_stack([Y_VAL == "BENIGN", Y_VAL == "DDoS"]))
+
+
+def test_threshold_stops_before_the_first_lost_attack():
+    screen = benign_screen([0.9, 0.4, 0.4, 0.4, 0.99, 0.95, 0.85, 0.8, 0.7, 0.7])
+
+    calibration = calibrate_threshold(screen, FOREST, X_VAL, Y_VAL, ["BENIGN"], max_recall_loss=0.0)
+    assert calibration["threshold"] == 0.95
+    assert calibration["validation_escalation_rate"] == pytest.approx(0.8)
+    assert calibration["validation_worst_recall_change"] == 0.0
+
+    # Losing one of four DDoS flows is within a 0.25 budget: every BENIGN answer exits
+    calibration = calibrate_threshold(screen, FOREST, X_VAL, Y_VAL, ["BENIGN"], max_recall_loss=0.25)
+    assert calibration["threshold"] == 0.7
+    assert calibration["validation_worst_recall_change"] == -0.25
+
+
+def test_threshold_does_not_split_tied_confidences():
+    # Row 0 ties with row 5: a threshold admitting row 5 admits row 0 as well
+    screen = benign_screen([0.95, 0.4, 0.4, 0.4, 0.99, 0.95, 0.85, 0.8, 0.7, 0.7])
+    assert calibrate_threshold(screen, FOREST, X_VAL, Y_VAL, ["BENIGN"], max_recall_loss=0.0)["threshold"] == 0.99
+
+    screen = benign_screen([0.99, 0.4, 0.4, 0.4, 0.95, 0.95, 0.85, 0.8, 0.7, 0.7])
+    calibration = calibrate_threshold(screen, FOREST, X_VAL, Y_VAL, ["BENIGN"], max_recall_loss=0.0)
+    assert calibration["threshold"] == float("inf")  # the most confident exit already loses an attack
+    assert calibration["validation_escalation_rate"] == 1.0
+
+
+@pytest.fixture(scope="module")
+def split(synthetic_csv):
+    X, y, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    X_scaled, _, _ = scale_features_fused(X)
+    y = y.astype(str).to_numpy()
+    half = len(y) // 2
+    forest = RandomForestClassifier(n_estimators=10, class_weight="balanced", n_jobs=1, random_state=0).fit(X_scaled[:half], y[:half])
+    screen = build_screen({"type": "forest", "params": {"max_depth": 4}}, random_state=0).fit(X_scaled[:half], y[:half])
+    return screen, forest, X_scaled[half:], y[half:]
+
+
+@pytest.mark.parametrize("max_recall_loss", [0.0, 0.05])
+def test_calibrated_cascade_keeps_recall_within_budget(split, max_recall_loss):
+    screen, forest, X_val, y_val = split
+    calibration = calibrate_threshold(screen, forest, X_val, y_val, ["BENIGN"], max_recall_loss)
+
+    def recall_loss(threshold: float) -> float:
+        labels, _, _ = Cascade(screen, threshold, ["BENIGN"]).predict(forest, X_val)
+        forest_recall = attack_recalls(y_val, forest.predict(X_val).astype(str))
+        cascade_recall = attack_recalls(y_val, labels.astype(str))
+        return max(forest_recall[label] - cascade_recall[label] for label in forest_recall)
+
+    assert recall_loss(calibration["threshold"]) <= max_recall_loss + 1e-12
+
+    # And it is the lowest such threshold: the next lower screen confidence breaks the budget
+    labels, confidences, _ = Cascade(screen, np.inf, ["BENIGN"]).screen_flows(X_val)
+    lower = confidences[(labels.astype(str) == "BENIGN") & (confidences < calibration["threshold"])]
+    if len(lower):
+        assert recall_loss(lower.max()) > max_recall_loss
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.detection_store import DetectionStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    # flush_rows=100: the appends below are written as several segments
+    store = DetectionStore(tmp_path / "detections.db", flush_rows=100, flush_interval_s=3600)
+    yield store
+    store.close()
+
+
+@pytest.fixture()
+def flows():
+    # 1,000 flows over 5 minutes, appended in blocks of 37 like the replay's UI intervals
+    rng = np.random.default_rng(0)
+    n = 1_000
+    return pd.DataFrame({
+        "ts": 1_700_000_000.0 + np.sort(rng.uniform(0, 300, n)),
+        "prediction": rng.choice(["BENIGN", "DDoS", "PortScan"], n, p=[0.6, 0.3, 0.1]),
+        "confidence": rng.uniform(0.5, 1.0, n),
+    })
+
+
+def append_in_blocks(store: DetectionStore, flows: pd.DataFrame, size: int = 37) -> None:
+    for start in range(0, len(flows), size):
+        block = flows.iloc[start:start + size]
+        store.append(block["prediction"], block["confidence"], block["ts"])
+
+
+def test_rollups_match_the_log(store, flows):
+    append_in_blocks(store, flows)
+
+    totals = store.totals()
+    expected = flows.groupby("prediction")["confidence"].agg(["count", "sum"])
+    assert {name: t["count"] for name, t in totals.items()} == expected["count"].to_dict()
+    for name, t in totals.items():
+        assert t["confidence_sum"] == pytest.approx(expected.loc[name, "sum"])
+
+    series = store.minute_series(minutes=60)
+    expected = flows.assign(minute=(flows["ts"] // 60).astype(np.int64)).groupby(["minute", "prediction"]).size()
+    np.testing.assert_array_equal(series.set_index(["minute", "prediction"])["count"].sort_index().to_numpy(), expected.sort_index().to_numpy())
+
+    summary = store.summary()
+    assert summary["flows"] == len(flows)
+    assert summary["attacks"] == int((flows["prediction"] != "BENIGN").sum())
+    assert summary["last_offset"] == len(flows)
+
+
+def test_read_since_resumes_from_the_last_id(store, flows):
+    append_in_blocks(store, flows.iloc[:400])
+    first = store.read_since(0)
+    assert first["id"].tolist() == list(range(1, 401))
+    assert first["prediction"].tolist() == flows["prediction"].iloc[:400].tolist()
+
+    append_in_blocks(store, flows.iloc[400:])
+    rest = store.read_since(int(first["id"].iloc[-1]))  # only what was appended since
+    assert rest["id"].tolist() == list(range(401, len(flows) + 1))
+    np.testing.assert_allclose(rest["confidence"].to_numpy(), flows["confidence"].iloc[400:].to_numpy())
+
+    newest = store.read_since(0, limit=10)
+    assert newest["id"].tolist() == list(range(len(flows) - 9, len(flows) + 1))  # newest 10, oldest first
+    assert store.read_since(store.last_offset()).empty
+
+
+def test_segments_cover_the_log_once(store, flows):
+    append_in_blocks(store, flows)
+    offset = 250
+
+    parts = list(store.iter_segments(offset))
+    assert len(parts) > 1
+    assert pd.concat(parts)["id"].tolist() == list(range(offset + 1, len(flows) + 1))
+
+
+def test_reopened_store_keeps_offsets_and_totals(tmp_path, flows):
+    path = tmp_path / "detections.db"
+    with_writer = DetectionStore(path, flush_rows=100)
+    append_in_blocks(with_writer, flows)
+    with_writer.close()
+
+    reopened = DetectionStore(path)
+    try:
+        assert reopened.last_offset() == len(flows)
+        assert reopened.summary()["flows"] == len(flows)
+    finally:
+        reopened.close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from src.dataset_cache import DatasetCache, file_sha256
+from src.features import LABEL_COLUMN, clean_features, load_dataset, load_dataset_streaming, scale_features, scale_features_fused, split_X_y
+
+
+def feature_values(df: pd.DataFrame) -> np.ndarray:
+    # float32 matrix of the feature columns; the streaming loader and the cache store float32
+    X, _, _ = split_X_y(df)
+    return X.to_numpy(dtype=np.float32)
+
+
+def test_streaming_loader_matches_eager(synthetic_csv):
+    eager = clean_features(load_dataset(synthetic_csv))
+    streamed = load_dataset_streaming(synthetic_csv, chunksize=1_000)
+
+    assert list(streamed.columns) == list(eager.columns)
+    np.testing.assert_array_equal(streamed[LABEL_COLUMN].astype(str).to_numpy(), eager[LABEL_COLUMN].to_numpy())
+    # The streaming loader turns infinities into NaN for scale_features to fill
+    expected = feature_values(eager)
+    expected[np.isinf(expected)] = np.nan
+    np.testing.assert_array_equal(feature_values(streamed), expected)
+
+
+def test_dataset_cache_round_trip(synthetic_csv, tmp_path):
+    eager = clean_features(load_dataset(synthetic_csv))
+    cache = DatasetCache(tmp_path / "cache", chunksize=1_000)
+
+    built = load_dataset(synthetic_csv, cache=cache)  # miss: converts the CSV
+    cached = load_dataset(synthetic_csv, cache=cache)  # hit: memory-maps the same entry
+
+    assert len(cache.info()) == 1
+    pd.testing.assert_frame_equal(cached, built)
+    assert list(cached.columns) == list(eager.columns)
+    np.testing.assert_array_equal(cached[LABEL_COLUMN].astype(str).to_numpy(), eager[LABEL_COLUMN].to_numpy())
+    np.testing.assert_array_equal(feature_values(cached), feature_values(eager))  # infinities included
+    assert cached.attrs["dataset_sha256"] == file_sha256(synthetic_csv)
+    # Already clean: cleaning the cached frame again changes nothing
+    pd.testing.assert_frame_equal(clean_features(cached), cached)
+
+
+def test_fused_preprocessing_matches_legacy(synthetic_csv):
+    X, _, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    assert np.isinf(X.to_numpy()).any()  # the rate columns carry inf, so the median fill is exercised
+
+    X_legacy, scaler_legacy = scale_features(X)
+    X_fused, scaler_fused, preprocessing = scale_features_fused(X)
+
+    # Bit-identical to the pandas chain followed by the float32 cast the forest applies anyway
+    assert X_fused.dtype == np.float32
+    np.testing.assert_array_equal(X_fused, X_legacy.astype(np.float32))
+    np.testing.assert_allclose(scaler_fused.mean_, scaler_legacy.mean_, rtol=1e-12)
+    np.testing.assert_allclose(scaler_fused.scale_, scaler_legacy.scale_, rtol=1e-12)
+    medians = X.replace([np.inf, -np.inf], np.nan).median().to_numpy()
+    np.testing.assert_allclose(preprocessing.medians, medians, rtol=1e-6)
+
+
+def test_fused_preprocessing_same_on_streamed_frame(synthetic_csv):
+    # Training feeds the float32 streaming frame to the fused kernel; the result must not depend on the loader
+    X_eager, _, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    X_streamed, _, _ = split_X_y(load_dataset_streaming(synthetic_csv, chunksize=1_000))
+
+    np.testing.assert_array_equal(scale_features_fused(X_streamed)[0], scale_features_fused(X_eager)[0])
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.artifact import load_artifact, save_artifact
+from src.features import clean_features, load_dataset, scale_features_fused, split_X_y
+from src.forest_compiler import CompiledForest, compile_forest
+from src.model_manager import ModelVersion
+
+
+@pytest.fixture(scope="module")
+def bundle(synthetic_csv):
+    X, y, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    X_scaled, scaler, preprocessing = scale_features_fused(X)
+    # n_jobs=1: threaded predict_proba sums the trees in no fixed order
+    model = RandomForestClassifier(n_estimators=15, class_weight="balanced", n_jobs=1, random_state=0).fit(X_scaled, y)
+    return {"model_id": "rf-test", "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}
+
+
+@pytest.fixture(scope="module")
+def rows(bundle):
+    # Scaled rows well inside and well outside the training range, float64 like a request matrix,
+    # plus rows with one feature set to the float32 values on either side of a split threshold,
+    # where rounding the float64 thresholds the wrong way would send them down the other branch
+    rng = np.random.default_rng(0)
+    random_rows = rng.normal(0.0, 3.0, (2_000, len(bundle["features"])))
+    edge_rows = []
+    for estimator in bundle["model"].estimators_:
+        tree = estimator.tree_
+        for node in rng.choice(np.flatnonzero(tree.children_left >= 0), 40):
+            nearest = np.float32(tree.threshold[node])
+            for value in (np.nextafter(nearest, np.float32(-np.inf)), nearest, np.nextafter(nearest, np.float32(np.inf))):
+                row = random_rows[rng.integers(len(random_rows))].copy()
+                row[tree.feature[node]] = value
+                edge_rows.append(row)
+    return np.vstack([random_rows, edge_rows])
+
+
+def test_compiled_forest_bit_identical_to_sklearn(bundle, rows):
+    model = bundle["model"]
+    compiled = compile_forest(model)
+
+    assert compiled.n_trees == len(model.estimators_)
+    np.testing.assert_array_equal(compiled.classes_, model.classes_)
+    np.testing.assert_array_equal(compiled.predict_proba(rows), model.predict_proba(rows))
+    np.testing.assert_array_equal(compiled.predict_proba(rows, chunk_size=97), model.predict_proba(rows))
+    np.testing.assert_array_equal(compiled.predict(rows), model.predict(rows))
+
+
+def test_compiled_forest_save_load_round_trip(bundle, rows, tmp_path):
+    compiled = compile_forest(bundle["model"])
+    compiled.source_model_id = bundle["model_id"]
+    compiled.save(tmp_path / "rf.compiled.npz")
+
+    loaded = CompiledForest.load(tmp_path / "rf.compiled.npz")
+    assert loaded.source_model_id == bundle["model_id"]
+    np.testing.assert_array_equal(loaded.predict_proba(rows), bundle["model"].predict_proba(rows))
+
+
+def test_artifact_node_tables_compile_like_sklearn(bundle, rows, tmp_path):
+    # The compiled engine builds its forest from the artifact's node tables, without scikit-learn
+    save_artifact(bundle, tmp_path / "rf.ids.json")
+    loaded = load_artifact(tmp_path / "rf.ids.json", engine="compiled")
+
+    assert isinstance(loaded["model"], CompiledForest)
+    np.testing.assert_array_equal(loaded["model"].predict_proba(rows), bundle["model"].predict_proba(rows))
+
+
+def test_model_version_refuses_npz_of_another_model(bundle, tmp_path):
+    compiled = compile_forest(bundle["model"])
+    compiled.source_model_id = "rf-older"
+    compiled.save(tmp_path / "rf.compiled.npz")
+
+    with pytest.raises(ValueError, match="rf-older"):
+        ModelVersion(bundle, bundle["model_id"], "rf.pk1", engine="compiled", compiled_path=str(tmp_path / "rf.compiled.npz"))
+    # The same forest under the id the file records is accepted
+    version = ModelVersion(bundle, "rf-older", "rf.pk1", engine="compiled", compiled_path=str(tmp_path / "rf.compiled.npz"))
+    assert version.model.source_model_id == "rf-older"
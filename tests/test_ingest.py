@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from src.ingest import FeatureSchema
+
+NAMES = ["Flow Duration", "Total Fwd Packets", "Destination Port"]
+
+
+@pytest.fixture()
+def schema():
+    return FeatureSchema(NAMES)
+
+
+def test_from_packed_views_rows_in_bundle_order(schema):
+    rows = np.array([[1.5, 2.0, 443.0], [0.0, -1.0, 80.0]])
+    body = rows.astype("<f8").tobytes()
+
+    X = schema.from_packed(body)
+    np.testing.assert_array_equal(X, rows)
+    assert X.base is not None and not X.flags.writeable  # a view of the request body, not a copy
+    assert schema.from_packed(b"").shape == (0, 3)
+
+
+def test_from_packed_rejects_partial_rows(schema):
+    with pytest.raises(ValueError, match="multiple of 24 bytes"):
+        schema.from_packed(np.zeros(4).tobytes())
+
+
+def test_from_columns_reorders_and_defaults_missing_columns(schema):
+    # Any column order; unknown columns are ignored, missing ones default and are counted per flow
+    columns = {"Destination Port": [443, 80], "Flow Duration": [1.5, 0.0], "Unknown": [9, 9]}
+
+    X, defaulted = schema.from_columns(columns)
+    np.testing.assert_array_equal(X, [[1.5, 0.0, 443.0], [0.0, 0.0, 80.0]])
+    assert X.dtype == np.float64
+    assert defaulted == {"Total Fwd Packets": 2}
+
+
+def test_from_columns_edge_cases(schema):
+    with pytest.raises(ValueError, match="same number of values"):
+        schema.from_columns({"Flow Duration": [1.0, 2.0], "Destination Port": [80.0]})
+
+    X, defaulted = schema.from_columns({})
+    assert X.shape == (0, 3) and defaulted == {}
+
+    X, _ = FeatureSchema(NAMES, default=-1.0).from_columns({"Flow Duration": [3.0]})
+    np.testing.assert_array_equal(X, [[3.0, -1.0, -1.0]])
+
+
+def test_dicts_default_null_and_missing_features(schema):
+    flows = [
+        {"Flow Duration": 1.5, "Total Fwd Packets": 2, "Destination Port": 443},  # complete: the fast path
+        {"Flow Duration": None, "Total Fwd Packets": 3, "Destination Port": 80},
+        {"Destination Port": 22, "extra": 1.0},
+    ]
+
+    X, defaulted = schema.from_dicts(flows)
+    np.testing.assert_array_equal(X, [[1.5, 2.0, 443.0], [0.0, 3.0, 80.0], [0.0, 0.0, 22.0]])
+    assert defaulted == {"Flow Duration": 2, "Total Fwd Packets": 1}
+
+
+def test_positional_values_must_match_the_schema(schema):
+    np.testing.assert_array_equal(schema.from_positional([1, 2, 3]), [[1.0, 2.0, 3.0]])
+    with pytest.raises(ValueError, match="Expected 3 positional values, got 2"):
+        schema.from_positional([1, 2])
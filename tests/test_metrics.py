@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.metrics import LATENCY_BUCKETS_S, UNMATCHED_ROUTE, MetricsMiddleware, ServingMetrics
+
+THREADS = 4
+RECORDS = 2_000
+
+
+def samples(text: str) -> dict:
+    # Sample lines of a Prometheus exposition, by name and labels
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if not line.startswith("#")}
+
+
+def test_shards_of_every_thread_are_merged():
+    metrics = ServingMetrics()
+    start = threading.Barrier(THREADS)
+
+    def record(worker: int) -> None:
+        start.wait()  # all threads recording at once, each into its own shard
+        for i in range(RECORDS):
+            metrics.observe_request("/predict", 200 if i % 10 else 422, 0.002)
+            metrics.observe_score(0.0002, 0.0003, 0.004)
+            metrics.count_predictions(np.array(["BENIGN", "DDoS"] if worker % 2 else ["BENIGN"], dtype=object))
+
+    threads = [threading.Thread(target=record, args=(worker,)) for worker in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(metrics._shards) == THREADS
+    scraped = samples(metrics.render())
+    total = THREADS * RECORDS
+    assert scraped['ids_requests_total{route="/predict",status="200"}'] == total * 9 // 10
+    assert scraped['ids_requests_total{route="/predict",status="422"}'] == total // 10
+    assert scraped['ids_request_duration_seconds_count{route="/predict"}'] == total
+    assert scraped['ids_request_duration_seconds_sum{route="/predict"}'] == pytest.approx(total * 0.002)
+    assert scraped['ids_stage_duration_seconds_count{stage="model"}'] == total
+    assert scraped['ids_predictions_total{class="BENIGN"}'] == total
+    assert scraped['ids_predictions_total{class="DDoS"}'] == total // 2
+    assert scraped["ids_flows_scored_total"] == total * 3 // 2
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = ServingMetrics()
+    for seconds in (0.00005, 0.0003, 0.0003, 10.0):
+        metrics.observe_stage("parse", seconds)
+
+    scraped = samples(metrics.render())
+    bucket = 'ids_stage_duration_seconds_bucket{stage="parse",le="%s"}'
+    assert scraped[bucket % repr(LATENCY_BUCKETS_S[0])] == 1
+    assert scraped[bucket % "0.0005"] == 3
+    assert scraped[bucket % repr(LATENCY_BUCKETS_S[-1])] == 3
+    assert scraped[bucket % "+Inf"] == 4
+    # Stages that never ran are left out rather than rendered as zeros
+    assert not any('stage="scale"' in name for name in scraped)
+
+
+def test_middleware_labels_by_route_template():
+    metrics = ServingMetrics()
+    app = FastAPI()
+
+    @app.get("/models/{model_id}")
+    def model(model_id: str) -> dict:
+        return {"model_id": model_id}
+
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    with TestClient(app) as client:
+        client.get("/models/rf-a")
+        client.get("/models/rf-b")
+        client.get("/wp-login.php")
+
+    scraped = samples(metrics.render())
+    assert scraped['ids_requests_total{route="/models/{model_id}",status="200"}'] == 2
+    assert scraped[f'ids_requests_total{{route="{UNMATCHED_ROUTE}",status="404"}}'] == 1
+    assert scraped["ids_requests_in_flight"] == 0
@@ -0,0 +1,204 @@
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.features import clean_features, load_dataset, scale_features, scale_features_fused, split_X_y
+from src.model_manager import ModelManager, ModelVersion
+from src.preprocess import Preprocessing
+
+
+def fit_forest(X_scaled, y) -> RandomForestClassifier:
+    # n_jobs=1: threaded predict_proba sums the trees in no fixed order
+    return RandomForestClassifier(n_estimators=10, class_weight="balanced", n_jobs=1, random_state=0).fit(X_scaled, y)
+
+
+@pytest.fixture(scope="module")
+def raw(synthetic_csv):
+    X, y, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def fused_version(raw):
+    X, y = raw
+    X_scaled, scaler, preprocessing = scale_features_fused(X)
+    model = fit_forest(X_scaled, y)
+    bundle = {"model_id": "rf-fused", "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}
+    return ModelVersion(bundle, "rf-fused", "rf.pk1"), model.predict(X_scaled)
+
+
+@pytest.fixture(scope="module")
+def legacy_version(raw):
+    X, y = raw
+    X_scaled, scaler = scale_features(X)
+    medians = X.replace([np.inf, -np.inf], np.nan).median().fillna(0.0)
+    model = fit_forest(X_scaled, y)
+    preprocessing = Preprocessing(medians.to_numpy(), -1e6, 1e6)
+    bundle = {"model_id": "rf-legacy", "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}
+    return ModelVersion(bundle, "rf-legacy", "rf.pk1"), model.predict(X_scaled)
+
+
+def threshold_rows(version: ModelVersion, rows: np.ndarray) -> np.ndarray:
+    # Raw rows with one feature near a split threshold mapped back through the scaler: float32 values on
+    # either side and the float64 values between them, which land on different branches when a float64
+    # request is not rounded to float32 the way training's buffer was
+    rng = np.random.default_rng(0)
+    mean, scale = version.scaler.mean_, version.scaler.scale_
+    edge_rows = []
+    for estimator in version.model.estimators_:
+        tree = estimator.tree_
+        for node in rng.choice(np.flatnonzero(tree.children_left >= 0), 40):
+            feature = tree.feature[node]
+            nearest = np.float32(tree.threshold[node] * scale[feature] + mean[feature])
+            below, above = np.nextafter(nearest, np.float32(-np.inf)), np.nextafter(nearest, np.float32(np.inf))
+            for value in (below, (float(below) + float(nearest)) / 2, nearest, (float(nearest) + float(above)) / 2, above):
+                row = rows[rng.integers(len(rows))].copy()
+                row[feature] = value
+                edge_rows.append(row)
+    return np.vstack(edge_rows)
+
+
+def test_fused_bundle_scores_json_and_bulk_rows_alike(raw, fused_version):
+    X, _ = raw
+    version, trained = fused_version
+    rows = X.to_numpy(dtype=np.float64)
+    edge_rows = threshold_rows(version, rows)
+
+    labels, _ = version.score(rows)
+    # The same predictions the forest made on the rows training preprocessed
+    np.testing.assert_array_equal(labels, trained)
+
+    labels_json, confidences_json = version.score(edge_rows)  # JSON routes decode float64
+    labels_bulk, confidences_bulk = version.score(edge_rows.astype(np.float32))  # raw /predict/bulk decodes float32
+    np.testing.assert_array_equal(labels_json, labels_bulk)
+    np.testing.assert_array_equal(confidences_json, confidences_bulk)
+
+
+def test_fused_and_unfused_training_predict_alike(raw, fused_version, legacy_version):
+    X, _ = raw
+    rows = X.to_numpy(dtype=np.float64)
+    fused, _ = fused_version
+    legacy, legacy_trained = legacy_version
+
+    np.testing.assert_array_equal(legacy.score(rows)[0], legacy_trained)
+    np.testing.assert_array_equal(fused.score(rows)[0], legacy.score(rows)[0])
+    np.testing.assert_array_equal(fused.score(rows)[1], legacy.score(rows)[1])
+
+
+def test_preprocessing_bundle_without_input_dtype_scores_float64():
+    entry = Preprocessing([1.0], -1e6, 1e6, input_dtype="float32").to_bundle()
+    del entry["input_dtype"]
+    value = np.array([[0.1]])
+
+    assert Preprocessing.from_bundle(entry).apply(value)[0, 0] == 0.1
+    assert Preprocessing([1.0], input_dtype="float32").apply(value)[0, 0] == np.float32(0.1)
+
+
+@pytest.fixture(scope="module")
+def bundle_files(raw, tmp_path_factory):
+    # Two versions of the same forest, told apart by model_id
+    X, y = raw
+    X_scaled, scaler, preprocessing = scale_features_fused(X)
+    model = fit_forest(X_scaled, y)
+    directory = tmp_path_factory.mktemp("bundles")
+    paths = {}
+    for model_id in ("rf-a", "rf-b"):
+        paths[model_id] = directory / f"{model_id}.joblib"
+        joblib.dump({"model_id": model_id, "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}, paths[model_id])
+    return paths
+
+
+def replace_bundle(source, target, mtime_ns: int) -> None:
+    # A distinct mtime, so the watcher sees the change however coarse the filesystem clock is
+    shutil.copyfile(source, target)
+    os.utime(target, ns=(mtime_ns, mtime_ns))
+
+
+def wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_reload_drains_the_leased_version(raw, bundle_files):
+    X, _ = raw
+    rows = X.to_numpy(dtype=np.float64)[:50]
+    manager = ModelManager(bundle_files["rf-a"], poll_interval=0)
+    manager.load()
+
+    with manager.lease() as leased:
+        thread = manager.reload_async(bundle_files["rf-b"])
+        wait_for(lambda: manager.current.model_id == "rf-b")
+        # Published, but rf-a is kept until the request holding it finishes
+        assert [v["model_id"] for v in manager.status()["draining"]] == ["rf-a"]
+        assert thread.is_alive()
+        assert leased.model_id == "rf-a"
+        assert len(leased.score(rows)[0]) == len(rows)
+        with manager.lease() as fresh:
+            assert fresh.model_id == "rf-b"
+
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    status = manager.status()
+    assert status["draining"] == [] and status["reloads"] == 1 and status["last_error"] is None
+
+
+def test_drain_gives_up_after_the_timeout(bundle_files):
+    manager = ModelManager(bundle_files["rf-a"], poll_interval=0, drain_timeout=0.2)
+    manager.load()
+
+    with manager.lease():
+        started = time.perf_counter()
+        manager.load(bundle_files["rf-b"])  # returns once the drain times out, not when the lease ends
+        assert time.perf_counter() - started < 5
+        assert manager.status()["draining"] == []
+
+
+def test_poll_loads_a_change_once_it_is_stable(bundle_files, tmp_path):
+    path = tmp_path / "rf.joblib"
+    replace_bundle(bundle_files["rf-a"], path, 1_000_000_000)
+    manager = ModelManager(path, poll_interval=0)
+    manager.load()
+    assert manager.poll() is False
+
+    replace_bundle(bundle_files["rf-b"], path, 2_000_000_000)
+    assert manager.poll() is False  # changed: not loaded until it is seen unchanged once more
+    assert manager.current.model_id == "rf-a"
+    assert manager.poll() is True
+    assert manager.current.model_id == "rf-b"
+    assert manager.poll() is False
+
+
+def test_broken_bundle_keeps_the_current_version(bundle_files, tmp_path):
+    path = tmp_path / "rf.joblib"
+    replace_bundle(bundle_files["rf-a"], path, 1_000_000_000)
+    manager = ModelManager(path, poll_interval=0)
+    manager.load()
+
+    path.write_bytes(b"not a bundle")
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert manager.poll() is False
+    assert manager.poll() is False
+    assert manager.current.model_id == "rf-a"
+    assert manager.status()["last_error"] is not None
+    assert manager.reloads == 0
+
+    replace_bundle(bundle_files["rf-b"], path, 3_000_000_000)
+    manager.poll()
+    assert manager.poll() is True
+    assert manager.current.model_id == "rf-b" and manager.last_error is None
+
+
+def test_admin_reload_thread_records_errors(bundle_files, tmp_path):
+    manager = ModelManager(bundle_files["rf-a"], poll_interval=0)
+    manager.load()
+
+    manager.reload_async(tmp_path / "missing.joblib").join(timeout=10)
+    assert manager.last_error.startswith("FileNotFoundError")
+    assert manager.current.model_id == "rf-a"
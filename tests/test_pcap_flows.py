@@ -0,0 +1,96 @@
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pcap_flows import FlowTable, extract_flows
+from src.synthetic import write_pcap
+
+FLOW_KEY = ["Source IP", "Source Port", "Destination IP", "Destination Port", "Protocol"]
+TRUTH_COLUMNS = ["Flow Duration", "Total Fwd Packets", "Total Backward Packets", "Total Length of Fwd Packets", "Total Length of Bwd Packets"]
+PACKET_COLUMNS = ["Total Fwd Packets", "Total Backward Packets"]
+
+
+@pytest.fixture(scope="module")
+def capture(tmp_path_factory: pytest.TempPathFactory):
+    # 600 flows over 30 s: well inside the default timeouts, so every flow ends by FIN or at the end of the file
+    path = tmp_path_factory.mktemp("pcap") / "synthetic.pcap"
+    truth = write_pcap(path, 600, seed=3, span_s=30.0)
+    return path, truth
+
+
+def all_flows(frames) -> pd.DataFrame:
+    # Every finished flow, in a fixed order so runs can be compared row for row
+    flows = pd.concat(list(frames), ignore_index=True)
+    return flows.sort_values(FLOW_KEY + ["Timestamp"], kind="stable").reset_index(drop=True)
+
+
+def conversation(flows: pd.DataFrame) -> pd.Series:
+    # Protocol and both endpoints, the same whichever side sent the flow's first packet
+    source = flows["Source IP"] + ":" + flows["Source Port"].astype(int).astype(str)
+    destination = flows["Destination IP"] + ":" + flows["Destination Port"].astype(int).astype(str)
+    low, high = np.minimum(source, destination), np.maximum(source, destination)
+    return flows["Protocol"].astype(int).astype(str) + " " + low + " " + high
+
+
+def split_pcap(path: Path, first: Path, second: Path, fraction: float) -> None:
+    # Two valid libpcap files with the same header, cut at the record boundary nearest ``fraction`` of the bytes
+    data = path.read_bytes()
+    offset, cut = 24, 24
+    while offset < len(data):
+        offset += 16 + struct.unpack_from("<I", data, offset + 8)[0]
+        if offset <= len(data) * fraction:
+            cut = offset
+    first.write_bytes(data[:cut])
+    second.write_bytes(data[:24] + data[cut:])
+
+
+def test_flows_match_ground_truth(capture):
+    path, truth = capture
+    flows = all_flows(extract_flows(path))
+
+    assert len(flows) == len(truth)
+    merged = truth.merge(flows, on=FLOW_KEY, how="left", suffixes=("_truth", ""), validate="one_to_one")
+    for column in TRUTH_COLUMNS:
+        np.testing.assert_array_equal(merged[column].to_numpy(dtype=float), merged[f"{column}_truth"].to_numpy(dtype=float), err_msg=column)
+
+
+@pytest.mark.parametrize("batch_bytes", [1 << 10, 37_000, 1 << 20])
+def test_flows_do_not_depend_on_batch_size(capture, batch_bytes):
+    path, _ = capture
+    expected = all_flows(extract_flows(path, batch_bytes=64 << 20))  # the whole file in one batch
+
+    pd.testing.assert_frame_equal(all_flows(extract_flows(path, batch_bytes=batch_bytes)), expected)
+
+
+def test_max_flows_ends_least_recent_flows_early(capture):
+    path, truth = capture
+    # Small enough that flows still receiving packets are ended, not only finished ones awaiting a timeout
+    table = FlowTable(max_flows=3)
+    flows = all_flows(extract_flows(path, table=table, batch_bytes=16 << 10))
+
+    assert table.evicted > 0
+    assert len(table) == 0
+    assert len(flows) == table.flows_emitted
+    assert len(flows) > len(truth)
+    # An evicted flow restarts with its next packet: no packet is lost, a flow's packets are only split up.
+    # The restarted part takes the direction of its first packet, so parts are matched on the unordered endpoints
+    assert flows[PACKET_COLUMNS].to_numpy().sum() == table.packets
+    per_flow = flows.groupby(conversation(flows))[PACKET_COLUMNS].sum().sum(axis=1)
+    expected = truth.groupby(conversation(truth))[PACKET_COLUMNS].sum().sum(axis=1)
+    pd.testing.assert_series_equal(per_flow.astype(float), expected.astype(float), check_names=False)
+
+
+def test_flows_continue_across_split_files(capture, tmp_path):
+    path, _ = capture
+    split_pcap(path, tmp_path / "part-0.pcap", tmp_path / "part-1.pcap", fraction=0.5)
+    expected = all_flows(extract_flows(path))
+
+    table = FlowTable()
+    first = list(extract_flows(tmp_path / "part-0.pcap", table=table, flush=False))
+    assert len(table) > 0  # flows cut by the file boundary are still open
+    flows = all_flows(first + list(extract_flows(tmp_path / "part-1.pcap", table=table)))
+
+    pd.testing.assert_frame_equal(flows, expected)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from src.prediction_cache import PredictionCache
+
+
+class CountingVersion:
+    # Stands in for a ModelVersion: labels each row by its first value and counts the rows it scores
+    def __init__(self, model_id: str, prefix: str = "") -> None:
+        self.model_id = model_id
+        self.prefix = prefix
+        self.rows_scored = 0
+
+    def score(self, X):
+        self.rows_scored += len(X)
+        return np.array([f"{self.prefix}{int(v)}" for v in X[:, 0]], dtype=object), np.full(len(X), 0.9)
+
+
+def rows(*values):
+    return np.array([[float(v), 1.0] for v in values])
+
+
+def test_only_distinct_misses_reach_the_model():
+    cache, version = PredictionCache(), CountingVersion("rf-a")
+
+    labels, _ = cache.score(version, rows(1, 2, 1, 1), "rf-a")
+    assert labels.tolist() == ["1", "2", "1", "1"]
+    assert version.rows_scored == 2  # duplicates within a batch are scored once
+
+    labels, _ = cache.score(version, rows(2, 3), "rf-a")
+    assert labels.tolist() == ["2", "3"]
+    assert version.rows_scored == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_reload_clears_entries_of_the_previous_model():
+    cache = PredictionCache()
+    old, new = CountingVersion("rf-a", "old-"), CountingVersion("rf-b", "new-")
+    cache.score(old, rows(1, 2), "rf-a")
+
+    labels, _ = cache.score(new, rows(1, 2), "rf-b")
+    assert labels.tolist() == ["new-1", "new-2"]  # not the old model's cached answers
+    assert new.rows_scored == 2
+    assert cache.stats()["model_id"] == "rf-b"
+
+
+def test_draining_version_bypasses_the_cache():
+    cache = PredictionCache()
+    old, new = CountingVersion("rf-a", "old-"), CountingVersion("rf-b", "new-")
+    cache.score(new, rows(1), "rf-b")
+
+    # A request that leased rf-a before the reload finishes on rf-a, without reading or writing rf-b's entries
+    labels, _ = cache.score(old, rows(1, 5), "rf-b")
+    assert labels.tolist() == ["old-1", "old-5"]
+    assert cache.stats()["bypassed"] == 2
+
+    labels, _ = cache.score(new, rows(5), "rf-b")
+    assert labels.tolist() == ["new-5"]
+
+
+def test_store_and_lookup_for_a_replaced_model_are_refused():
+    # The race the model_id checks close: invalidated between a caller's check and its lookup/store
+    cache = PredictionCache()
+    keys = cache.keys(rows(1))
+    cache.invalidate("rf-a")
+    cache.store(keys, np.array(["a"], dtype=object), np.array([0.9]), "rf-a")
+    cache.invalidate("rf-b")
+
+    cache.store(keys, np.array(["stale"], dtype=object), np.array([0.9]), "rf-a")
+    assert cache.lookup(keys, "rf-b") == [None]
+    assert cache.lookup(keys, "rf-a") == [None]
+    assert cache.stats()["entries"] == 0
+
+
+def test_quantized_keys_share_near_identical_flows():
+    cache, version = PredictionCache(quantize_bits=12), CountingVersion("rf-a")
+    cache.score(version, np.array([[1000.0, 1.0]]), "rf-a")
+    cache.score(version, np.array([[1000.01, 1.0]]), "rf-a")
+
+    assert version.rows_scored == 1
+    assert PredictionCache().keys(np.array([[1000.0]])) != PredictionCache().keys(np.array([[1000.01]]))
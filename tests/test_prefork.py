@@ -0,0 +1,111 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="src.prefork forks its workers")
+
+ROOT = Path(__file__).resolve().parent.parent
+FEATURES = ["a", "b", "c"]
+
+
+def write_bundle(path: Path, model_id: str) -> None:
+    # Written beside the target and renamed in, like training does
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(200, len(FEATURES))), rng.integers(0, 2, 200)
+    bundle = {"model_id": model_id, "model": RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y), "scaler": StandardScaler().fit(X), "features": FEATURES}
+    joblib.dump(bundle, path.with_suffix(".tmp"))
+    os.replace(path.with_suffix(".tmp"), path)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+def wait_for(check, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = check()
+        except OSError:
+            result = None
+        if result:
+            return result
+        time.sleep(0.2)
+    raise AssertionError("timed out")
+
+
+@pytest.fixture()
+def server(request, tmp_path):
+    # IDS_RELOAD_POLL_S from the test's parameter; 0 leaves only SIGHUP
+    model_path = tmp_path / "rf.pk1"
+    write_bundle(model_path, "rf-first")
+    port = free_port()
+    env = {**os.environ, "IDS_MODEL_PATH": str(model_path), "IDS_RELOAD_POLL_S": request.param, "PYTHONPATH": str(ROOT)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.prefork", "--host", "127.0.0.1", "--port", str(port), "--workers", "2"],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(lambda: get_json(f"{url}/admin/model"))
+        yield process, url, model_path
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+
+def serving_ids(url: str, n: int = 20) -> set:
+    # Connections are spread over the workers, so n requests see every worker with high probability
+    return {get_json(f"{url}/admin/model")["current"]["model_id"] for _ in range(n)}
+
+
+def stop(process) -> str:
+    process.send_signal(signal.SIGTERM)
+    output, _ = process.communicate(timeout=30)
+    assert process.returncode == 0
+    return output
+
+
+@pytest.mark.parametrize("server", ["0.2"], indirect=True)
+def test_parent_reloads_and_replaces_every_worker(server):
+    process, url, model_path = server
+    status = get_json(f"{url}/admin/model")
+    assert status["current"]["model_id"] == "rf-first"
+    assert not status["watching"]  # workers leave the bundle to the parent
+
+    write_bundle(model_path, "rf-second")
+    wait_for(lambda: serving_ids(url) == {"rf-second"})
+    assert process.poll() is None
+    assert "now serving rf-second, 2 workers retired" in stop(process)
+
+
+@pytest.mark.parametrize("server", ["0"], indirect=True)
+def test_sighup_reloads_without_polling(server):
+    process, url, model_path = server
+    write_bundle(model_path, "rf-second")
+    time.sleep(1.0)
+    assert serving_ids(url) == {"rf-first"}  # nothing watches the file
+
+    process.send_signal(signal.SIGHUP)
+    wait_for(lambda: serving_ids(url) == {"rf-second"})
+    assert "now serving rf-second" in stop(process)
@@ -0,0 +1,92 @@
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestClassifier
+
+from src.features import clean_features, load_dataset, scale_features_fused, split_X_y
+from src.serve import create_app
+
+
+@pytest.fixture(scope="module")
+def flows(synthetic_csv):
+    X, y, _ = split_X_y(clean_features(load_dataset(synthetic_csv)))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def client(flows, tmp_path_factory):
+    X, y = flows
+    X_scaled, scaler, preprocessing = scale_features_fused(X)
+    model = RandomForestClassifier(n_estimators=10, class_weight="balanced", n_jobs=1, random_state=0).fit(X_scaled, y)
+    path = tmp_path_factory.mktemp("models") / "rf.joblib"
+    joblib.dump({"model_id": "rf-test", "model": model, "scaler": scaler, "features": list(X.columns), "preprocessing": preprocessing.to_bundle()}, path)
+
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("IDS_RELOAD_POLL_S", "0")
+        app = create_app(str(path))
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def rows(flows):
+    # JSON cannot carry inf/NaN: finite rows only, 200 of them
+    X, _ = flows
+    values = X.to_numpy(dtype=np.float64)
+    return X.columns.tolist(), values[np.isfinite(values).all(axis=1)][:200]
+
+
+def predictions(response) -> list:
+    assert response.status_code == 200, response.text
+    return [(p["prediction"], p["confidence"]) for p in response.json()["predictions"]]
+
+
+def test_batch_layouts_agree_with_single_flow_predict(client, rows):
+    names, values = rows
+    by_rows = client.post("/predict/batch", json={"flows": [dict(zip(names, row)) for row in values.tolist()]})
+    by_columns = client.post("/predict/batch", json={"columns": {name: values[:, j].tolist() for j, name in enumerate(names)}})
+
+    assert by_rows.json()["count"] == len(values)
+    assert by_rows.json()["model_id"] == "rf-test"
+    assert predictions(by_rows) == predictions(by_columns)
+    single = [client.post("/predict", json={"values": row}).json() for row in values[:20].tolist()]
+    assert predictions(by_rows)[:20] == [(p["prediction"], p["confidence"]) for p in single]
+
+
+def test_batch_scores_like_the_model_version(client, rows):
+    names, values = rows
+    labels, confidences = client.app.state.manager.current.score(values)
+
+    response = client.post("/predict/batch", json={"columns": {name: values[:, j].tolist() for j, name in enumerate(names)}})
+    assert predictions(response) == [(str(label), round(float(c), 4)) for label, c in zip(labels, confidences)]
+
+
+def test_batch_reports_defaulted_features(client, rows):
+    names, values = rows
+    flows = [dict(zip(names, row)) for row in values[:3].tolist()]
+    flows[0][names[0]] = None
+    del flows[1][names[1]]
+    del flows[2][names[1]]
+
+    body = client.post("/predict/batch", json={"flows": flows}).json()
+    assert body["count"] == 3
+    assert body["defaulted_features"] == {names[0]: 1, names[1]: 2}
+
+
+def test_empty_batch(client):
+    body = client.post("/predict/batch", json={"flows": []}).json()
+    assert body == {"count": 0, "predictions": [], "defaulted_features": {}, "model_id": "rf-test"}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {},
+        {"flows": [], "columns": {}},
+        {"columns": {"a": [1.0, 2.0], "b": [1.0]}},
+        {"flows": [{"a": "not a number"}]},
+    ],
+)
+def test_invalid_batches_are_rejected(client, payload):
+    assert client.post("/predict/batch", json=payload).status_code == 422
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from src import wire
+from src.ingest import FeatureSchema
+
+NAMES = ["Flow Duration", "Total Fwd Packets", "Destination Port"]
+
+
+@pytest.fixture()
+def schema():
+    return FeatureSchema(NAMES)
+
+
+@pytest.fixture()
+def matrix():
+    rng = np.random.default_rng(0)
+    return rng.normal(0.0, 1000.0, (50, len(NAMES)))
+
+
+def test_raw_float32_in_bundle_order_is_a_view(schema, matrix):
+    body = wire.encode_raw_float32(NAMES, matrix)
+
+    X, defaulted = wire.decode_raw_float32(body, schema)
+    np.testing.assert_array_equal(X, matrix.astype(np.float32))
+    assert X.dtype == np.float32 and not X.flags.writeable  # the request body, not a copy
+    assert defaulted == {}
+
+
+def test_raw_float32_other_column_order(schema, matrix):
+    # Columns reordered, one missing, one unknown: placed by name, the missing one defaulted
+    names = ["Destination Port", "Unknown", "Flow Duration"]
+    body = wire.encode_raw_float32(names, matrix)
+
+    X, defaulted = wire.decode_raw_float32(body, schema)
+    expected = np.column_stack([matrix[:, 2], np.zeros(len(matrix)), matrix[:, 0]]).astype(np.float32)
+    np.testing.assert_array_equal(X, expected)
+    assert defaulted == {"Total Fwd Packets": len(matrix)}
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        (b"\x01", "too short"),
+        (b"\xff\x00\x00\x00{}", "ends inside its header"),
+        (b"\x02\x00\x00\x00{}", "under 'features'"),
+    ],
+)
+def test_raw_float32_malformed_header(schema, body, message):
+    with pytest.raises(ValueError, match=message):
+        wire.decode_raw_float32(body, schema)
+
+
+def test_raw_float32_partial_row(schema, matrix):
+    body = wire.encode_raw_float32(NAMES, matrix)
+    with pytest.raises(ValueError, match="multiple of 12 bytes"):
+        wire.decode_raw_float32(body[:-4], schema)
+
+
+def test_raw_results_round_trip():
+    classes = ["BENIGN", "DDoS", "PortScan"]
+    labels = np.array(["DDoS", "BENIGN", "PortScan", "DDoS"], dtype=object)
+    confidences = np.array([0.9, 0.55, 0.7, 1.0])
+
+    decoded = wire.decode_raw_results(wire.encode_raw_results(labels, confidences, classes, {"Flow Duration": 2}, model_id="rf-a"))
+    assert decoded["predictions"].tolist() == labels.tolist()
+    np.testing.assert_array_equal(decoded["confidences"], confidences.astype(np.float32))
+    assert decoded["defaulted_features"] == {"Flow Duration": 2}
+    assert decoded["model_id"] == "rf-a"
+    assert len(wire.decode_raw_results(wire.encode_raw_results([], [], classes, {}))["predictions"]) == 0
+
+
+def test_arrow_columns_by_name_with_nulls(schema, matrix):
+    pa = pytest.importorskip("pyarrow")
+    batch = pa.record_batch(
+        [
+            pa.array([1.0, None, 3.0]),
+            pa.array([10, 20, 30], type=pa.int32()),  # any numeric type
+        ],
+        names=["Flow Duration", "Destination Port"],
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+        writer.write_batch(batch)  # two chunks
+
+    X, defaulted = wire.decode_arrow(sink.getvalue().to_pybytes(), schema)
+    np.testing.assert_array_equal(X, [[1.0, 0.0, 10.0], [0.0, 0.0, 20.0], [3.0, 0.0, 30.0]] * 2)
+    assert defaulted == {"Flow Duration": 2, "Total Fwd Packets": 6}
+
+    X, defaulted = wire.decode_arrow(wire.encode_arrow_flows(matrix, NAMES), schema)
+    np.testing.assert_array_equal(X, matrix)
+    assert defaulted == {}
+
+
+def test_arrow_packed_features_column(schema, matrix):
+    pa = pytest.importorskip("pyarrow")
+
+    def stream(values, list_size):
+        column = pa.FixedSizeListArray.from_arrays(pa.array(values), list_size)
+        batch = pa.record_batch([column], names=[wire.PACKED_COLUMN])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+    X, defaulted = wire.decode_arrow(stream(matrix.ravel(), len(NAMES)), schema)
+    np.testing.assert_array_equal(X, matrix)
+    assert defaulted == {}
+
+    with pytest.raises(ValueError, match="fixed-size list of 3"):
+        wire.decode_arrow(stream(np.zeros(4), 2), schema)
+    with pytest.raises(ValueError, match="must not contain nulls"):
+        wire.decode_arrow(stream([1.0, None, 3.0], 3), schema)
+
+
+def test_arrow_results_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    body = wire.encode_arrow(np.array(["DDoS", "BENIGN"]), np.array([0.9, 0.6]), {"Flow Duration": 1}, model_id="rf-a")
+
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    assert table.column("prediction").to_pylist() == ["DDoS", "BENIGN"]
+    assert table.column("confidence").to_pylist() == [0.9, 0.6]
+    assert table.schema.metadata[b"model_id"] == b"rf-a"